@@ -0,0 +1,204 @@
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import requests
+
+BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(BASE_DIR, "get_blockproposer"))
+sys.path.append(os.path.join(BASE_DIR, "get_validator_info"))
+from mock_rpc import add_arguments, split_options, start_server
+
+# 取得スクリプトのスループット計測
+#
+# mock_rpc のサーバをこのプロセス内で起動し、各取得方法をそのサーバに向けて実行する。
+# HTTP リクエストを1件ずつ計測し、ブロック/秒・レイテンシの p50 / p99・リトライ回数を表にする。
+#
+#   python bench_fetchers.py --blocks 300 --latency 0.05 --error-rate 0.02
+#   python bench_fetchers.py --fetcher blocks-blockchain --fetcher validators-simulate --json result.json
+#   python bench_fetchers.py --endpoint-latency 0.02,0.2,0.05 --endpoint-lag 0,0,50 --jitter 0.02
+
+FETCHERS = {
+    "blocks-sequential": ("BC_BLOCK_PRO", "sequential"),
+    "blocks-concurrent": ("BC_BLOCK_PRO", "concurrent"),
+    "blocks-blockchain": ("BC_BLOCK_PRO", "blockchain"),
+    "validators-rpc": ("get_validators_set_v2", "rpc"),
+    "validators-simulate": ("get_validators_set_v2", "simulate"),
+}
+
+
+class RequestRecorder:
+    """HTTP の GET 関数を包み、1リクエストごとの (経過秒, ステータス or 例外名) を記録する"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.records = []
+
+    def wrap(self, get):
+        def timed_get(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                response = get(*args, **kwargs)
+            except requests.exceptions.RequestException as e:
+                self.add(time.perf_counter() - start, type(e).__name__)
+                raise
+            self.add(time.perf_counter() - start, response.status_code)
+            return response
+        return timed_get
+
+    def add(self, elapsed, status):
+        with self.lock:
+            self.records.append((elapsed, status))
+
+    def summary(self):
+        latencies = np.array([elapsed for elapsed, _ in self.records]) * 1000
+        statuses = {}
+        for _, status in self.records:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        return {
+            "requests": len(self.records),
+            "p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+            "p99_ms": float(np.percentile(latencies, 99)) if len(latencies) else 0.0,
+            # 200 以外の応答・通信エラーはどの取得方法でもリトライ（か失敗）になる
+            "retries": sum(n for status, n in statuses.items() if status != "200"),
+            "statuses": statuses,
+        }
+
+
+@contextlib.contextmanager
+def patched(obj, name, value):
+    original = getattr(obj, name)
+    setattr(obj, name, value)
+    try:
+        yield
+    finally:
+        setattr(obj, name, original)
+
+
+def attach_pool(module, urls, recorder):
+    """スクリプトの RPC_URLS を差し替えて新しいプールを作り、その HTTP GET を計測する"""
+    module.RPC_URLS = urls
+    module.POOL = None
+    pool = module.get_pool()
+    pool.session.get = recorder.wrap(pool.session.get)
+    return pool
+
+
+def run_block_fetcher(module, mode, blocks, rate_limit):
+    """BC_BLOCK_PRO.main() を実行し、取得できたブロック数を返す"""
+    with contextlib.ExitStack() as stack:
+        if rate_limit is not None:
+            stack.enter_context(patched(module, "RATE_LIMIT", rate_limit))
+        module.main(block_count=blocks - 1, fetch_mode=mode, output_csv="bench_blocks.csv")
+    if not os.path.exists("bench_blocks.csv"):
+        return 0
+    with open("bench_blocks.csv", "r", encoding="utf-8") as f:
+        return max(sum(1 for _ in f) - 1, 0)
+
+
+def run_validator_fetcher(module, source, blocks):
+    """get_validators_set_v2.main() を実行し、ブロック情報とバリデータが揃った高さの数を返す"""
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(patched(module, "VALIDATOR_SOURCE", source))
+        stack.enter_context(patched(module, "RESUME", False))
+        module.main(block_count=blocks)
+    with open(module.MANIFEST_FILE, "r", encoding="utf-8") as f:
+        return len(json.load(f)["completed"])
+
+
+def run_benchmark(name, servers, blocks, rate_limit=None):
+    """1つの取得方法を一時ディレクトリで実行し、結果の辞書を返す"""
+    import pandas  # noqa: F401  BC_BLOCK_PRO が最後に読み込む分を計測から外す
+
+    module_name, mode = FETCHERS[name]
+    module = importlib.import_module(module_name)
+    recorder = RequestRecorder()
+    original_urls = module.RPC_URLS
+    pool = attach_pool(module, [server.url for server in servers], recorder)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                if module_name == "BC_BLOCK_PRO":
+                    fetched = run_block_fetcher(module, mode, blocks, rate_limit)
+                else:
+                    fetched = run_validator_fetcher(module, mode, blocks)
+            elapsed = time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+            module.RPC_URLS, module.POOL = original_urls, None
+            pool.close()
+
+    return {"fetcher": name, "blocks": fetched, "seconds": elapsed,
+            "blocks_per_sec": fetched / elapsed if elapsed else 0.0, **recorder.summary(),
+            "hedges": pool.hedges_sent, "endpoints": pool.stats()}
+
+
+def print_table(results):
+    print(f"\n{'fetcher':<22}{'blocks':>8}{'sec':>9}{'blocks/s':>10}{'requests':>10}"
+          f"{'p50 ms':>9}{'p99 ms':>9}{'retries':>9}{'hedges':>8}")
+    for r in results:
+        print(f"{r['fetcher']:<22}{r['blocks']:>8}{r['seconds']:>9.2f}{r['blocks_per_sec']:>10.1f}"
+              f"{r['requests']:>10}{r['p50_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['retries']:>9}{r['hedges']:>8}")
+
+    if len(results) and len(results[0]["endpoints"]) > 1:
+        print("\n📡 Requests per endpoint (requests / hedges won / lagging):")
+        for r in results:
+            shares = "  ".join(
+                f"{e['requests']}/{e['hedges_won']}{'/lag' if e['lagging'] else ''}" for e in r["endpoints"])
+            print(f"  {r['fetcher']:<22}{shares}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="取得スクリプトのスループットをモック RPC で計測する")
+    parser.add_argument("--fetcher", action="append", choices=list(FETCHERS),
+                        help="計測する取得方法（複数指定可、既定: すべて）")
+    parser.add_argument("--blocks", type=int, default=200, help="1回の計測で取得するブロック数")
+    parser.add_argument("--rate-limit", type=float, help="BC_BLOCK_PRO の RATE_LIMIT を上書き（1秒あたりのリクエスト数）")
+    parser.add_argument("--json", help="結果を JSON で保存するファイル")
+    parser.add_argument("--endpoints", type=int, default=1, help="起動するモックサーバの数（プールのエンドポイント数）")
+    parser.add_argument("--endpoint-latency", help="エンドポイントごとの平均遅延（秒、カンマ区切り。--latency を上書き）")
+    parser.add_argument("--endpoint-lag", help="エンドポイントごとに最新の高さを何ブロック遅らせるか（カンマ区切り）")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    latencies = [float(x) for x in args.endpoint_latency.split(",")] if args.endpoint_latency else []
+    lags = [int(x) for x in args.endpoint_lag.split(",")] if args.endpoint_lag else []
+    count = max(args.endpoints, len(latencies), len(lags))
+
+    chain_options, server_options = split_options(args)
+    servers = []
+    for i in range(count):
+        options = dict(server_options, latency=latencies[i] if i < len(latencies) else args.latency, seed=args.seed + i)
+        lag = lags[i] if i < len(lags) else 0
+        chain = dict(chain_options, latest_height=args.latest_height - lag)
+        servers.append(start_server(chain_options=chain, **options))
+        print(f"🧪 Mock RPC: {servers[-1].url}  latency={options['latency']}s lag={lag} error_rate={args.error_rate} "
+              f"429={args.burst_length}s/{args.burst_every}s")
+
+    results = []
+    for name in args.fetcher or list(FETCHERS):
+        print(f"⏱️ {name} ...")
+        results.append(run_benchmark(name, servers, args.blocks, args.rate_limit))
+    for server in servers:
+        server.shutdown()
+
+    print_table(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "results": results}, f, indent=1, ensure_ascii=False)
+        print(f"\n📁 結果を '{args.json}' に保存しました。")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+import argparse
+import base64
+import datetime
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "get_validator_info"))
+from proposer_sim import ProposerSimulator
+
+# ローカルで動く Tendermint（CometBFT）RPC のスタンドイン
+#
+# /status, /block, /validators, /blockchain を本物と同じ形の JSON で返す。
+# チェーンは乱数の種から決まる合成データで、proposer と proposer_priority は
+# proposer_sim の重み付きラウンドロビンで計算する（simulate モードの検証にも使える）。
+# 応答の遅延・エラー率・429 の連続発生・バリデータのページ分割を設定できる。
+#
+#   python mock_rpc.py --port 26657 --latency 0.05 --error-rate 0.01
+#   → BC_BLOCK_PRO.py の RPC_URLS を ["http://127.0.0.1:26657"] にして実行
+
+GENESIS_TIME = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+CHAIN_ID = "mock-1"
+MAX_PER_PAGE = 100  # CometBFT の /validators の per_page 上限
+BLOCKCHAIN_PAGE = 20  # /blockchain が1回で返すブロックメタの最大数
+
+
+def format_time(ns):
+    """UNIX時間 ns を Go の RFC3339Nano 形式（末尾の0を省く）にする"""
+    seconds, frac = divmod(ns, 1_000_000_000)
+    text = datetime.datetime.fromtimestamp(seconds, tz=datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+    frac = f"{frac:09d}".rstrip("0")
+    return f"{text}.{frac}Z" if frac else f"{text}Z"
+
+
+def sha_hex(*parts):
+    return hashlib.sha256("/".join(str(p) for p in parts).encode("utf-8")).hexdigest().upper()
+
+
+class MockChain:
+    """合成チェーン: 高さ lowest_height 〜 latest_height のブロックとバリデータセットを必要な分だけ作る"""
+
+    def __init__(self, latest_height=100_000, span=10_000, validators=50, seed=0,
+                 block_time=6.0, max_txs=20, absent_rate=0.05, set_change_every=0, grow=False):
+        self.lowest_height = max(latest_height - span + 1, 1)  # これより低い高さは「刈り込み済み」
+        self.initial_latest = latest_height
+        self.block_time = block_time
+        self.max_txs = max_txs
+        self.absent_rate = absent_rate
+        self.set_change_every = set_change_every
+        self.grow = grow  # True: 実時間の経過に合わせて最新の高さが伸びる
+        self.started = time.monotonic()
+        self.seed = seed
+        self.lock = threading.Lock()
+
+        rng = random.Random(seed)
+        self.addresses = [sha_hex(seed, "validator", i)[:40] for i in range(validators)]
+        self.pub_keys = [base64.b64encode(hashlib.sha256(a.encode()).digest()).decode() for a in self.addresses]
+        powers = [rng.randint(1, 1000) * 1000 for _ in range(validators)]
+        self.simulator = ProposerSimulator(self.make_validators(powers, [0] * validators), self.lowest_height - 1)
+        self.powers = powers
+
+        # 高さごとの状態（lowest_height からの位置で引く）
+        self.times = []
+        self.proposers = []
+        self.priorities = []
+        self.power_sets = []
+        self.time_ns = int(GENESIS_TIME.timestamp()) * 1_000_000_000 + self.lowest_height * int(block_time * 1e9)
+
+    def make_validators(self, powers, priorities):
+        return [
+            {"address": a, "pub_key": {"type": "tendermint/PubKeyEd25519", "value": k},
+             "voting_power": str(p), "proposer_priority": str(q)}
+            for a, k, p, q in zip(self.addresses, self.pub_keys, powers, priorities)
+        ]
+
+    def latest_height(self):
+        if not self.grow:
+            return self.initial_latest
+        return self.initial_latest + int((time.monotonic() - self.started) / self.block_time)
+
+    def ensure(self, height):
+        """height までの状態を順に計算する"""
+        with self.lock:
+            while self.lowest_height + len(self.times) <= height:
+                h = self.lowest_height + len(self.times)
+                rng = random.Random(f"{self.seed}/{h}")
+                if self.set_change_every and h % self.set_change_every == 0:
+                    # 投票力の変更（セットのハッシュが変わる）
+                    powers = list(self.powers)
+                    i = rng.randrange(len(powers))
+                    powers[i] = max(1000, powers[i] + rng.choice([-1, 1]) * 1000)
+                    self.powers = powers
+                    self.simulator = ProposerSimulator(
+                        self.make_validators(powers, self.simulator.priorities.tolist()), h - 1)
+                proposer = self.simulator.increment()[-1]
+                self.time_ns += int(self.block_time * 1e9 * rng.uniform(0.7, 1.6))
+                self.times.append(self.time_ns)
+                self.proposers.append(proposer)
+                self.priorities.append(self.simulator.priorities.copy())
+                self.power_sets.append(self.powers)
+
+    def state(self, height):
+        self.ensure(height)
+        i = height - self.lowest_height
+        return self.times[i], self.proposers[i], self.priorities[i], self.power_sets[i]
+
+    def validators_hash(self, powers):
+        return sha_hex(*self.addresses, *powers)
+
+    def header(self, height):
+        time_ns, proposer, _, powers = self.state(height)
+        next_powers = self.state(height + 1)[3]
+        return {
+            "version": {"block": "11", "app": "0"},
+            "chain_id": CHAIN_ID,
+            "height": str(height),
+            "time": format_time(time_ns),
+            "last_block_id": {"hash": sha_hex("block", height - 1), "parts": {"total": 1, "hash": sha_hex("parts", height - 1)}},
+            "last_commit_hash": sha_hex("commit", height - 1),
+            "data_hash": sha_hex("data", height),
+            "validators_hash": self.validators_hash(powers),
+            "next_validators_hash": self.validators_hash(next_powers),
+            "consensus_hash": sha_hex("consensus"),
+            "app_hash": sha_hex("app", height),
+            "last_results_hash": sha_hex("results", height - 1),
+            "evidence_hash": sha_hex("evidence"),
+            "proposer_address": proposer,
+        }
+
+    def block_id(self, height):
+        return {"hash": sha_hex("block", height), "parts": {"total": 1, "hash": sha_hex("parts", height)}}
+
+    def num_txs(self, height):
+        return random.Random(f"{self.seed}/txs/{height}").randint(0, self.max_txs)
+
+    def block(self, height):
+        rng = random.Random(f"{self.seed}/sigs/{height}")
+        prev_time = self.state(height - 1)[0] if height > self.lowest_height else self.state(height)[0]
+        signatures = []
+        for address in self.addresses:
+            if rng.random() < self.absent_rate:
+                signatures.append({"block_id_flag": 1, "validator_address": "",
+                                   "timestamp": "0001-01-01T00:00:00Z", "signature": None})
+            else:
+                signatures.append({"block_id_flag": 2, "validator_address": address,
+                                   "timestamp": format_time(prev_time + rng.randint(0, 900_000_000)),
+                                   "signature": base64.b64encode(rng.randbytes(64)).decode()})
+        txs = [base64.b64encode(rng.randbytes(rng.randint(100, 400))).decode() for _ in range(self.num_txs(height))]
+        return {
+            "block_id": self.block_id(height),
+            "block": {
+                "header": self.header(height),
+                "data": {"txs": txs},
+                "evidence": {"evidence": []},
+                "last_commit": {"height": str(height - 1), "round": 0,
+                                "block_id": self.block_id(height - 1), "signatures": signatures},
+            },
+        }
+
+    def block_meta(self, height):
+        return {"block_id": self.block_id(height), "block_size": str(1000 + 300 * self.num_txs(height)),
+                "header": self.header(height), "num_txs": str(self.num_txs(height))}
+
+    def validators(self, height):
+        _, _, priorities, powers = self.state(height)
+        return self.make_validators(powers, [int(p) for p in priorities])
+
+
+class RPCError(Exception):
+    def __init__(self, status, message, data=""):
+        super().__init__(message)
+        self.status, self.message, self.data = status, message, data
+
+
+class MockRPCServer(ThreadingHTTPServer):
+    """MockChain を HTTP で返すサーバ（遅延・エラー・429 の注入つき）"""
+
+    daemon_threads = True
+
+    def __init__(self, address, chain, latency=0.0, jitter=0.0, error_rate=0.0,
+                 burst_every=0.0, burst_length=0.0, retry_after=1, seed=0):
+        super().__init__(address, MockRPCHandler)
+        self.chain = chain
+        self.latency = latency  # 1リクエストあたりの平均遅延（秒）
+        self.jitter = jitter  # 遅延のばらつき（± 秒）
+        self.error_rate = error_rate  # 500 を返す確率
+        self.burst_every = burst_every  # この秒数ごとに…
+        self.burst_length = burst_length  # …この秒数のあいだ全リクエストに 429 を返す
+        self.retry_after = retry_after  # 429 の Retry-After（秒）
+        self.rng = random.Random(seed)
+        self.started = time.monotonic()
+        self.stats_lock = threading.Lock()
+        self.stats = {}  # (パス, ステータス) → 回数
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, path, status):
+        with self.stats_lock:
+            self.stats[(path, status)] = self.stats.get((path, status), 0) + 1
+
+    def in_burst(self):
+        if not self.burst_every or not self.burst_length:
+            return False
+        return (time.monotonic() - self.started) % self.burst_every < self.burst_length
+
+    def delay(self):
+        with self.stats_lock:
+            return max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter)), self.rng.random()
+
+    def handle_rpc(self, path, params):
+        chain = self.chain
+        latest = chain.latest_height()
+
+        def height_param(name="height", default=latest):
+            raw = params.get(name)
+            if raw in (None, "", "0"):
+                return default
+            try:
+                height = int(raw)
+            except ValueError:
+                raise RPCError(500, "Internal error", f"invalid {name}: {raw}")
+            if height > latest:
+                raise RPCError(500, "Internal error",
+                               f"height {height} must be less than or equal to the current blockchain height {latest}")
+            if height < chain.lowest_height:
+                raise RPCError(500, "Internal error",
+                               f"height {height} is not available, lowest height is {chain.lowest_height}")
+            return height
+
+        if path == "/block":
+            return chain.block(height_param())
+        if path == "/validators":
+            height = height_param()
+            validators = chain.validators(height)
+            try:
+                per_page = min(max(int(params.get("per_page", 30)), 1), MAX_PER_PAGE)
+                page = int(params.get("page", 1))
+            except ValueError:
+                raise RPCError(500, "Internal error", "invalid page or per_page")
+            pages = max((len(validators) + per_page - 1) // per_page, 1)
+            if page < 1 or page > pages:
+                raise RPCError(500, "Internal error", f"page should be within [1, {pages}] range, given {page}")
+            items = validators[(page - 1) * per_page:page * per_page]
+            return {"block_height": str(height), "validators": items,
+                    "count": str(len(items)), "total": str(len(validators))}
+        if path == "/status":
+            time_ns = chain.state(latest)[0]
+            return {
+                "node_info": {"network": CHAIN_ID, "moniker": "mock"},
+                "sync_info": {"latest_block_hash": sha_hex("block", latest), "latest_block_height": str(latest),
+                              "latest_block_time": format_time(time_ns),
+                              "earliest_block_height": str(chain.lowest_height), "catching_up": False},
+            }
+        if path == "/blockchain":
+            max_height = height_param("maxHeight", latest)
+            min_height = height_param("minHeight", chain.lowest_height)
+            min_height = max(min_height, max_height - BLOCKCHAIN_PAGE + 1)
+            if min_height > max_height:
+                raise RPCError(500, "Internal error", f"min height {min_height} can't be greater than max height {max_height}")
+            return {"last_height": str(latest),
+                    "block_metas": [chain.block_meta(h) for h in range(max_height, min_height - 1, -1)]}
+        raise RPCError(404, "Method not found", path)
+
+
+class MockRPCHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive（requests.Session の接続再利用を効かせる）
+    disable_nagle_algorithm = True  # ヘッダと本文を別々に送るので、Nagle と遅延ACKで 40ms 待たないように
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        raw = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        wait, roll = server.delay()
+        time.sleep(wait)
+
+        if server.in_burst():
+            server.count(url.path, 429)
+            self.send_json(429, {"error": "Too Many Requests"}, {"Retry-After": str(server.retry_after)})
+            return
+        if roll < server.error_rate:
+            server.count(url.path, 500)
+            self.send_json(500, {"jsonrpc": "2.0", "id": -1,
+                                 "error": {"code": -32603, "message": "Internal error", "data": "injected error"}})
+            return
+        try:
+            result = server.handle_rpc(url.path, params)
+        except RPCError as e:
+            server.count(url.path, e.status)
+            self.send_json(e.status, {"jsonrpc": "2.0", "id": -1,
+                                      "error": {"code": -32603, "message": e.message, "data": e.data}})
+            return
+        server.count(url.path, 200)
+        self.send_json(200, {"jsonrpc": "2.0", "id": -1, "result": result})
+
+
+def start_server(host="127.0.0.1", port=0, chain_options=None, **server_options):
+    """バックグラウンドのスレッドでサーバを起動して返す（port=0 で空いているポート）"""
+    server = MockRPCServer((host, port), MockChain(**(chain_options or {})), **server_options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_arguments(parser):
+    """mock_rpc.py と bench_fetchers.py で共通の設定"""
+    parser.add_argument("--latest-height", type=int, default=100_000, help="最新の高さ")
+    parser.add_argument("--span", type=int, default=10_000, help="取得できる高さの数（それより古い高さは刈り込み済み）")
+    parser.add_argument("--validators", type=int, default=50, help="バリデータ数")
+    parser.add_argument("--set-change-every", type=int, default=0, help="この高さごとに投票力を変える（0: 変えない）")
+    parser.add_argument("--grow", action="store_true", help="block-time ごとに最新の高さを伸ばす")
+    parser.add_argument("--block-time", type=float, default=6.0, help="ブロック間隔（秒）")
+    parser.add_argument("--latency", type=float, default=0.0, help="応答の平均遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="遅延のばらつき（± 秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="500 を返す確率")
+    parser.add_argument("--burst-every", type=float, default=0.0, help="この秒数ごとに 429 を返す期間を入れる")
+    parser.add_argument("--burst-length", type=float, default=0.0, help="429 を返し続ける秒数")
+    parser.add_argument("--retry-after", type=int, default=1, help="429 の Retry-After（秒）")
+    parser.add_argument("--seed", type=int, default=0, help="乱数の種")
+
+
+def split_options(args):
+    """argparse の結果を (MockChain の引数, MockRPCServer の引数) に分ける"""
+    chain_options = {
+        "latest_height": args.latest_height, "span": args.span, "validators": args.validators,
+        "seed": args.seed, "block_time": args.block_time, "set_change_every": args.set_change_every,
+        "grow": args.grow,
+    }
+    server_options = {
+        "latency": args.latency, "jitter": args.jitter, "error_rate": args.error_rate,
+        "burst_every": args.burst_every, "burst_length": args.burst_length,
+        "retry_after": args.retry_after, "seed": args.seed,
+    }
+    return chain_options, server_options
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ローカルの Tendermint RPC モックサーバ")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=26657)
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    chain_options, server_options = split_options(args)
+    server = MockRPCServer((args.host, args.port), MockChain(**chain_options), **server_options)
+    print(f"🧪 Mock RPC: {server.url}  (高さ {server.chain.lowest_height} 〜 {server.chain.latest_height()})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import argparse
+import importlib
+import os
+import sys
+
+# EX_analyse_BC のスクリプトをまとめて実行するコマンドライン
+#
+#   python cli.py fetch-blocks --count 5000 --mode blockchain --rpc-url https://a.example --rpc-url https://b.example
+#   python cli.py fetch-validators --count 500 --storage delta --format segments
+#   python cli.py analyse --workers 4 --last 1000 --table-format parquet
+#   python cli.py verify-timestamps
+#   python cli.py report --workers 4   (analyse と verify-timestamps をブロックの1回の走査で実行)
+#   python cli.py plot distribution
+#   python cli.py tail --snapshot-every 5
+#
+# 各サブコマンドは実行するときに必要なスクリプトだけを import する
+# （fetch 系は pandas / matplotlib を読み込まないので起動が速い）。
+# 入出力の相対パスは従来どおり各スクリプトのディレクトリ基準（--workdir で変更可）。
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPT_DIRS = {
+    "BC_BLOCK_PRO": "get_blockproposer",
+    "analyse_proposer": "get_blockproposer",
+    "get_validators_set_v2": "get_validator_info",
+    "analyse_v2": "get_validator_info",
+    "verify_validator_timestamp": "get_validator_info",
+    "distribution": "get_validator_info",
+    "live_tail": "get_validator_info",
+}
+PLOTS = {"distribution": "distribution", "proposer": "analyse_proposer"}
+
+
+def load_script(name, workdir=None):
+    """スクリプトを import し、作業ディレクトリをそのスクリプトの場所（または workdir）に移す"""
+    script_dir = os.path.join(BASE_DIR, SCRIPT_DIRS[name])
+    if script_dir not in sys.path:
+        sys.path.insert(0, script_dir)
+    os.chdir(workdir or script_dir)
+    return importlib.import_module(name)
+
+
+def override(module, **settings):
+    """指定されたオプション（None 以外）でスクリプトの設定定数を上書きする"""
+    for key, value in settings.items():
+        if value is not None:
+            setattr(module, key, value)
+
+
+def height_range(args):
+    return {"FROM_HEIGHT": args.from_height, "TO_HEIGHT": args.to_height, "LAST": args.last}
+
+
+def add_range_arguments(parser):
+    parser.add_argument("--from-height", type=int, help="解析する最初の高さ")
+    parser.add_argument("--to-height", type=int, help="解析する最後の高さ")
+    parser.add_argument("--last", type=int, help="範囲の末尾から N ブロックだけ解析")
+
+
+def add_table_format_argument(parser):
+    parser.add_argument("--table-format", choices=["csv", "parquet", "feather"],
+                        help="表の保存形式（parquet / feather は pyarrow が必要）")
+
+
+def cmd_fetch_blocks(args):
+    module = load_script("BC_BLOCK_PRO", args.workdir)
+    override(module, RPC_URLS=args.rpc_url, RATE_LIMIT=args.rate_limit, TABLE_FORMAT=args.table_format)
+    return module.main(
+        block_count=args.count or module.BLOCK_COUNT,
+        fetch_mode=args.mode or module.FETCH_MODE,
+        output_csv=args.output or module.OUTPUT_CSV,
+    )
+
+
+def cmd_fetch_validators(args):
+    module = load_script("get_validators_set_v2", args.workdir)
+    override(module, RPC_URLS=args.rpc_url, STORAGE_MODE=args.storage, STORAGE_FORMAT=args.format,
+             VALIDATOR_SOURCE=args.source, RESUME=False if args.no_resume else None)
+    return module.main(block_count=args.count or module.BLOCK_COUNT)
+
+
+def cmd_analyse(args):
+    module = load_script("analyse_v2", args.workdir)
+    override(module, DATA_FORMAT=args.format, WORKERS=args.workers, MAX_BLOCKS=args.max_blocks,
+             CACHE=False if args.no_cache else None, TABLE_FORMAT=args.table_format, **height_range(args))
+    return module.main(directory=args.data_dir or module.data_directory,
+                       output_csv=args.output or "block_analysis.csv")
+
+
+def cmd_verify_timestamps(args):
+    module = load_script("verify_validator_timestamp", args.workdir)
+    override(module, DATA_FORMAT=args.format, MAX_BLOCKS=args.max_blocks, CACHE=False if args.no_cache else None,
+             **height_range(args))
+    return module.main(target_dir=args.data_dir or module.TARGET_DIR)
+
+
+def cmd_report(args):
+    """analyse と verify-timestamps を、ブロックデータの1回の走査でまとめて実行する"""
+    analyse = load_script("analyse_v2", args.workdir)
+    verify = load_script("verify_validator_timestamp", args.workdir)
+    for module in (analyse, verify):
+        override(module, DATA_FORMAT=args.format, MAX_BLOCKS=args.max_blocks,
+                 CACHE=False if args.no_cache else None, **height_range(args))
+    override(analyse, WORKERS=args.workers, TABLE_FORMAT=args.table_format)
+    directory = args.data_dir or analyse.data_directory
+    engine = analyse.make_engine(directory)
+    engine.register(analyse.make_analysis(directory, args.output or "block_analysis.csv"))
+    engine.register(verify.make_analysis(directory))
+    engine.run()
+
+
+def cmd_plot(args):
+    if args.table_format and args.target != "distribution":
+        # analyse_proposer.py は表を書き出さないので、指定されても効かない
+        print(f"⚠️ --table-format は plot distribution でだけ使えます（plot {args.target} は表を保存しません）")
+        return 2
+    module = load_script(PLOTS[args.target], args.workdir)
+    override(module, RENDER_WORKERS=args.workers, TABLE_FORMAT=args.table_format)
+    return module.main()
+
+
+def cmd_tail(args):
+    module = load_script("live_tail", args.workdir)
+    override(module, SUBSCRIBE=args.subscribe, SNAPSHOT_EVERY=args.snapshot_every, VALIDATOR_SOURCE=args.source)
+    module.fetcher.RPC_URLS = args.rpc_url or module.fetcher.RPC_URLS
+    return module.main(max_blocks=args.max_blocks, snapshot_file=args.output or module.SNAPSHOT_FILE)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Cosmos ブロックチェーンの取得・分析")
+    parser.add_argument("--workdir", help="入出力の基準ディレクトリ（既定: 各スクリプトのディレクトリ）")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("fetch-blocks", help="ブロックヘッダを取得して CSV に保存（BC_BLOCK_PRO.py）")
+    p.add_argument("--count", type=int, help="遡るブロック数")
+    p.add_argument("--mode", choices=["sequential", "concurrent", "blockchain"], help="取得方法")
+    p.add_argument("--rpc-url", action="append", help="RPC エンドポイント（複数指定で振り分け）")
+    p.add_argument("--rate-limit", type=float, help="1秒あたりの最大リクエスト数（0 で無制限）")
+    p.add_argument("--output", help="出力 CSV")
+    add_table_format_argument(p)
+    p.set_defaults(func=cmd_fetch_blocks)
+
+    p = sub.add_parser("fetch-validators", help="ブロックとバリデータセットを取得（get_validators_set_v2.py）")
+    p.add_argument("--count", type=int, help="取得するブロック数")
+    p.add_argument("--storage", choices=["full", "delta"], help="保存形式")
+    p.add_argument("--format", choices=["files", "segments"], help="保存先")
+    p.add_argument("--source", choices=["rpc", "simulate"], help="優先度の取得方法")
+    p.add_argument("--rpc-url", action="append", help="RPC エンドポイント（複数指定で振り分け）")
+    p.add_argument("--no-resume", action="store_true", help="取得済みの高さも取り直す")
+    p.set_defaults(func=cmd_fetch_validators)
+
+    p = sub.add_parser("analyse", help="proposer と優先度の解析（analyse_v2.py）")
+    p.add_argument("--data-dir", help="ブロックデータのディレクトリ")
+    p.add_argument("--format", choices=["files", "segments"], help="データの形式")
+    p.add_argument("--workers", type=int, help="並列に解析するプロセス数")
+    p.add_argument("--max-blocks", type=int, help="解析するブロック数の上限")
+    p.add_argument("--output", help="出力 CSV")
+    p.add_argument("--no-cache", action="store_true", help="前回の解析結果を使わずに全ブロックを読み直す")
+    add_range_arguments(p)
+    add_table_format_argument(p)
+    p.set_defaults(func=cmd_analyse)
+
+    p = sub.add_parser("verify-timestamps", help="署名タイムスタンプの検証（verify_validator_timestamp.py）")
+    p.add_argument("--data-dir", help="ブロックデータのディレクトリ")
+    p.add_argument("--format", choices=["files", "segments"], help="データの形式")
+    p.add_argument("--max-blocks", type=int, help="解析するブロック数の上限")
+    p.add_argument("--no-cache", action="store_true", help="前回の集計を使わずに全ブロックを読み直す")
+    add_range_arguments(p)
+    p.set_defaults(func=cmd_verify_timestamps)
+
+    p = sub.add_parser("report", help="analyse と verify-timestamps をブロックの1回の走査でまとめて実行")
+    p.add_argument("--data-dir", help="ブロックデータのディレクトリ")
+    p.add_argument("--format", choices=["files", "segments"], help="データの形式")
+    p.add_argument("--workers", type=int, help="並列にブロックを読むプロセス数")
+    p.add_argument("--max-blocks", type=int, help="解析するブロック数の上限（両方の解析に適用）")
+    p.add_argument("--output", help="analyse の出力 CSV")
+    p.add_argument("--no-cache", action="store_true", help="前回の結果を使わずに全ブロックを読み直す")
+    add_range_arguments(p)
+    add_table_format_argument(p)
+    p.set_defaults(func=cmd_report)
+
+    p = sub.add_parser("plot", help="図の作成（distribution.py / analyse_proposer.py）")
+    p.add_argument("target", choices=sorted(PLOTS), help="distribution: 生成間隔と順位 / proposer: ブロック生成時間")
+    p.add_argument("--workers", type=int, help="図を描くプロセス数")
+    p.add_argument("--table-format", choices=["csv", "parquet", "feather"],
+                   help="distribution の表の保存形式（parquet / feather は pyarrow が必要。proposer では使えない）")
+    p.set_defaults(func=cmd_plot)
+
+    p = sub.add_parser("tail", help="新しいブロックを追いかけて統計を逐次更新（live_tail.py）")
+    p.add_argument("--subscribe", choices=["auto", "websocket", "poll"], help="新しいブロックの知り方")
+    p.add_argument("--source", choices=["rpc", "simulate"], help="優先度の取得方法")
+    p.add_argument("--rpc-url", action="append", help="RPC エンドポイント（複数指定で振り分け）")
+    p.add_argument("--snapshot-every", type=float, help="スナップショットを書き出す間隔（秒）")
+    p.add_argument("--max-blocks", type=int, help="この数のブロックを取り込んだら終了（既定: Ctrl+C まで）")
+    p.add_argument("--output", help="スナップショットの JSON")
+    p.set_defaults(func=cmd_tail)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# 図の一括描画
+#
+# 図は「仕様」（dict）のリストとして渡す:
+#   {"kind": "hist" | "trend" | "scatter" | "bar", "output": "xxx.png",
+#    "data": {"x": 配列, "y": 配列, ...}, "title": ..., "xlabel": ..., "ylabel": ...,
+#    "figsize": (幅, 高さ), "options": {描画関数に渡す引数}, "grid": True / {"axis": "y", ...},
+#    "xticks": 配列, "xticks_rotation": 角度, "yscale": "log",
+#    "aggregate": "auto" / True / False, "colorbar_label": 2次元ヒストグラムの色の説明}
+# 入力データのハッシュが前回と同じで出力ファイルも残っている図は描き直さない。
+# 残りはワーカープロセス（Aggバックエンド）で並行に描画する。
+#
+# 点数の多い scatter / trend は描画前に NumPy で集計してから渡す（"aggregate"）:
+#   scatter → 固定サイズの2次元ヒストグラム（"density"、セルの点数を色で表す）
+#   trend   → 横1ピクセルごとに最小・最大の2点だけ残した折れ線（"minmax"）
+# 集計後の点数は図のピクセル数で決まるので、行数が増えても描画時間・メモリは増えない。
+
+CACHE_FILE = ".figure_cache.json"
+DPI = 100  # savefig の既定の解像度（図のピクセル数の計算に使う）
+AGGREGATE_POINTS = 100_000  # "aggregate": "auto" のとき、これより点が多ければ集計する
+DENSITY_CELL_PX = 4  # 2次元ヒストグラムの1セルの大きさ（ピクセル）
+
+
+def _hash_value(h, value):
+    if isinstance(value, dict):
+        for key in sorted(value):
+            h.update(str(key).encode("utf-8"))
+            _hash_value(h, value[key])
+        return
+    if hasattr(value, "to_numpy"):
+        value = value.to_numpy()
+    if isinstance(value, np.ndarray) and value.dtype != object and value.dtype.kind not in "US":
+        array = np.ascontiguousarray(value)
+        h.update(f"{array.dtype.str}{array.shape}".encode("utf-8"))
+        h.update(array.tobytes())
+        return
+    if isinstance(value, np.ndarray):
+        value = value.tolist()
+    h.update(json.dumps(value, sort_keys=True, default=str).encode("utf-8"))
+
+
+def minmax_decimate(x, y, buckets):
+    """折れ線を buckets 個の区間に分け、各区間の最小・最大の点だけを元の順序で残す"""
+    x, y = np.asarray(x), np.asarray(y, dtype=np.float64)
+    keep = ~np.isnan(y)
+    x, y = x[keep], y[keep]
+    n = len(y)
+    if n <= 2 * buckets:
+        return x, y
+    bucket = np.arange(n, dtype=np.int64) * buckets // n
+    order = np.lexsort((y, bucket))  # 区間ごとに y の昇順
+    ends = np.searchsorted(bucket[order], np.arange(buckets), side="right")
+    starts = np.concatenate(([0], ends[:-1]))
+    index = np.union1d(order[starts], order[ends - 1])
+    return x[index], y[index]
+
+
+def density_grid(x, y, bins):
+    """散布図の点を (x方向, y方向) bins 個のセルに数え、(点数, xの境界, yの境界) を返す"""
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    keep = np.isfinite(x) & np.isfinite(y)
+    x, y = x[keep], y[keep]
+    if not len(x):
+        return np.zeros(bins, dtype=np.int64), np.linspace(0, 1, bins[0] + 1), np.linspace(0, 1, bins[1] + 1)
+    edges = []
+    for values, n in zip((x, y), bins):
+        low, high = float(values.min()), float(values.max())
+        if high - low < n and np.all(values == np.round(values)):
+            # 整数値（順位など）は1つの値に1セルを割り当てる（空の縞ができないように）
+            edges.append(np.arange(low - 0.5, high + 1.5))
+        else:
+            edges.append(np.linspace(low, high, n + 1) if low < high else np.array([low - 0.5, low + 0.5]))
+    counts, x_edges, y_edges = np.histogram2d(x, y, bins=edges)
+    return counts.astype(np.int64), x_edges, y_edges
+
+
+def aggregate_spec(spec):
+    """点数の多い scatter / trend を集計済みの density / minmax に置き換えた仕様を返す"""
+    mode = spec.get("aggregate", "auto")
+    if spec["kind"] not in ("scatter", "trend") or not mode:
+        return spec
+    data = spec["data"]
+    if mode == "auto" and len(data["x"]) <= AGGREGATE_POINTS:
+        return spec
+
+    width, height = spec.get("figsize", (10, 5))
+    if spec["kind"] == "trend":
+        x, y = minmax_decimate(data["x"], data["y"], int(width * DPI))
+        return {**spec, "kind": "minmax", "data": {"x": x, "y": y}}
+
+    bins = (int(width * DPI) // DENSITY_CELL_PX, int(height * DPI) // DENSITY_CELL_PX)
+    counts, x_edges, y_edges = density_grid(data["x"], data["y"], bins)
+    return {**spec, "kind": "density", "options": {},
+            "data": {"counts": counts, "x_edges": x_edges, "y_edges": y_edges}}
+
+
+def spec_hash(spec):
+    """図の仕様（データを含む）のハッシュ"""
+    h = hashlib.sha256()
+    _hash_value(h, spec)
+    return h.hexdigest()
+
+
+def render_figure(spec):
+    """1枚の図を描いて保存する（ワーカープロセス内で実行される）"""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    data = spec.get("data", {})
+    options = spec.get("options", {})
+    fig, ax = plt.subplots(figsize=spec.get("figsize", (10, 5)))
+    kind = spec["kind"]
+    if kind == "hist":
+        ax.hist(data["x"], **options)
+    elif kind in ("trend", "minmax"):
+        ax.plot(data["x"], data["y"], **options)
+    elif kind == "scatter":
+        ax.scatter(data["x"], data["y"], **options)
+    elif kind == "bar":
+        ax.bar(data["x"], data["y"], **options)
+    elif kind == "density":
+        from matplotlib.colors import LogNorm
+        counts = np.ma.masked_equal(data["counts"], 0)  # 点の無いセルは塗らない
+        mesh = ax.pcolormesh(data["x_edges"], data["y_edges"], counts.T,
+                             norm=LogNorm(vmin=1, vmax=max(int(data["counts"].max()), 1)), **options)
+        fig.colorbar(mesh, ax=ax, label=spec.get("colorbar_label", "Count"))
+    else:
+        raise ValueError(f"Unknown figure kind: {kind}")
+
+    ax.set_title(spec.get("title", ""))
+    ax.set_xlabel(spec.get("xlabel", ""))
+    ax.set_ylabel(spec.get("ylabel", ""))
+    if "xticks" in spec:
+        ax.set_xticks(spec["xticks"])
+    if "xticks_rotation" in spec:
+        ax.tick_params(axis="x", labelrotation=spec["xticks_rotation"])
+    if "yscale" in spec:
+        ax.set_yscale(spec["yscale"])
+    grid = spec.get("grid")
+    if isinstance(grid, dict):
+        ax.grid(True, **grid)
+    elif grid:
+        ax.grid(True)
+    if spec.get("tight_layout", True):
+        fig.tight_layout()
+    fig.savefig(spec["output"])
+    plt.close(fig)
+    return spec["output"]
+
+
+def render_figures(specs, workers=None, cache_file=CACHE_FILE):
+    """図をまとめて描画し、(描画した出力, スキップした出力) を返す"""
+    cache = {}
+    if cache_file and os.path.exists(cache_file):
+        with open(cache_file, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+
+    pending, skipped, hashes = [], [], {}
+    for spec in specs:
+        spec = aggregate_spec(spec)
+        digest = spec_hash(spec)
+        hashes[spec["output"]] = digest
+        if cache.get(spec["output"]) == digest and os.path.exists(spec["output"]):
+            skipped.append(spec["output"])
+        else:
+            pending.append(spec)
+
+    workers = workers or os.cpu_count() or 1
+    if len(pending) <= 1 or workers <= 1:
+        rendered = [render_figure(spec) for spec in pending]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+            rendered = list(pool.map(render_figure, pending))
+
+    if cache_file:
+        cache.update({output: hashes[output] for output in rendered})
+        tmp_file = cache_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(cache, f, indent=1)
+        os.replace(tmp_file, cache_file)
+    return rendered, skipped
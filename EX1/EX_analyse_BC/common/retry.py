@@ -0,0 +1,158 @@
+import email.utils
+import random
+import threading
+import time
+
+import requests
+
+# RPC 取得の共通リトライ層
+#
+# - RetryPolicy   : 指数バックオフ（full jitter）。attempt 回目の待ち時間は 0〜min(max_delay, base × 2^(attempt-1)) の一様乱数
+# - CircuitBreaker: 失敗が続いたら / 429・503 で Retry-After が来たら、そのエンドポイントへの取得をまとめて止める。
+#                   止めた時間が過ぎたら1件だけ試し（half-open）、成功したら全員再開・失敗したら更に長く止める。
+# - fetch_once    : 1回だけ GET して、成功 / 再試行しても無駄 / 再試行する を判定する
+# 再試行のループは rpc_pool.RPCPool.get_json の1か所だけにあり、これらを使ってエンドポイントを選び直しながら再試行する。
+# 1つのエンドポイントには1つの CircuitBreaker を全スレッドで共有する。
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRY_AFTER_STATUSES = {429, 503}
+# CometBFT は存在しない高さにも 500 を返すので、本文で「再試行しても無駄」なものを見分ける
+PERMANENT_ERRORS = ("is not available", "must be less than or equal", "could not find")
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts=10, base_delay=0.5, max_delay=30.0, multiplier=2.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+
+    def backoff(self, attempt):
+        """attempt 回目の失敗のあとに待つ秒数"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * self.multiplier ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold=5, cooldown=5.0, max_cooldown=120.0, probe_timeout=60.0, log=print):
+        self.failure_threshold = failure_threshold  # 連続でこの回数失敗したら止める
+        self.cooldown = cooldown  # 最初に止める秒数（half-open で失敗するたびに倍）
+        self.max_cooldown = max_cooldown
+        self.probe_timeout = probe_timeout  # half-open の試行が戻らないときに次の試行を許すまでの秒数
+        self.log = log
+        self.lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.current_cooldown = cooldown
+        self.open_until = 0.0
+        self.probe_started = 0.0
+        self.trips = 0  # 止めた回数（統計用）
+
+    def _enter(self):
+        """取得してよければ 0、だめなら待つべき秒数を返す（lock を持った状態で呼ぶ）"""
+        now = time.monotonic()
+        if self.state == self.CLOSED:
+            return 0.0
+        if self.state == self.OPEN:
+            if now < self.open_until:
+                return self.open_until - now
+            self.state = self.HALF_OPEN  # この呼び出し元が試行役
+            self.probe_started = now
+            return 0.0
+        if now - self.probe_started >= self.probe_timeout:
+            self.probe_started = now
+            return 0.0
+        return min(1.0, self.probe_timeout - (now - self.probe_started))
+
+    def ready(self):
+        """待たずに判定する: 取得してよければ True（half-open なら呼び出し元が試行役になる）"""
+        with self.lock:
+            return self._enter() == 0
+
+    def blocked_for(self):
+        """状態を変えずに、あと何秒取得できないかを返す（0 なら取得できる）"""
+        with self.lock:
+            now = time.monotonic()
+            if self.state == self.OPEN:
+                return max(0.0, self.open_until - now)
+            if self.state == self.HALF_OPEN:
+                return max(0.0, min(1.0, self.probe_timeout - (now - self.probe_started)))
+            return 0.0
+
+    def _open(self, seconds, reason):
+        self.state = self.OPEN
+        self.open_until = max(self.open_until, time.monotonic() + seconds)
+        self.failures = 0
+        self.trips += 1
+        self.log(f"[CircuitBreaker] {reason}: pausing all requests for {seconds:.1f}s")
+
+    def record_success(self):
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.current_cooldown = self.cooldown
+
+    def record_failure(self):
+        with self.lock:
+            if self.state == self.HALF_OPEN:
+                self.current_cooldown = min(self.current_cooldown * 2, self.max_cooldown)
+                self._open(self.current_cooldown, "probe failed")
+                return
+            self.failures += 1
+            if self.state == self.CLOSED and self.failures >= self.failure_threshold:
+                self._open(self.current_cooldown, f"{self.failures} consecutive failures")
+
+    def pause(self, seconds):
+        """Retry-After を受け取ったとき: 指定された秒数だけ全体を止める"""
+        with self.lock:
+            if self.state == self.OPEN and self.open_until >= time.monotonic() + seconds:
+                return
+            self._open(seconds, "Retry-After")
+
+
+def parse_retry_after(value):
+    """Retry-After ヘッダ（秒数 or HTTP-date）を秒数にする（無い・読めない場合は None）"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_permanent_error(response):
+    """再試行しても結果が変わらないエラー応答か"""
+    if response.status_code not in RETRY_STATUSES:
+        return True
+    try:
+        error = response.json().get("error", {})
+    except ValueError:
+        return False
+    message = f"{error.get('message', '')} {error.get('data', '')}" if isinstance(error, dict) else str(error)
+    return any(pattern in message for pattern in PERMANENT_ERRORS)
+
+
+def fetch_once(get, url, **kwargs):
+    """1回だけ GET して (結果, JSON or 理由, Retry-After秒) を返す
+
+    結果は "ok"（200 の JSON）/ "permanent"（再試行しても無駄）/ "retry"（再試行する）。
+    """
+    try:
+        response = get(url, **kwargs)
+        if response.status_code == 200:
+            return "ok", response.json(), None
+    except (requests.exceptions.RequestException, ValueError) as e:
+        return "retry", str(e) or type(e).__name__, None
+    reason = f"Status Code: {response.status_code}"
+    if is_permanent_error(response):
+        return "permanent", reason, None
+    retry_after = None
+    if response.status_code in RETRY_AFTER_STATUSES:
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+    return "retry", reason, retry_after
+
@@ -0,0 +1,234 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from common.retry import CircuitBreaker, fetch_once
+
+# 複数の RPC エンドポイントへの振り分け
+#
+# - 各エンドポイントのレイテンシ（EWMA）・エラー率（EWMA）・処理中の件数からスコアを出し、一番良いところに送る
+# - 応答がプール全体のレイテンシの p95 を超えても返ってこなければ、2番目のエンドポイントにも同じリクエストを送る
+#   （ヘッジ。先に成功した方を使う）
+# - /status の最新の高さが最も進んでいるエンドポイントより max_lag 以上遅れていたら外す
+#   （エンドポイントが複数のときだけ、refresh_interval ごとにバックグラウンドで確認）
+# - エンドポイントごとに CircuitBreaker を持ち、止まっているエンドポイントには送らない
+# - あるエンドポイントで「その高さは無い」（刈り込み済み）と言われたら、他のエンドポイントにも聞く
+
+EWMA_ALPHA = 0.2  # レイテンシ・エラー率の指数移動平均の重み
+ERROR_PENALTY = 10.0  # エラー率 1.0 でスコアが何倍悪くなるか
+HEDGE_MIN_SAMPLES = 20  # p95 を出すのに必要なレイテンシの標本数（それまではヘッジしない）
+
+
+class Endpoint:
+    def __init__(self, url, breaker):
+        self.url = url.rstrip("/")
+        self.breaker = breaker
+        self.latency = None  # 成功したリクエストのレイテンシの EWMA（秒）
+        self.error_rate = 0.0  # 失敗の EWMA（0〜1）
+        self.in_flight = 0
+        self.latest_height = None  # /status で最後に確認した最新の高さ
+        self.lagging = False
+        self.requests = 0
+        self.failures = 0
+        self.hedges = 0  # ヘッジとして送られた回数
+        self.hedges_won = 0  # ヘッジが先に成功した回数
+
+    def score(self, default_latency):
+        """小さいほど良い（レイテンシが未計測なら default_latency とみなす）"""
+        latency = self.latency if self.latency is not None else default_latency
+        return latency * (1 + ERROR_PENALTY * self.error_rate) * (1 + self.in_flight)
+
+
+class RPCPool:
+    def __init__(self, urls, policy, hedge=True, hedge_quantile=95, hedge_min_delay=0.05, max_lag=5,
+                 refresh_interval=30.0, window=500, timeout=10, breaker_failures=5, breaker_cooldown=5.0,
+                 max_workers=32, headers=None, log=print):
+        if not urls:
+            raise ValueError("RPCPool needs at least one endpoint")
+        self.urls = list(urls)
+        self.policy = policy
+        self.hedge = hedge and len(urls) > 1
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.max_lag = max_lag
+        self.refresh_interval = refresh_interval
+        self.timeout = timeout
+        self.log = log
+        self.endpoints = [Endpoint(url, CircuitBreaker(breaker_failures, breaker_cooldown, log=log)) for url in urls]
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=window)  # プール全体の成功レイテンシ（ヘッジの閾値に使う）
+        self.hedges_sent = 0
+        self.last_refresh = 0.0
+        self.refreshing = False
+
+        self.session = requests.Session()
+        if headers:
+            self.session.headers.update(headers)
+        adapter = HTTPAdapter(pool_connections=len(urls), pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rpc-pool")
+
+    # ---- 最新の高さの確認（遅れているエンドポイントを外す）----
+    def refresh_heights(self):
+        for endpoint in self.endpoints:
+            outcome, data, _ = fetch_once(self.session.get, f"{endpoint.url}/status", timeout=self.timeout)
+            if outcome == "ok":
+                try:
+                    endpoint.latest_height = int(data["result"]["sync_info"]["latest_block_height"])
+                except (KeyError, TypeError, ValueError):
+                    pass
+        heights = [e.latest_height for e in self.endpoints if e.latest_height is not None]
+        best = max(heights) if heights else None
+        for endpoint in self.endpoints:
+            lagging = (best is not None and endpoint.latest_height is not None
+                       and best - endpoint.latest_height > self.max_lag)
+            if lagging and not endpoint.lagging:
+                self.log(f"[RPCPool] {endpoint.url} is {best - endpoint.latest_height} blocks behind, skipping it")
+            endpoint.lagging = lagging
+        with self.lock:
+            self.last_refresh = time.monotonic()
+            self.refreshing = False
+
+    def maybe_refresh(self):
+        """refresh_interval ごとに最新の高さをバックグラウンドで確認する（リクエストは待たせない）
+
+        遅れは他のエンドポイントとの比較でしか分からないので、1つだけのときは確認しない
+        （/status の分だけ、レート制限のあるノードへのリクエストを増やさないため）。
+        """
+        if len(self.endpoints) == 1:
+            return
+        with self.lock:
+            if self.refreshing or time.monotonic() - self.last_refresh < self.refresh_interval:
+                return
+            self.refreshing = True
+        threading.Thread(target=self.refresh_heights, daemon=True).start()
+
+    # ---- 振り分け ----
+    def ranked(self, exclude=()):
+        """送ってよいエンドポイントをスコアの良い順に返す"""
+        with self.lock:
+            known = [e.latency for e in self.endpoints if e.latency is not None]
+            default_latency = min(known) if known else 0.0  # 未計測のものは1度は試す
+            candidates = [e for e in self.endpoints if e not in exclude and e.breaker.blocked_for() == 0]
+            healthy = [e for e in candidates if not e.lagging] or candidates
+            return sorted(healthy, key=lambda e: e.score(default_latency))
+
+    def pick(self, exclude=()):
+        """次に送るエンドポイントを選ぶ（half-open のものは試行役を取れた場合だけ）"""
+        for endpoint in self.ranked(exclude):
+            if endpoint.breaker.ready():
+                with self.lock:
+                    endpoint.in_flight += 1
+                return endpoint
+        return None
+
+    def wait_for_endpoint(self, exclude=()):
+        """どこかのエンドポイントが使えるようになるまで待って選ぶ"""
+        while True:
+            endpoint = self.pick(exclude)
+            if endpoint is not None:
+                return endpoint
+            remaining = [e for e in self.endpoints if e not in exclude]
+            if not remaining:
+                return None
+            time.sleep(max(0.01, min(1.0, min(e.breaker.blocked_for() for e in remaining))))
+
+    def hedge_delay(self):
+        with self.lock:
+            if len(self.latencies) < HEDGE_MIN_SAMPLES:
+                return None
+            samples = np.fromiter(self.latencies, dtype=np.float64)
+        return max(self.hedge_min_delay, float(np.percentile(samples, self.hedge_quantile)))
+
+    def send(self, endpoint, path):
+        """1回送って結果を記録し、fetch_once と同じ形で返す"""
+        start = time.perf_counter()
+        try:
+            outcome, value, retry_after = fetch_once(self.session.get, f"{endpoint.url}{path}", timeout=self.timeout)
+        finally:
+            elapsed = time.perf_counter() - start
+        with self.lock:
+            endpoint.in_flight -= 1
+            endpoint.requests += 1
+            failed = outcome == "retry"
+            endpoint.error_rate = (1 - EWMA_ALPHA) * endpoint.error_rate + EWMA_ALPHA * failed
+            if failed:
+                endpoint.failures += 1
+            else:
+                endpoint.latency = elapsed if endpoint.latency is None else (
+                    (1 - EWMA_ALPHA) * endpoint.latency + EWMA_ALPHA * elapsed)
+                self.latencies.append(elapsed)
+        if not failed:
+            endpoint.breaker.record_success()
+        elif retry_after is not None:
+            endpoint.breaker.pause(retry_after)
+        else:
+            endpoint.breaker.record_failure()
+        return outcome, value, retry_after
+
+    def get_json(self, path):
+        """path（例: "/block?height=1"）を取得して JSON を返す（全エンドポイントで諦めたら None）"""
+        self.maybe_refresh()
+        last_reason = None
+        for attempt in range(1, self.policy.max_attempts + 1):
+            tried = set()  # この試行で「その高さは無い」と言ったエンドポイント
+            while True:
+                primary = self.wait_for_endpoint(tried)
+                if primary is None:
+                    self.log(f"[Error] {last_reason} for {path} on every endpoint, not retrying.")
+                    return None
+                futures = {self.executor.submit(self.send, primary, path): primary}
+
+                delay = self.hedge_delay() if self.hedge else None
+                done, _ = wait(futures, timeout=delay)
+                if not done:
+                    second = self.pick(exclude=tried | {primary})
+                    if second is not None:
+                        with self.lock:
+                            self.hedges_sent += 1
+                            second.hedges += 1
+                        futures[self.executor.submit(self.send, second, path)] = second
+
+                pending, permanent = set(futures), False
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        outcome, value, _ = future.result()
+                        endpoint = futures[future]
+                        if outcome == "ok":
+                            if endpoint is not primary:
+                                with self.lock:
+                                    endpoint.hedges_won += 1
+                            return value  # 負けた方は裏で完了させ、統計だけ記録する
+                        last_reason = value
+                        if outcome == "permanent":
+                            tried.add(endpoint)
+                            permanent = True
+                if not permanent:
+                    break
+                # 刈り込み済みなどは他のエンドポイントにすぐ聞き直す（バックオフしない）
+
+            if attempt < self.policy.max_attempts:
+                self.log(f"[Error] {last_reason}, retrying {attempt}/{self.policy.max_attempts}...")
+                time.sleep(self.policy.backoff(attempt))
+        return None
+
+    def stats(self):
+        """エンドポイントごとの状態（表示用）"""
+        with self.lock:
+            return [{
+                "url": e.url, "requests": e.requests, "failures": e.failures,
+                "latency_ms": None if e.latency is None else e.latency * 1000,
+                "error_rate": e.error_rate, "latest_height": e.latest_height, "lagging": e.lagging,
+                "hedges": e.hedges, "hedges_won": e.hedges_won, "breaker": e.breaker.state,
+            } for e in self.endpoints]
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.session.close()
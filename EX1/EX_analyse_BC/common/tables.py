@@ -0,0 +1,179 @@
+import csv
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:  # "parquet" / "feather" を使うときだけ必要（pip install pyarrow）
+    pa = None
+
+# 表の書き出しと読み込み（CSV / Parquet / Feather）
+#
+# 形式に "parquet" / "feather" を指定すると、CSV の代わりに列ごとに型を持つ形式で保存する:
+#   categories : アドレスなど同じ値が繰り返す文字列 → 辞書エンコード（読み込むと pandas の category 型）
+#   integers   : 高さ・件数 → int64（欠損可）
+#   timestamps : 時刻 → UTC・ナノ秒のタイムスタンプ型（読み込み時に文字列から変換し直さない）
+# ファイル名は拡張子だけを変える（block_analysis.csv → block_analysis.parquet）。
+# read_table は CSV のパスを受け取り、拡張子だけが違う表のうち最も新しいものを読むので、
+# 読む側は保存形式を意識しなくてよい。pyarrow が無い環境では CSV で書き、CSV だけを読む。
+# pandas は実際に変換・読み込みするときに import する（CSV を書くだけのスクリプトの起動を遅くしないため）。
+
+SUFFIXES = {"csv": ".csv", "parquet": ".parquet", "feather": ".feather"}
+BATCH_ROWS = 65536  # TableWriter が行を列形式に変換する単位
+
+
+def resolve_format(table_format):
+    """使える形式を返す（pyarrow が無ければ CSV にする）"""
+    if table_format not in SUFFIXES:
+        raise ValueError(f"unknown table format: {table_format}")
+    if table_format != "csv" and pa is None:
+        print(f"⚠️ pyarrow が無いため {table_format} ではなく CSV で保存します（pip install pyarrow）")
+        return "csv"
+    return table_format
+
+
+def table_path(path, table_format):
+    """path の拡張子を形式に合わせて付け替える"""
+    return os.path.splitext(path)[0] + SUFFIXES[table_format]
+
+
+def find_table(path):
+    """path と拡張子だけが違う表のうち、存在する最も新しいものを返す（無ければ path）"""
+    formats = SUFFIXES if pa is not None else ["csv"]
+    existing = [p for p in (table_path(path, f) for f in formats) if os.path.exists(p)]
+    if not existing:
+        return path
+    return max(existing, key=lambda p: os.stat(p).st_mtime_ns)
+
+
+def typed_frame(df, categories=(), integers=(), timestamps=()):
+    """列の型を揃える（辞書エンコード・int64・UTCタイムスタンプ）"""
+    import pandas as pd
+
+    df = df.copy()
+    for col in categories:
+        if col in df:
+            # カテゴリは出現順にする（value_counts などの同数の並びを CSV から読んだ場合と揃える）
+            df[col] = pd.Categorical(df[col], categories=pd.unique(df[col].dropna()))
+    for col in integers:
+        if col in df:
+            df[col] = pd.to_numeric(df[col]).astype("Int64")
+    for col in timestamps:
+        if col in df:
+            df[col] = pd.to_datetime(df[col], utc=True, format="ISO8601")
+    return df
+
+
+def _write_arrow(table, path, table_format):
+    """一時ファイルに書いてから置き換える"""
+    # バッチごとに違う辞書を1つにまとめる（Feather は1ファイルに1つの辞書しか持てない）
+    table = table.unify_dictionaries().combine_chunks()
+    # pandas の型情報（Int64 など）は残さない: 読み込むと CSV と同じく、欠損の無い整数列は int64、
+    # 欠損のある整数列は float64 になる（辞書エンコード・タイムスタンプは列の型として残る）
+    table = table.replace_schema_metadata(None)
+    tmp_path = path + ".tmp"
+    if table_format == "parquet":
+        pq.write_table(table, tmp_path)
+    else:
+        feather.write_feather(table, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def write_table(df, path, table_format="csv", categories=(), integers=(), timestamps=(), **csv_options):
+    """DataFrame を指定の形式で保存し、書いたファイルのパスを返す（csv_options は CSV のときの to_csv の引数）"""
+    table_format = resolve_format(table_format)
+    path = table_path(path, table_format)
+    if table_format == "csv":
+        df.to_csv(path, index=False, **csv_options)
+    else:
+        df = typed_frame(df, categories, integers, timestamps)
+        _write_arrow(pa.Table.from_pandas(df, preserve_index=False), path, table_format)
+    return path
+
+
+def read_table(path, timestamps=(), **csv_options):
+    """path（CSV）または同じ名前の Parquet / Feather の新しい方を DataFrame で読む
+
+    CSV のときは timestamps の列を日時として読み、csv_options を read_csv に渡す。
+    Parquet / Feather は保存時の型（category・int64・タイムスタンプ）のまま読む。
+    """
+    import pandas as pd
+
+    path = find_table(path)
+    if path.endswith(SUFFIXES["parquet"]):
+        return pd.read_parquet(path)
+    if path.endswith(SUFFIXES["feather"]):
+        return pd.read_feather(path)
+    return pd.read_csv(path, parse_dates=list(timestamps) or None, **csv_options)
+
+
+def share_categories(df, columns):
+    """category 型の列どうしを比較できるように、カテゴリ（辞書）を共通にする（CSV から読んだ列はそのまま）"""
+    import pandas as pd
+    from pandas.api.types import union_categoricals
+
+    if not all(isinstance(df[col].dtype, pd.CategoricalDtype) for col in columns):
+        return df
+    categories = union_categoricals([df[col].array for col in columns], ignore_order=True).categories
+    for col in columns:
+        df[col] = df[col].cat.set_categories(categories)
+    return df
+
+
+class TableWriter:
+    """1行ずつ受け取って表に書き出す
+
+    CSV はそのまま1行ずつ書く。Parquet / Feather は BATCH_ROWS 行ごとに列形式へ変換して保持し、
+    close() でまとめて書き出す（保持するのは型付きの列なので、行の dict を溜めるより小さい）。
+    """
+
+    def __init__(self, path, table_format="csv", categories=(), integers=(), timestamps=(), encoding="utf-8"):
+        self.format = resolve_format(table_format)
+        self.path = table_path(path, self.format)
+        self.types = (categories, integers, timestamps)
+        self.columns = None
+        self.rows = []
+        self.batches = []
+        self.file = self.writer = None
+        if self.format == "csv":
+            self.file = open(self.path, "w", newline="", encoding=encoding)
+
+    def set_columns(self, columns):
+        """列名を決める（最初の write の前に1度だけ呼ぶ）"""
+        self.columns = list(columns)
+        if self.file is not None:
+            # df.to_csv と同じく LF で改行する（csv モジュールの既定は CRLF）
+            self.writer = csv.DictWriter(self.file, fieldnames=self.columns, restval="", lineterminator="\n")
+            self.writer.writeheader()
+
+    def write(self, row):
+        if self.writer is not None:
+            self.writer.writerow(row)
+            return
+        self.rows.append(row)
+        if len(self.rows) >= BATCH_ROWS:
+            self._flush()
+
+    def _flush(self):
+        import pandas as pd
+
+        if not self.rows:
+            return
+        df = typed_frame(pd.DataFrame(self.rows, columns=self.columns), *self.types)
+        self.batches.append(pa.Table.from_pandas(df, preserve_index=False))
+        self.rows = []
+
+    def close(self):
+        """書き出しを終え、書いたファイルのパスを返す"""
+        if self.file is not None:
+            self.file.close()
+            return self.path
+        self._flush()
+        if self.batches:
+            # 全部 None のバッチがあっても型を揃えられるように、null 型は他のバッチの型に合わせる
+            table = pa.concat_tables(self.batches, promote_options="permissive")
+        else:
+            table = pa.table({col: pa.array([], pa.null()) for col in self.columns or []})
+        _write_arrow(table, self.path, self.format)
+        return self.path
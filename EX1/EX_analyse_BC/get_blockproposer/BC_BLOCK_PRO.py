@@ -1,98 +1,232 @@
-import requests
-import pandas as pd
+import asyncio
+import os
+import sys
 import time
-from tqdm import tqdm
+from concurrent.futures import ThreadPoolExecutor
 
-# CosmosのRPCエンドポイント
-RPC_URL = "https://babylon-rpc.publicnode.com:443"
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.retry import RetryPolicy
+from common.rpc_pool import RPCPool
+from common.tables import write_table
+
+# CosmosのRPCエンドポイント（複数指定すると速くて遅れていないものへ振り分ける）
+RPC_URLS = ["https://babylon-rpc.publicnode.com:443"]
 BLOCK_COUNT = 5000  # 遡るブロック数
-MAX_RETRIES = 1000   # 最大リトライ回数
-WAIT_TIME = 3        # エラー時の待機時間（秒）
+MAX_RETRIES = 20     # 最大リトライ回数（1リクエストあたり）
+BACKOFF_BASE = 0.5   # リトライ待ちの初期値（秒、失敗ごとに倍・ジッタ付き）
+BACKOFF_MAX = 30.0   # リトライ待ちの上限（秒）
+BREAKER_FAILURES = 5  # 連続でこの回数失敗したらそのエンドポイントへの取得を一時停止
+BREAKER_COOLDOWN = 5.0  # 一時停止する秒数（停止明けの試行が失敗するたびに倍）
+HEDGE = True         # 応答がプール全体の p95 を超えたら別のエンドポイントにも同じリクエストを送る
+MAX_LAG = 5          # 最新の高さがこのブロック数以上遅れているエンドポイントは使わない
+FETCH_MODE = "concurrent"  # "sequential"（1件ずつ）/ "concurrent"（並行取得）/ "blockchain"（ヘッダのみ一括取得）
+CONCURRENCY = 8      # 並行取得時の同時リクエスト数の上限（この数のスレッドで取得する）
+RATE_LIMIT = 40.0    # 1秒あたりの最大リクエスト数（トークンバケット、None か 0 で無制限）
+# 取得速度の上限は sequential が min(RATE_LIMIT, 1 / レイテンシ)、concurrent が min(RATE_LIMIT, CONCURRENCY / レイテンシ)
+# ブロック/秒。RATE_LIMIT を 1 / レイテンシ 以下にすると、concurrent にしても速くならない。
+BLOCKCHAIN_PAGE = 20  # /blockchain が1回で返すブロックメタの最大数
+OUTPUT_CSV = "Blockchian_block_data.csv"
+TABLE_FORMAT = "csv"  # "csv" / "parquet" / "feather"（pyarrow が必要。アドレスを辞書エンコード、高さを int64、時刻をタイムスタンプ型で保存）
+
+RETRY_POLICY = RetryPolicy(MAX_RETRIES, BACKOFF_BASE, BACKOFF_MAX)
+POOL = None  # RPC_URLS への振り分け（keep-alive の接続も持つ。最初の取得時に作り、全ワーカーで共有）
+
+
+class TokenBucket:
+    """1秒あたりrateリクエストまで許可するトークンバケット（rate が None か 0 なら制限しない）"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate or 0, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _take(self):
+        """トークンを1つ消費し、足りない場合は待つべき秒数を返す"""
+        if not self.rate:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        while (wait := self._take()) > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        while (wait := self._take()) > 0:
+            await asyncio.sleep(wait)
+
+
+def get_pool():
+    global POOL
+    if POOL is None or POOL.urls != RPC_URLS:
+        POOL = RPCPool(RPC_URLS, RETRY_POLICY, hedge=HEDGE, max_lag=MAX_LAG, breaker_failures=BREAKER_FAILURES,
+                       breaker_cooldown=BREAKER_COOLDOWN, max_workers=CONCURRENCY * 4)
+    return POOL
+
+def rpc_get(path):
+    """RPCを呼び出して JSON を返す（振り分け・ヘッジ・指数バックオフ・サーキットブレーカ付き、失敗時は None）"""
+    return get_pool().get_json(path)
 
 def get_latest_block():
     """最新のブロック番号を取得"""
-    url = f"{RPC_URL}/block"
-    session = requests.Session()
-    for attempt in range(MAX_RETRIES):
-        try:
-            response = session.get(url, timeout=10)
-            if response.status_code == 200:
-                return int(response.json()["result"]["block"]["header"]["height"])
-            else:
-                print(f"[Error] Status Code: {response.status_code}, retrying {attempt+1}/{MAX_RETRIES}...")
-        except requests.exceptions.RequestException as e:
-            print(f"[Error] {e}, retrying {attempt+1}/{MAX_RETRIES}...")
-            time.sleep(WAIT_TIME)
-    return None
+    data = rpc_get("/block")
+    return int(data["result"]["block"]["header"]["height"]) if data else None
 
 def get_block(block_height):
     """指定したブロックの情報を取得（リトライ対応）"""
-    url = f"{RPC_URL}/block?height={block_height}"
-    session = requests.Session()
-    for attempt in range(MAX_RETRIES):
-        try:
-            response = session.get(url, timeout=10)
-            if response.status_code == 200:
-                return response.json()
-            else:
-                print(f"[Error] Status Code: {response.status_code}, retrying {attempt+1}/{MAX_RETRIES}...")
-        except requests.exceptions.RequestException as e:
-            print(f"[Error] {e}, retrying {attempt+1}/{MAX_RETRIES}...")
-            time.sleep(WAIT_TIME)
-    return None
-
-# 最新ブロックを取得
-LATEST_BLOCK = get_latest_block()
-if not LATEST_BLOCK:
-    print("最新ブロックの取得に失敗しました。")
-    exit(1)
-
-# 取得するブロック範囲
-START_BLOCK = LATEST_BLOCK
-END_BLOCK = max(START_BLOCK - BLOCK_COUNT, 1)  # 1 より小さくならないように
-
-print(f"最新ブロック: {START_BLOCK}, 取得範囲: {END_BLOCK} 〜 {START_BLOCK}")
-
-# 一時保存用のリスト
-block_data = []
-
-# 過去ブロックのデータを取得
-previous_proposer = None  # 前のブロックの proposer_address を保存
-for height in tqdm(range(END_BLOCK, START_BLOCK + 1), desc="Fetching Blocks", unit="block"):
+    return rpc_get(f"/block?height={block_height}")
+
+def get_block_metas(min_height, max_height):
+    """/blockchain から min_height〜max_height のブロックメタを取得（リトライ対応）"""
+    data = rpc_get(f"/blockchain?minHeight={min_height}&maxHeight={max_height}")
+    return data.get("result", {}).get("block_metas", []) if data else None
+
+def extract_block_info(block):
+    """ブロックのレスポンスから必要な情報だけを取り出す（next_proposer_addressは後で設定）"""
+    header = block.get("result", {}).get("block", {}).get("header", {})
+    return {
+        "height": header.get("height"),  # ブロック番号
+        "time": header.get("time"),  # タイムスタンプ（ISO8601形式）
+        "proposer_address": header.get("proposer_address"),  # 現在の提案者
+        "next_proposer_address": None,
+        "num_txs": len(block.get("result", {}).get("block", {}).get("data", {}).get("txs", []) or []),  # トランザクション数
+    }
+
+def extract_meta_info(meta):
+    """ブロックメタから extract_block_info と同じ形式の情報を取り出す"""
+    header = meta.get("header", {})
+    return {
+        "height": header.get("height"),
+        "time": header.get("time"),
+        "proposer_address": header.get("proposer_address"),
+        "next_proposer_address": None,
+        "num_txs": int(meta.get("num_txs", 0)),  # メタにはトランザクション数が含まれる
+    }
+
+def fetch_block(height):
+    """/block から1ブロック取得し、block_infoのリストを返す（失敗時は空）"""
     block = get_block(height)
-    
-    if block:
-        # 必要な情報を取得
-        header = block.get("result", {}).get("block", {}).get("header", {})
-        block_info = {
-            "height": header.get("height"),  # ブロック番号
-            "time": header.get("time"),  # タイムスタンプ（ISO8601形式）
-            "proposer_address": header.get("proposer_address"),  # 現在の提案者
-            "next_proposer_address": previous_proposer if previous_proposer else "Unknown",  # 1つ前の proposer
-            "num_txs": block.get("result", {}).get("block", {}).get("data", {}).get("txs", []),  # トランザクションリスト
-        }
-        # トランザクション数を取得
-        block_info["num_txs"] = len(block_info["num_txs"])
-        
+    return [extract_block_info(block)] if block else []
+
+def fetch_block_range(min_height, max_height):
+    """/blockchain からまとめて取得し、block_infoのリストを返す（失敗時は空）"""
+    metas = get_block_metas(min_height, max_height)
+    return [extract_meta_info(meta) for meta in metas or []]
+
+def make_jobs(heights, fetch_mode=FETCH_MODE):
+    """fetch_mode に応じて (関数, 引数, ブロック数) のジョブ一覧を作る"""
+    if fetch_mode == "blockchain":
+        return [
+            (fetch_block_range, (low, min(low + BLOCKCHAIN_PAGE - 1, heights[-1])),
+             min(BLOCKCHAIN_PAGE, heights[-1] - low + 1))
+            for low in range(heights[0], heights[-1] + 1, BLOCKCHAIN_PAGE)
+        ]
+    return [(fetch_block, (height,), 1) for height in heights]
+
+def collect(results, infos):
+    for info in infos:
+        results[int(info["height"])] = info
+
+def fetch_blocks_sequential(jobs, limiter):
+    """ジョブを1件ずつ実行し、{height: block_info} を返す"""
+    from tqdm import tqdm
+
+    results = {}
+    with tqdm(total=sum(n for _, _, n in jobs), desc="Fetching Blocks", unit="block") as progress:
+        for func, args, n in jobs:
+            limiter.acquire()  # RPCの負荷軽減
+            collect(results, func(*args))
+            progress.update(n)
+    return results
+
+async def fetch_blocks_concurrent(jobs, limiter, concurrency=CONCURRENCY):
+    """同時実行数を制限しながらジョブを並行実行し、{height: block_info} を返す"""
+    from tqdm import tqdm
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    results = {}
+    progress = tqdm(total=sum(n for _, _, n in jobs), desc="Fetching Blocks", unit="block")
+
+    # 既定の executor（CPU数で決まるスレッド数）ではなく、同時実行数と同じ数のスレッドで取得する
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="block-fetch") as executor:
+        async def run_one(func, args, n):
+            async with semaphore:
+                await limiter.acquire_async()
+                infos = await loop.run_in_executor(executor, func, *args)
+            collect(results, infos)
+            progress.update(n)
+
+        await asyncio.gather(*(run_one(*job) for job in jobs))
+    progress.close()
+    return results
+
+def link_proposers(heights, fetched):
+    """ブロック番号順に並べ直し、next_proposer_address に1つ前の proposer を入れる"""
+    block_data = []
+    previous_proposer = None  # 前のブロックの proposer_address を保存
+    for height in heights:
+        block_info = fetched.get(height)
+        if block_info is None:
+            print(f"[Warning] Failed to fetch block {height}, skipping.")
+            continue
+
+        block_info["next_proposer_address"] = previous_proposer if previous_proposer else "Unknown"  # 1つ前の proposer
+
         # データをリストに追加
         block_data.append(block_info)
 
         # 次のブロックの proposer_address のために保存
         previous_proposer = block_info["proposer_address"]
+    return block_data
+
+def main(block_count=BLOCK_COUNT, fetch_mode=FETCH_MODE, output_csv=OUTPUT_CSV):
+    # 最新ブロックを取得
+    latest_block = get_latest_block()
+    if not latest_block:
+        print("最新ブロックの取得に失敗しました。")
+        return 1
+
+    # 取得するブロック範囲
+    start_block = latest_block
+    end_block = max(start_block - block_count, 1)  # 1 より小さくならないように
+
+    print(f"最新ブロック: {start_block}, 取得範囲: {end_block} 〜 {start_block}")
+
+    # 過去ブロックのデータを取得
+    heights = list(range(end_block, start_block + 1))
+    jobs = make_jobs(heights, fetch_mode)
+    limiter = TokenBucket(RATE_LIMIT)
+    if fetch_mode == "sequential":
+        fetched = fetch_blocks_sequential(jobs, limiter)
     else:
-        print(f"[Warning] Failed to fetch block {height}, skipping.")
+        fetched = asyncio.run(fetch_blocks_concurrent(jobs, limiter))
+
+    # 一時保存用のリスト（ブロック番号順に並べ直す）
+    block_data = link_proposers(heights, fetched)
+
+    import pandas as pd  # 取得が終わってから読み込む（起動を速くするため）
 
-    time.sleep(0.2)  # RPCの負荷軽減
+    # データフレームに変換
+    df = pd.DataFrame(block_data)
 
-# データフレームに変換
-df = pd.DataFrame(block_data)
+    # タイムスタンプをdatetime型に変換
+    df["time"] = pd.to_datetime(df["time"])
 
-# タイムスタンプをdatetime型に変換
-df["time"] = pd.to_datetime(df["time"])
+    # CSV（または TABLE_FORMAT の形式）で保存
+    output_path = write_table(df, output_csv, TABLE_FORMAT, categories=["proposer_address", "next_proposer_address"],
+                              integers=["height", "num_txs"], timestamps=["time"])
+    print(f"データを '{output_path}' に一時保存しました。")
 
-# CSVとして保存
-df.to_csv("Blockchian_block_data.csv", index=False)
-print("データを 'Blockchian_block_data.csv' に一時保存しました。")
+    # 取得データのプレビュー
+    print(df.head())
+    return 0
 
-# 取得データのプレビュー
-print(df.head())
+if __name__ == "__main__":
+    exit(main())
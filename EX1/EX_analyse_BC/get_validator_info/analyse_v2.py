@@ -1,18 +1,38 @@
-import json
 import os
+import sys
 from collections import Counter
-import pandas as pd
+from validator_store import load_block
+from analysis_cache import AnalysisCache
+from priority_matrix import PriorityMatrix
+from scan_engine import ScanEngine, iter_extracted, list_blocks
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.tables import TableWriter
 
 MAX_BLOCKS = 30000
+FROM_HEIGHT = None  # 解析する最初の高さ（None: 先頭から）
+TO_HEIGHT = None  # 解析する最後の高さ（None: 末尾まで）
+LAST = None  # 範囲の末尾から何ブロックを解析するか（None: 範囲全体）
+DATA_FORMAT = "files"  # "files": BlockNum_{height}.json を読む / "segments": 圧縮セグメントをインデックス経由で読む
+WORKERS = 1  # 1: 逐次処理 / 2以上: プロセスプールで並列に解析（結果は逐次処理と同じ順序）
+CACHE = True  # True: 前回の解析結果を再利用し、新しいブロック・書き換わったブロックだけを解析する
+CACHE_VERSION = 1  # 出力する列を変えたら上げる（古いキャッシュを捨てる）
+RANK_CHUNK = 1024  # proposer の順位を PriorityMatrix でまとめて計算するブロック数（順位が必要なブロックの直前のバリデータ一覧を保持する）
+TABLE_FORMAT = "csv"  # "csv" / "parquet" / "feather"（pyarrow が必要。アドレスを辞書エンコード、高さを int64、時刻をタイムスタンプ型で保存）
+CATEGORY_COLUMNS = ["chain_id", "proposer_address", "max_priority_address", "min_priority_address"]  # 辞書エンコードする列（同じ値が繰り返す）
+INTEGER_COLUMNS = ["height", "num_transactions", "num_signatures", "num_validators", "unique_validator_addresses",
+                   "max_voting_power", "min_voting_power", "total_voting_power", "max_proposer_priority",
+                   "min_proposer_priority", "proposer_rank_in_prev"]
 
 
 def analyze_block_json(file_path):
-    with open(file_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    return analyze_block_data(load_block(file_path), os.path.basename(file_path))
+
 
+def analyze_block_data(data, name):
     result = {}
     header = data["block_info"]["block"]["header"]
-    result["file"] = os.path.basename(file_path)
+    result["file"] = name
     result["height"] = int(header["height"])
     result["timestamp"] = header["time"]
     result["chain_id"] = header.get("chain_id", "N/A")
@@ -61,84 +81,219 @@ def analyze_block_json(file_path):
     return result
 
 
-def analyze_all_blocks(directory):
-    results = []
-    block_counter = 0
-    for filename in sorted(os.listdir(directory)):
-        if block_counter >= MAX_BLOCKS:
+def iter_analyses(directory):
+    """ブロックの解析結果を順に1件ずつ返す（最大 MAX_BLOCKS 件）"""
+    items, _, _ = list_blocks(directory, DATA_FORMAT, FROM_HEIGHT, TO_HEIGHT, LAST)
+    tasks = [(item, (True,)) for item in items]
+    count = 0
+    for _, (result,) in iter_extracted(directory, DATA_FORMAT, tasks, [analyze_block_data], WORKERS):
+        if result is None:
+            continue
+        if count >= MAX_BLOCKS:
             print(f"⚠️ {MAX_BLOCKS}ブロックに到達しました。処理を終了します。")
-            break
+            return
+        count += 1
+        yield result
 
-        if filename.endswith(".json"):
-            file_path = os.path.join(directory, filename)
-            try:
-                analysis = analyze_block_json(file_path)
-                results.append(analysis)
-                block_counter += 1
-            except Exception as e:
-                print(f"⚠️ Failed to analyze {filename}: {e}")
-    return results
 
+def analyze_all_blocks(directory):
+    return list(iter_analyses(directory))
 
-data_directory = "./current"
 
-if __name__ == "__main__":
-    all_results = analyze_all_blocks(data_directory)
-
-    for i in range(1, len(all_results)):
-        prev = all_results[i - 1]
-        curr = all_results[i]
-        curr["matches_prev_max_priority"] = (
-            curr["proposer_address"] == prev.get("max_priority_address")
-        )
-    if all_results:
-        all_results[0]["matches_prev_max_priority"] = None
-
-    rank_counter = Counter()
-    for i in range(1, len(all_results)):
-        prev = all_results[i - 1]
-        curr = all_results[i]
-
-        if not curr.get("matches_prev_max_priority"):
-            proposer = curr["proposer_address"]
-            prev_validators = prev.get("validators", [])
-            if prev_validators:
-                sorted_validators = sorted(
-                    prev_validators,
-                    key=lambda v: int(v["proposer_priority"]),
-                    reverse=True
-                )
-                for rank, val in enumerate(sorted_validators, start=1):
-                    if val["address"] == proposer:
-                        rank_counter[rank] += 1
-                        curr["proposer_rank_in_prev"] = rank
-                        break
-                else:
-                    rank_counter["not_found"] += 1
-                    curr["proposer_rank_in_prev"] = None
+DROP_COLUMNS = ["validators", "file", "matches_max_priority", "source_key", "cached"]
+
+
+def intern_addresses(row):
+    """同じアドレスの文字列を1つにまとめる（キャッシュの pickle で重複して書かれないように）"""
+    for key in ("proposer_address", "max_priority_address", "min_priority_address"):
+        if isinstance(row.get(key), str):
+            row[key] = sys.intern(row[key])
+    return row
+
+
+class ProposerAnalysis:
+    """proposer と優先度の解析（scan_engine に登録して使う）
+
+    解析結果を高さ順に受け取り、RANK_CHUNK ブロックずつ溜めて「前のブロックでの proposer の順位」を
+    PriorityMatrix でまとめて計算してから CSV に書き出す。順位が必要なのは前のブロックの最大優先度と
+    一致しなかったブロックだけなので、行列にはその (前のブロック, そのブロック) の組だけを積む。
+    cache を渡すと、各ブロックの行と前のブロックとの比較結果を記録し、次回はそれを再利用する。
+    """
+
+    name = "analyse_v2"
+    extract = staticmethod(analyze_block_data)
+
+    def __init__(self, output_csv, cache=None, max_blocks=None, prune_cache=True, table_format="csv",
+                 rank_chunk=RANK_CHUNK):
+        self.cache = cache
+        self.max_blocks = max_blocks
+        self.prune_cache = prune_cache
+        self.rank_chunk = rank_chunk
+        self.reusable = {}  # ファイル名 → 再利用できるキャッシュ
+        self.rank_counter = Counter()
+        self.total = self.match_min = self.match_prev = 0
+        self.prev = None
+        self.prev_ident = None
+        self.pending = []  # 書き出し待ちのブロック [(解析結果, 順位を計算するか, キャッシュの順位, 直前の識別子)]
+        self.rank_blocks = []  # PriorityMatrix に積む (高さ, proposer, バリデータ一覧)（前のブロック・そのブロックの順）
+        self.table = TableWriter(output_csv, table_format, categories=CATEGORY_COLUMNS, integers=INTEGER_COLUMNS,
+                                 timestamps=["timestamp"], encoding="utf-8-sig")
+        self.has_columns = False
+
+    def plan(self, idents):
+        """前回と識別子が同じで、直前のブロックも前回と同じブロックなら、キャッシュの行（前のブロックとの
+        比較結果を含む）を再利用する。それ以外は読み直す。読み直すブロックの直前が再利用するブロックなら、
+        前のブロックとの比較に必要なバリデータ一覧を得るためにそれも読む。
+        """
+        if self.cache is None:
+            return [True] * len(idents)
+
+        for i, (name, key) in enumerate(idents):
+            entry = self.cache.get(name, key)
+            if entry is not None and entry["prev"] == (idents[i - 1] if i else None):
+                self.reusable[name] = entry
+        parse = [name not in self.reusable for name, _ in idents]
+        for i in range(len(idents) - 1):
+            if parse[i + 1] and not parse[i]:
+                parse[i] = True  # 境界: バリデータ一覧だけ使う
+        print(f"📦 {self.name} キャッシュ: {len(self.reusable)} ブロックを再利用、{sum(parse)} ブロックを解析")
+        return parse
+
+    def feed(self, ident, result):
+        entry = self.reusable.get(ident[0])
+        if entry is not None:
+            validators = result["validators"] if result is not None else []
+            result = dict(entry["row"], file=ident[0], validators=validators, cached=entry)
+        if result is None:
+            return  # 読めなかったブロック
+        result["source_key"] = ident
+        self.add(result)
+
+    def add(self, curr):
+        """1ブロック分の解析結果を受け取り、前のブロックと比較する（順位は flush でまとめて計算して書く）"""
+        prev = self.prev
+        entry = curr.get("cached")
+        rank_key = None
+        needs_rank = False
+        if entry is not None:
+            # キャッシュの比較結果をそのまま使う（直前のブロックが同じことは確認済み）
+            rank_key = entry["rank_key"]
+            if curr["matches_prev_max_priority"]:
+                self.match_prev += 1
+            elif rank_key is not None:
+                self.rank_counter[rank_key] += 1
+        elif prev is None:
+            curr["matches_prev_max_priority"] = None
+        else:
+            curr["matches_prev_max_priority"] = (
+                curr["proposer_address"] == prev["max_priority_address"]
+            )
+            if curr["matches_prev_max_priority"]:
+                curr["proposer_rank_in_prev"] = 1
+                self.match_prev += 1
+            elif prev["validators"]:
+                curr["proposer_rank_in_prev"] = None  # flush で埋める
+                needs_rank = True
+                self.rank_blocks.append((prev["height"], None, prev["validators"]))
+                self.rank_blocks.append((curr["height"], curr["proposer_address"], []))
             else:
                 curr["proposer_rank_in_prev"] = None
-        else:
-            curr["proposer_rank_in_prev"] = 1
 
-    total = len(all_results)
-    match_min = sum(1 for r in all_results if r.get("matches_min_priority"))
-    match_prev = sum(1 for r in all_results[1:] if r.get("matches_prev_max_priority"))
-    rate_min = (match_min / total * 100) if total else 0
-    rate_prev = (match_prev / (total - 1) * 100) if total > 1 else 0
+        self.total += 1
+        if curr.get("matches_min_priority"):
+            self.match_min += 1
 
-    print(f"\n✅ Matches MIN:       {match_min} / {total} blocks ({rate_min:.2f}%)")
-    print(f"✅ Matches PREV MAX:  {match_prev} / {total - 1} blocks ({rate_prev:.2f}%)")
+        # 次のブロックとの比較に必要なものだけを残す
+        self.prev = {
+            "height": curr["height"],
+            "max_priority_address": curr.get("max_priority_address"),
+            "validators": curr.get("validators", []),
+        }
+        curr.pop("validators", None)  # 一覧は self.prev と rank_blocks にだけ残す（書き出し待ちの間に溜めない）
 
-    print("\n📊 Rank of proposer in previous block (when mismatched):")
-    for rank, count in sorted(rank_counter.items()):
-        print(f"  Rank {rank}: {count} blocks")
+        self.pending.append((curr, needs_rank, rank_key, self.prev_ident))
+        self.prev_ident = curr.get("source_key")
+        if len(self.pending) >= self.rank_chunk:
+            self.flush()
 
-    drop_columns = ["validators", "file", "matches_max_priority"]
-    for r in all_results:
-        for col in drop_columns:
-            r.pop(col, None)
+    def flush(self):
+        """溜めたブロックの順位を PriorityMatrix でまとめて計算し、表とキャッシュに書く"""
+        if not self.pending:
+            return
+        # 奇数行の順位が、その前の行（直前のブロック）のバリデータ一覧での proposer の順位（居なければ 0）
+        ranks = iter(PriorityMatrix.from_blocks(self.rank_blocks).proposer_ranks()[1::2].tolist())
 
-    df = pd.DataFrame(all_results)
-    df.to_csv("block_analysis.csv", index=False, encoding="utf-8-sig")
-    print("\n📁 CSVファイル 'block_analysis.csv' に保存しました（不要なカラム除外済み）。")
+        for curr, needs_rank, rank_key, prev_ident in self.pending:
+            if needs_rank:
+                rank = next(ranks) or None
+                rank_key = rank if rank is not None else "not_found"
+                self.rank_counter[rank_key] += 1
+                curr["proposer_rank_in_prev"] = rank
+
+            row = {k: v for k, v in curr.items() if k not in DROP_COLUMNS}
+            if self.cache is not None:
+                ident = curr["source_key"]
+                self.cache.put(ident[0], ident[1], {"row": intern_addresses(row), "prev": prev_ident,
+                                                    "rank_key": rank_key})
+            if not self.has_columns:
+                fieldnames = list(row)
+                if "proposer_rank_in_prev" not in fieldnames:
+                    fieldnames.append("proposer_rank_in_prev")
+                self.table.set_columns(fieldnames)
+                self.has_columns = True
+            self.table.write(row)
+
+        self.pending = []
+        self.rank_blocks = []
+
+    def finalize(self):
+        """表を書き終え、キャッシュを保存して一致率と順位の分布を表示する"""
+        self.flush()
+        output_path = self.table.close()
+        if self.cache is not None:
+            self.cache.save(prune=self.prune_cache)
+
+        total, match_min, match_prev = self.total, self.match_min, self.match_prev
+        rate_min = (match_min / total * 100) if total else 0
+        rate_prev = (match_prev / (total - 1) * 100) if total > 1 else 0
+
+        print(f"\n✅ Matches MIN:       {match_min} / {total} blocks ({rate_min:.2f}%)")
+        print(f"✅ Matches PREV MAX:  {match_prev} / {total - 1} blocks ({rate_prev:.2f}%)")
+
+        print("\n📊 Rank of proposer in previous block (when mismatched):")
+        for rank, count in sorted(self.rank_counter.items(), key=lambda x: (isinstance(x[0], str), x[0])):
+            print(f"  Rank {rank}: {count} blocks")
+
+        print(f"\n📁 '{output_path}' に保存しました（不要なカラム除外済み）。")
+        return {
+            "total": total,
+            "match_min": match_min,
+            "match_prev": match_prev,
+            "rank_counter": self.rank_counter,
+        }
+
+
+data_directory = "./current"
+
+
+def make_analysis(directory=data_directory, output_csv="block_analysis.csv"):
+    """このモジュールの設定で ProposerAnalysis を作る"""
+    cache = AnalysisCache(directory, f"analyse_v2_{DATA_FORMAT}", CACHE_VERSION) if CACHE else None
+    return ProposerAnalysis(output_csv, cache, max_blocks=MAX_BLOCKS,
+                            prune_cache=FROM_HEIGHT is None and TO_HEIGHT is None and LAST is None,
+                            table_format=TABLE_FORMAT, rank_chunk=RANK_CHUNK)
+
+
+def make_engine(directory=data_directory):
+    """このモジュールの設定（形式・範囲・並列数）で ScanEngine を作る"""
+    return ScanEngine(directory, DATA_FORMAT, WORKERS, FROM_HEIGHT, TO_HEIGHT, LAST)
+
+
+def main(directory=data_directory, output_csv="block_analysis.csv"):
+    engine = make_engine(directory)
+    engine.register(make_analysis(directory, output_csv))
+    engine.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import os
+import pickle
+
+# 解析結果のブロック単位キャッシュ
+#
+# {データディレクトリ}/.analysis_cache/{解析名}.pkl に、ブロックの識別子ごとの解析結果を保存する。
+#   ファイル  : BlockNum_{height}.json の (サイズ, 更新時刻ns)
+#   セグメント: インデックスの (セグメント番号, オフセット, 長さ)
+# 識別子が前回と同じブロックは読み直さずに結果を再利用し、新しいブロック・書き換わったブロックだけを解析する。
+# 解析の中身（出力する列など）を変えたら、呼び出し側の version を上げて古いキャッシュを捨てる。
+
+CACHE_DIR = ".analysis_cache"
+
+
+def cache_path(directory, name):
+    return os.path.join(directory, CACHE_DIR, f"{name}.pkl")
+
+
+def file_key(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def segment_keys(reader):
+    """SegmentReader の高さごとの識別子 {height: (segment, offset, length)}"""
+    index = reader.index
+    return dict(zip(index["height"].tolist(),
+                    zip(index["segment"].tolist(), index["offset"].tolist(), index["length"].tolist())))
+
+
+class AnalysisCache:
+    """名前（ファイル名）→ (識別子, 結果) のキャッシュ
+
+    get は前回保存した内容を引き、put は今回の内容を記録する。save(prune=True) は今回 put したものだけを
+    書き出すので、消えたファイルや MAX_BLOCKS から外れたブロックの結果は自然に捨てられる。
+    高さの範囲を絞って解析したときは prune=False で、範囲外の前回の結果も残す。
+    """
+
+    def __init__(self, directory, name, version):
+        self.path = cache_path(directory, name)
+        self.version = version
+        self.entries = {}
+        self.updated = {}
+        self.hits = 0  # get で再利用できた件数
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "rb") as f:
+                    data = pickle.load(f)
+                if data.get("version") == version:
+                    self.entries = data["entries"]
+            except Exception as e:  # 壊れたキャッシュは使わずに作り直す
+                print(f"⚠️ Ignoring analysis cache {self.path}: {e}")
+
+    def get(self, name, key):
+        entry = self.entries.get(name)
+        if entry is None or entry[0] != key:
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def put(self, name, key, value):
+        self.updated[name] = (key, value)
+
+    def save(self, prune=True):
+        """一時ファイルに書いてから置き換える"""
+        entries = self.updated if prune else {**self.entries, **self.updated}
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"version": self.version, "entries": entries}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,94 @@
+import json
+import os
+
+import numpy as np
+
+# バリデータ × 高さ の署名遅延行列（memmap）
+#
+# {出力ディレクトリ}/signature_delays.npy   : (バリデータ数, 高さ数) int64、署名時刻 − ブロック時刻（ns、符号付き）
+# {出力ディレクトリ}/block_times.npy        : (高さ数,) int64、ブロック時刻（UNIX時間 ns）
+# {出力ディレクトリ}/signature_delays.json  : 先頭の高さとバリデータのアドレス一覧（行番号順）
+# 署名が無い / 時刻が不明なセルは MISSING。列番号 = 高さ − base_height。
+
+MISSING = np.iinfo(np.int64).min
+DELAYS_FILE = "signature_delays.npy"
+BLOCK_TIMES_FILE = "block_times.npy"
+META_FILE = "signature_delays.json"
+
+
+def write_delay_matrix(directory, heights, addresses, offsets_ns, block_heights, block_times_ns):
+    """署名ごとの (高さ, アドレス, 遅延ns) 配列から行列を作り、1回の書き込みで保存する"""
+    os.makedirs(directory, exist_ok=True)
+    validators = sorted(set(addresses))
+    rows = {addr: i for i, addr in enumerate(validators)}
+
+    if len(block_heights):
+        base_height = int(np.min(block_heights))
+        width = int(np.max(block_heights)) - base_height + 1
+    else:
+        base_height, width = 0, 0
+
+    delays = np.lib.format.open_memmap(
+        os.path.join(directory, DELAYS_FILE), mode="w+", dtype=np.int64, shape=(len(validators), width)
+    )
+    delays[:] = MISSING
+    if len(heights):
+        row_index = np.fromiter((rows[a] for a in addresses), dtype=np.int64, count=len(addresses))
+        delays[row_index, np.asarray(heights, dtype=np.int64) - base_height] = offsets_ns
+    delays.flush()
+    del delays
+
+    times = np.full(width, MISSING, dtype=np.int64)
+    times[np.asarray(block_heights, dtype=np.int64) - base_height] = block_times_ns
+    np.save(os.path.join(directory, BLOCK_TIMES_FILE), times)
+
+    with open(os.path.join(directory, META_FILE), "w", encoding="utf-8") as f:
+        json.dump({"base_height": base_height, "validators": validators}, f, ensure_ascii=False)
+
+
+class DelayMatrix:
+    """write_delay_matrix で保存した行列を memmap で開いて問い合わせる"""
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.base_height = meta["base_height"]
+        self.validators = meta["validators"]
+        self.rows = {addr: i for i, addr in enumerate(self.validators)}
+        self.delays = np.load(os.path.join(directory, DELAYS_FILE), mmap_mode="r")
+        self.block_times = np.load(os.path.join(directory, BLOCK_TIMES_FILE), mmap_mode="r")
+
+    def column(self, height):
+        col = height - self.base_height
+        if col < 0 or col >= self.delays.shape[1]:
+            raise KeyError(height)
+        return col
+
+    def history(self, address):
+        """バリデータの署名履歴: (高さ, 遅延ns, 署名時刻ns) の配列"""
+        row = np.asarray(self.delays[self.rows[address]])
+        cols = np.flatnonzero(row != MISSING)
+        offsets = row[cols]
+        return cols + self.base_height, offsets, self.block_times[cols] + offsets
+
+    def spread(self, height):
+        """その高さでの署名時刻のばらつき（最大 − 最小、ns）"""
+        col = np.asarray(self.delays[:, self.column(height)])
+        col = col[col != MISSING]
+        return int(col.max() - col.min()) if len(col) >= 2 else 0
+
+    def slowest(self, n=10, height=None):
+        """遅いバリデータ上位 n 件: 高さ指定ならその高さの遅延、無ければ平均遅延（ns）で並べる"""
+        if height is not None:
+            col = np.asarray(self.delays[:, self.column(height)])
+            values = np.abs(col.astype(np.float64))
+            values[col == MISSING] = np.nan
+        else:
+            values = np.full(len(self.validators), np.nan)
+            for i in range(len(self.validators)):
+                row = np.asarray(self.delays[i])
+                row = row[row != MISSING]
+                if len(row):
+                    values[i] = np.abs(row).mean()
+        order = np.argsort(-np.nan_to_num(values, nan=-np.inf), kind="stable")
+        return [(self.validators[i], float(values[i])) for i in order[:n] if not np.isnan(values[i])]
@@ -1,7 +1,12 @@
+import os
+import sys
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 from collections import Counter
-from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.figures import render_figures
+from common.tables import read_table, write_table
 
 # --- 設定 ---
 csv_file = "block_analysis.csv"
@@ -9,118 +14,105 @@ output_file_rank = "proposer_rank_distribution.png"
 output_file_interval_20 = "block_interval_distribution_20.png"
 output_file_interval_100 = "block_interval_distribution_100.png"
 output_file_scatter = "interval_vs_rank_scatter.png"
-
-# --- データ読み込み ---
-df = pd.read_csv(csv_file)
-
-# --- proposer_rank_in_prev の頻度分布 ---
-rank_counts = Counter(df["proposer_rank_in_prev"].dropna().astype(int))
-ranks, counts = zip(*sorted(rank_counts.items()))
-
-plt.figure(figsize=(10, 5))
-plt.bar(ranks, counts)
-plt.title("Frequency Distribution of proposer_rank_in_prev")
-plt.xlabel("Rank in Previous Block")
-plt.ylabel("Number of Blocks")
-plt.xticks(ranks)
-plt.grid(axis="y")
-plt.tight_layout()
-plt.savefig(output_file_rank)
-print(f"📊 ランク頻度分布を保存しました: {output_file_rank}")
-
-# --- ブロック生成時間間隔（秒） ---
-df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True)
-df["block_interval_sec"] = df["timestamp"].diff().dt.total_seconds()
-intervals = df["block_interval_sec"].dropna()
-
-# ヒストグラム描画（20 bins）
-plt.figure(figsize=(10, 5))
-plt.hist(intervals, bins=20, edgecolor='black')
-plt.title("Block Generation Interval Distribution (20 bins)")
-plt.xlabel("Interval (seconds)")
-plt.ylabel("Number of Blocks")
-plt.grid(axis="y")
-plt.tight_layout()
-plt.savefig(output_file_interval_20)
-print(f"⏱️ ヒストグラム（20分割）保存しました: {output_file_interval_20}")
-
-# ヒストグラム描画（100 bins）
-plt.figure(figsize=(10, 5))
-plt.hist(intervals, bins=100, edgecolor='black')
-plt.title("Block Generation Interval Distribution (100 bins)")
-plt.xlabel("Interval (seconds)")
-plt.ylabel("Number of Blocks")
-plt.grid(axis="y")
-plt.tight_layout()
-plt.savefig(output_file_interval_100)
-print(f"⏱️ ヒストグラム（100分割）保存しました: {output_file_interval_100}")
-
-# --- 統計出力 ---
-mean_interval = intervals.mean()
-median_interval = intervals.median()
-std_interval = intervals.std()
-var_interval = intervals.var()
-count = len(intervals)
-
-print("\n📈 Block Generation Interval Statistics:")
-print(f"  Count     : {count}")
-print(f"  Mean      : {mean_interval:.3f} sec")
-print(f"  Median    : {median_interval:.3f} sec")
-print(f"  Std Dev   : {std_interval:.3f} sec")
-print(f"  Variance  : {var_interval:.3f} sec²")
-
-# --- 散布図：生成間隔 vs proposer_rank_in_prev ---
-scatter_data = df[["block_interval_sec", "proposer_rank_in_prev"]].dropna()
-
-plt.figure(figsize=(10, 6))
-plt.scatter(
-    scatter_data["block_interval_sec"],
-    scatter_data["proposer_rank_in_prev"],
-    alpha=0.7
-)
-plt.title("Block Interval vs Proposer Rank in Previous Block")
-plt.xlabel("Block Interval (seconds)")
-plt.ylabel("Proposer Rank in Previous Block")
-plt.grid(True)
-plt.tight_layout()
-plt.savefig(output_file_scatter)
-print(f"🟢 散布図を保存しました: {output_file_scatter}")
-
-# --- 閾値ごとの分析 + グラフ生成 ---
-def analyze_long_blocks(threshold_sec: float):
-    df_filtered = df[df["block_interval_sec"] >= threshold_sec]
+output_file_sweep_csv = "block_interval_threshold_sweep.csv"
+output_file_sweep_proposer_csv = "block_interval_threshold_sweep_by_proposer.csv"
+output_file_sweep_plot = "block_interval_threshold_sweep.png"
+output_file_speed_csv = "proposer_speed_scores.csv"
+output_file_speed_plot = "proposer_speed_scores.png"
+REPORT_THRESHOLDS = [6, 12, 15, 18]  # 詳細を表示する閾値（秒）
+SWEEP_STEP = 0.5  # 閾値スイープの刻み（秒）
+MAX_SWEEP_THRESHOLDS = 1000  # 閾値の数の上限（超える場合は生成間隔の分位点から選ぶ）
+RENDER_WORKERS = None  # 図を描くワーカープロセス数（None: CPUコア数）
+TABLE_FORMAT = "csv"  # スピードスコアの保存形式 "csv" / "parquet" / "feather"（pyarrow が必要）
+
+
+def appearance_counts(values):
+    """value_counts と同じく件数の多い順に数える（同数は先に出てきた順。category 型でも0件の値は含めない）"""
+    codes, uniques = pd.factorize(values)
+    counts = pd.Series(np.bincount(codes[codes >= 0], minlength=len(uniques)), index=np.asarray(uniques))
+    return counts.sort_values(ascending=False, kind="stable")
+
+
+# --- 閾値スイープ（生成間隔を1回ソートし、累積和で任意の閾値に答える） ---
+def sweep_grid(intervals, step=SWEEP_STEP, max_points=MAX_SWEEP_THRESHOLDS):
+    """スイープする閾値: 生成間隔を step 刻みに切り下げた値のうちデータのあるもの
+
+    最大の生成間隔まで step 刻みに並べると、チェーン停止のような外れ値1つで閾値が何十万にもなるので、
+    ブロックの無い区間は飛ばし（その区間では「>= t」の件数は変わらない）、それでも max_points を超えれば分位点で間引く。
+    """
+    x = np.asarray(intervals, dtype=float)
+    if len(x) > 0:
+        grid = np.unique(np.floor(x / step) * step)
+        if len(grid) > max_points:
+            grid = np.unique(np.floor(np.quantile(x, np.linspace(0, 1, max_points)) / step) * step)
+    else:
+        grid = np.array([], dtype=float)
+    return np.union1d(grid, REPORT_THRESHOLDS)
+
+
+def threshold_sweep(df, thresholds):
+    """各閾値 t について「生成間隔 >= t」のブロック数・平均などと proposer ごとのブロック数を返す"""
+    thresholds = np.asarray(thresholds, dtype=float)
+    data = df.dropna(subset=["block_interval_sec"])
+    # proposer の列は高さ順に出てきた順にする（並べ替える前に番号を振る）
+    codes, proposers = pd.factorize(data["proposer_address"])
+    data_order = np.argsort(data["block_interval_sec"].to_numpy(), kind="stable")
+    data, codes = data.iloc[data_order], codes[data_order]
+    x = data["block_interval_sec"].to_numpy()
+    n = len(x)
+    start = np.searchsorted(x, thresholds, side="left")  # x[start:] が閾値以上
+
+    def suffix_sum(values):
+        cumulative = np.concatenate([[0], np.cumsum(values)])
+        return cumulative[n] - cumulative[start]
+
+    count = n - start
+    rank = data["proposer_rank_in_prev"].to_numpy(dtype=float)
+    has_rank = ~np.isnan(rank)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        curve = pd.DataFrame({
+            "threshold_sec": thresholds,
+            "blocks": count,
+            "mean_interval_sec": suffix_sum(x) / count,
+            "mean_proposer_rank": suffix_sum(np.where(has_rank, rank, 0)) / suffix_sum(has_rank),
+        })
+    for col in ["matches_prev_max_priority", "matches_min_priority"]:
+        values = data[col]
+        curve[f"{col}_true"] = suffix_sum((values == True).to_numpy())
+        curve[f"{col}_false"] = suffix_sum((values == False).to_numpy())
+
+    # proposer ごと: 並べ替え後の位置を proposer 別にまとめ、閾値の開始位置以降の個数を数える
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(proposers) + 1))
+    per_proposer = np.empty((len(thresholds), len(proposers)), dtype=np.int64)
+    for i in range(len(proposers)):
+        positions = order[bounds[i]:bounds[i + 1]]  # 昇順
+        per_proposer[:, i] = len(positions) - np.searchsorted(positions, start, side="left")
+    per_proposer = pd.DataFrame(per_proposer, index=thresholds, columns=proposers)
+    return curve, per_proposer
+
+
+def print_long_blocks(curve_row, long_counts, proposer_counts, threshold_sec: float):
     print(f"\n🔍 ブロック生成間隔 >= {threshold_sec:.1f}秒 の分析結果:")
-    print(f"  対象ブロック数            : {len(df_filtered)}")
-    print(f"  平均生成間隔              : {df_filtered['block_interval_sec'].mean():.3f} 秒")
-    print(f"  平均 proposer_rank        : {df_filtered['proposer_rank_in_prev'].mean():.2f}")
-    print(f"  matches_prev_max_priority : {df_filtered['matches_prev_max_priority'].value_counts().to_dict()}")
-    print(f"  matches_min_priority      : {df_filtered['matches_min_priority'].value_counts().to_dict()}")
+    print(f"  対象ブロック数            : {int(curve_row['blocks'])}")
+    print(f"  平均生成間隔              : {curve_row['mean_interval_sec']:.3f} 秒")
+    print(f"  平均 proposer_rank        : {curve_row['mean_proposer_rank']:.2f}")
+    for col in ["matches_prev_max_priority", "matches_min_priority"]:
+        counts = {k: int(curve_row[f"{col}_{str(k).lower()}"]) for k in (False, True)}
+        counts = {k: v for k, v in sorted(counts.items(), key=lambda x: -x[1]) if v}
+        print(f"  {col:<25} : {counts}")
 
     # proposer の頻度
-    top_proposers = df_filtered["proposer_address"].value_counts().head(5)
     print(f"\n🏷️ Top 5 proposer_address（生成間隔 >= {threshold_sec:.1f}秒）:")
-    for addr, count in top_proposers.items():
+    for addr, count in long_counts.head(5).items():
         print(f"  {addr} : {count} blocks")
 
     # proposerごとの統計
-    total_blocks = len(df)
-    proposer_counts = df["proposer_address"].value_counts()
-    long_counts = df_filtered["proposer_address"].value_counts()
-
+    total_blocks = proposer_counts.sum()
     summary_list = []
-    labels = []
-    values = []
-
-    for proposer in proposer_counts.index:
-        total = proposer_counts[proposer]
-        over = long_counts.get(proposer, 0)
-        total_ratio = (total / total_blocks) * 100
-        over_ratio = (over / total) * 100
-        summary_list.append((proposer, total, total_ratio, over, over_ratio))
-        if over > 0:
-            labels.append(proposer[:8])  # 短縮表示
-            values.append(over_ratio)
-
+    for proposer, total in proposer_counts.items():
+        over = int(long_counts.get(proposer, 0))
+        summary_list.append((proposer, total, total / total_blocks * 100, over, over / total * 100))
     summary_list = sorted(summary_list, key=lambda x: x[3], reverse=True)
 
     print(f"\n📊 proposer ごとのブロック統計（生成間隔 >= {threshold_sec:.1f}秒）:")
@@ -129,46 +121,114 @@ def analyze_long_blocks(threshold_sec: float):
     for proposer, total, tratio, over, oratio in summary_list[:10]:
         print(f"{proposer:<42} | {total:4d} | {tratio:6.2f}% | {over:4d} | {oratio:6.1f}%")
 
-# --- 実行 ---
-analyze_long_blocks(6)
-analyze_long_blocks(12)
-analyze_long_blocks(15)
-analyze_long_blocks(18)
+def main():
+    figures = []  # 最後にまとめて描画する図
+
+    # --- データ読み込み（同じ名前の Parquet / Feather があればそちらを読む） ---
+    df = read_table(csv_file, timestamps=["timestamp"])
+
+    # --- proposer_rank_in_prev の頻度分布 ---
+    rank_counts = Counter(df["proposer_rank_in_prev"].dropna().astype(int))
+    ranks, counts = zip(*sorted(rank_counts.items()))
+    figures.append({
+        "kind": "bar", "output": output_file_rank,
+        "data": {"x": np.array(ranks), "y": np.array(counts)},
+        "title": "Frequency Distribution of proposer_rank_in_prev",
+        "xlabel": "Rank in Previous Block", "ylabel": "Number of Blocks",
+        "xticks": np.array(ranks), "grid": {"axis": "y"},
+    })
+
+    # --- ブロック生成時間間隔（秒） ---
+    df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True)
+    df["block_interval_sec"] = df["timestamp"].diff().dt.total_seconds()
+    intervals = df["block_interval_sec"].dropna()
+
+    # ヒストグラム（20 bins / 100 bins）
+    for bins, output_file in [(20, output_file_interval_20), (100, output_file_interval_100)]:
+        figures.append({
+            "kind": "hist", "output": output_file,
+            "data": {"x": intervals.to_numpy()}, "options": {"bins": bins, "edgecolor": "black"},
+            "title": f"Block Generation Interval Distribution ({bins} bins)",
+            "xlabel": "Interval (seconds)", "ylabel": "Number of Blocks", "grid": {"axis": "y"},
+        })
+
+    # --- 統計出力 ---
+    mean_interval = intervals.mean()
+    median_interval = intervals.median()
+    std_interval = intervals.std()
+    var_interval = intervals.var()
+    count = len(intervals)
+
+    print("\n📈 Block Generation Interval Statistics:")
+    print(f"  Count     : {count}")
+    print(f"  Mean      : {mean_interval:.3f} sec")
+    print(f"  Median    : {median_interval:.3f} sec")
+    print(f"  Std Dev   : {std_interval:.3f} sec")
+    print(f"  Variance  : {var_interval:.3f} sec²")
+
+    # --- 散布図：生成間隔 vs proposer_rank_in_prev（点が多いときは2次元ヒストグラムで描く） ---
+    scatter_data = df[["block_interval_sec", "proposer_rank_in_prev"]].dropna()
+    figures.append({
+        "kind": "scatter", "output": output_file_scatter, "figsize": (10, 6),
+        "data": {"x": scatter_data["block_interval_sec"].to_numpy(), "y": scatter_data["proposer_rank_in_prev"].to_numpy()},
+        "options": {"alpha": 0.7},
+        "title": "Block Interval vs Proposer Rank in Previous Block",
+        "xlabel": "Block Interval (seconds)", "ylabel": "Proposer Rank in Previous Block", "grid": True,
+        "colorbar_label": "Blocks",
+    })
 
-# --- proposer のブロック生成速度スコア分析 ---
-output_file_speed_csv = "proposer_speed_scores.csv"
-output_file_speed_plot = "proposer_speed_scores.png"
+    # --- 閾値スイープ ---
+    proposer_counts = appearance_counts(df["proposer_address"])
+    sweep_thresholds = sweep_grid(intervals)
+    curve, per_proposer = threshold_sweep(df, sweep_thresholds)
+
+    curve.to_csv(output_file_sweep_csv, index=False, encoding="utf-8-sig")
+    per_proposer.rename_axis("threshold_sec").to_csv(output_file_sweep_proposer_csv, encoding="utf-8-sig")
+    print(f"\n📁 閾値スイープ結果を CSV に保存しました: {output_file_sweep_csv}, {output_file_sweep_proposer_csv}")
+    figures.append({
+        "kind": "trend", "output": output_file_sweep_plot,
+        "data": {"x": curve["threshold_sec"].to_numpy(), "y": curve["blocks"].to_numpy()},
+        "title": "Blocks with Interval >= Threshold",
+        "xlabel": "Threshold (seconds)", "ylabel": "Number of Blocks", "yscale": "log", "grid": True,
+    })
 
-print("\n⚡ proposer のブロック生成速度スコア:")
-
-speed_stats = []
-for proposer in df["proposer_address"].unique():
-    intervals = df.loc[df["proposer_address"] == proposer, "block_interval_sec"].dropna()
-    if len(intervals) == 0:
-        continue
-    avg_interval = intervals.mean()
-    score = 1 / avg_interval if avg_interval > 0 else 0
-    speed_stats.append({
-        "proposer_address": proposer,
-        "count": len(intervals),
-        "avg_interval": avg_interval,
-        "speed_score": score
+    # proposer の件数は高さ順のデータから直接数える（同数の並びを従来の value_counts と揃える）
+    for threshold in REPORT_THRESHOLDS:
+        i = int(np.searchsorted(sweep_thresholds, threshold))
+        long_counts = appearance_counts(df.loc[df["block_interval_sec"] >= threshold, "proposer_address"])
+        print_long_blocks(curve.iloc[i], long_counts, proposer_counts, threshold)
+
+    # --- proposer のブロック生成速度スコア分析 ---
+    print("\n⚡ proposer のブロック生成速度スコア:")
+
+    speed_df = (
+        df.groupby("proposer_address", sort=False, observed=True)["block_interval_sec"]
+        .agg(count="count", avg_interval="mean")
+        .reset_index()
+    )
+    speed_df = speed_df[speed_df["count"] > 0]
+    speed_df["speed_score"] = np.where(speed_df["avg_interval"] > 0, 1 / speed_df["avg_interval"], 0)
+    speed_df.sort_values(by="speed_score", ascending=False, inplace=True)
+    speed_path = write_table(speed_df, output_file_speed_csv, TABLE_FORMAT, categories=["proposer_address"],
+                             integers=["count"], encoding="utf-8-sig")
+    print(f"📁 proposer スピードスコアを保存しました: {speed_path}")
+
+    # グラフ化（上位20）
+    top_speed = speed_df.head(20)
+    figures.append({
+        "kind": "bar", "output": output_file_speed_plot, "figsize": (12, 6),
+        "data": {"x": top_speed["proposer_address"].str[:8].to_numpy(), "y": top_speed["speed_score"].to_numpy()},
+        "title": "Top 20 Proposers by Speed Score (1 / Avg Interval)",
+        "xlabel": "Proposer Address (prefix)", "ylabel": "Speed Score", "xticks_rotation": 45,
     })
 
-# DataFrame に変換して保存
-speed_df = pd.DataFrame(speed_stats)
-speed_df.sort_values(by="speed_score", ascending=False, inplace=True)
-speed_df.to_csv(output_file_speed_csv, index=False, encoding="utf-8-sig")
-print(f"📁 proposer スピードスコアを CSV に保存しました: {output_file_speed_csv}")
-
-# グラフ化（上位20）
-top_speed = speed_df.head(20)
-plt.figure(figsize=(12, 6))
-plt.bar(top_speed["proposer_address"].str[:8], top_speed["speed_score"])
-plt.title("Top 20 Proposers by Speed Score (1 / Avg Interval)")
-plt.xlabel("Proposer Address (prefix)")
-plt.ylabel("Speed Score")
-plt.xticks(rotation=45)
-plt.tight_layout()
-plt.savefig(output_file_speed_plot)
-print(f"📊 スピードスコア上位20のグラフを保存しました: {output_file_speed_plot}")
+    # --- 図をまとめて描画（入力が変わっていない図はスキップ） ---
+    rendered, skipped = render_figures(figures, workers=RENDER_WORKERS)
+    for output_file in rendered:
+        print(f"🖼️ 図を保存しました: {output_file}")
+    if skipped:
+        print(f"⏭️ 入力が変わっていないため再描画をスキップ: {', '.join(skipped)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,89 +1,285 @@
 import os
-import requests
 import json
-import time
-from tqdm import tqdm  # 追加
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from validator_store import to_delta_record
+from segment_store import SegmentReader, SegmentWriter, has_segments
+from height_index import HeightIndexWriter, load_heights
+from proposer_sim import ProposerSimulator
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.retry import RetryPolicy
+from common.rpc_pool import RPCPool
 
 # 定数定義
-BASE_URL_BLOCK = "https://babylon-rpc.publicnode.com/block"
-BASE_URL_VALIDATORS = "https://babylon-rpc.publicnode.com/validators"
-PER_PAGE = 100
-TOTAL_PAGES = 1
-RETRY_LIMIT = 100
-SLEEP_TIME = 1
+RPC_URLS = ["https://babylon-rpc.publicnode.com"]  # 複数指定すると速くて遅れていないものへ振り分ける
+PER_PAGE = 100  # /validators の1ページの件数（CometBFT の上限は100）
+PAGE_CONCURRENCY = 8  # 2ページ目以降を同時に取得する数（ページ数は1ページ目の total から決める）
+RETRY_LIMIT = 20  # 1リクエストあたりの最大試行回数
+BACKOFF_BASE = 0.5  # リトライ待ちの初期値（秒、失敗ごとに倍・ジッタ付き）
+BACKOFF_MAX = 30.0  # リトライ待ちの上限（秒）
+BREAKER_FAILURES = 5  # 連続でこの回数失敗したらそのエンドポイントへの取得を一時停止
+BREAKER_COOLDOWN = 5.0  # 一時停止する秒数（停止明けの試行が失敗するたびに倍）
+HEDGE = True  # 応答がプール全体の p95 を超えたら別のエンドポイントにも同じリクエストを送る
+MAX_LAG = 5  # 最新の高さがこのブロック数以上遅れているエンドポイントは使わない
 BLOCK_COUNT = 500
 SAVE_DIR = "current"
-
-# 保存先ディレクトリの作成（存在しない場合）
-os.makedirs(SAVE_DIR, exist_ok=True)
+RESUME = True  # True: 取得済みの高さをスキップし、欠損分と最新ブロックまでの新規分だけ取得
+MANIFEST_FILE = f"{SAVE_DIR}_manifest.json"  # 取得済み/失敗した高さの記録（SAVE_DIRの外に置く）
+MANIFEST_FLUSH = 50  # 何ブロックごとにマニフェストを書き出すか
+STORAGE_MODE = "full"  # "full": 毎ブロック全バリデータを保存 / "delta": セットは1度だけ保存し優先度のみ記録
+STORAGE_FORMAT = "files"  # "files": BlockNum_{height}.json を1ファイルずつ / "segments": 圧縮セグメント＋インデックスに追記
+VALIDATOR_SOURCE = "rpc"  # "rpc": 毎ブロック /validators を取得 / "simulate": セットが変わらない間は優先度をローカルで計算
+VERIFY_EVERY = 0  # simulate時、Nブロックごとに /validators も取得して予測と比較（0で無効）
 
 headers = {"User-Agent": "Mozilla/5.0"}
+RETRY_POLICY = RetryPolicy(RETRY_LIMIT, BACKOFF_BASE, BACKOFF_MAX)
+POOL = None  # RPC_URLS への振り分け（keep-alive の接続も持つ。最初の取得時に作る）
+PAGE_EXECUTOR = None  # ページやブロック情報を同時に取得するスレッド（最初の取得時に作る）
+
+
+def get_pool():
+    global POOL
+    if POOL is None or POOL.urls != RPC_URLS:
+        POOL = RPCPool(RPC_URLS, RETRY_POLICY, hedge=HEDGE, max_lag=MAX_LAG, breaker_failures=BREAKER_FAILURES,
+                       breaker_cooldown=BREAKER_COOLDOWN, headers=headers)
+    return POOL
+
+
+def get_page_executor():
+    global PAGE_EXECUTOR
+    if PAGE_EXECUTOR is None:
+        PAGE_EXECUTOR = ThreadPoolExecutor(max_workers=PAGE_CONCURRENCY, thread_name_prefix="validator-page")
+    return PAGE_EXECUTOR
+
+
+def rpc_get(path):
+    """RPC の path を GET して JSON を返す（振り分け・ヘッジ・指数バックオフ・サーキットブレーカ付き、失敗時は None）"""
+    return get_pool().get_json(path)
+
 
 # 最新のブロック番号を取得
 def get_latest_height():
-    response = requests.get(BASE_URL_BLOCK, headers=headers, timeout=10)
-    response.raise_for_status()
-    latest_block = response.json()
+    latest_block = rpc_get("/block")
+    if latest_block is None:
+        raise RuntimeError("最新のブロック番号を取得できませんでした。")
     return int(latest_block["result"]["block"]["header"]["height"])
 
-latest_height = get_latest_height()
-print(f"最新のブロック番号: {latest_height}")
 
-# 最新のブロックから5000ブロック分さかのぼって取得
-for i in tqdm(range(BLOCK_COUNT), desc="Fetching blocks", unit="block"):
-    height = latest_height - i
+# ---- マニフェスト（チェックポイント）----
+def load_manifest():
+    """マニフェストを読み込み、{"completed": set, "failed": set} を返す"""
+    manifest = {"completed": set(), "failed": set()}
+    if os.path.exists(MANIFEST_FILE):
+        with open(MANIFEST_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        manifest["completed"] = set(data.get("completed", []))
+        manifest["failed"] = set(data.get("failed", []))
+    return manifest
 
-    # ---- 1. ブロック情報の取得 ----
-    block_info = {}
-    try:
-        block_url = f"{BASE_URL_BLOCK}?height={height}"
-        block_response = requests.get(block_url, headers=headers, timeout=10)
-        block_response.raise_for_status()
-        block_info = block_response.json().get("result", {})
-    except requests.exceptions.RequestException as e:
-        print(f"  ❌ Failed to fetch block info for height {height}: {e}")
 
-    # ---- 2. バリデータ情報の取得 ----
-    block_validators = []
+def save_manifest(manifest):
+    """途中で落ちても壊れないよう、一時ファイルに書いてから置き換える"""
+    tmp_file = MANIFEST_FILE + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump({
+            "completed": sorted(manifest["completed"]),
+            "failed": sorted(manifest["failed"] - manifest["completed"]),
+        }, f)
+    os.replace(tmp_file, MANIFEST_FILE)
 
-    for page in range(1, TOTAL_PAGES + 1):
-        url = f"{BASE_URL_VALIDATORS}?height={height}&per_page={PER_PAGE}&page={page}"
-        retries = 0
 
-        while retries < RETRY_LIMIT:
-            try:
-                response = requests.get(url, headers=headers, timeout=10)
-                response.raise_for_status()
+def block_file(height):
+    return os.path.join(SAVE_DIR, f"BlockNum_{height}.json")
 
-                data = response.json()
-                result = data.get("result")
 
-                if not result or not isinstance(result, dict) or "validators" not in result:
-                    break
+def plan_heights(latest_height, manifest, block_count=BLOCK_COUNT):
+    """取得対象の高さを新しい順に返す（RESUME時は取得済みを除外）"""
+    targets = set(range(max(latest_height - block_count + 1, 1), latest_height + 1))
+    if not RESUME:
+        return sorted(targets, reverse=True)
+
+    # ディスク上に既にあるブロックは取得済みとみなす
+    # （前回失敗した高さは、古い版が書いた不完全な記録が残っていることがあるので必ず取り直す）
+    if STORAGE_FORMAT == "segments":
+        segment_reader = SegmentReader(SAVE_DIR) if has_segments(SAVE_DIR) else None
+        is_stored = lambda height: segment_reader is not None and height in segment_reader
+    else:
+        stored = set(load_heights(SAVE_DIR).tolist())
+        is_stored = lambda height: height in stored
+    for height in targets - manifest["failed"]:
+        if height not in manifest["completed"] and is_stored(height):
+            manifest["completed"].add(height)
+
+    done = manifest["completed"]
+    if done:
+        # 既存データの末尾から最新ブロックまで前方に延長
+        targets.update(range(max(done) + 1, latest_height + 1))
+    # 前回失敗した高さも再取得
+    targets.update(manifest["failed"])
+    return sorted(targets - done, reverse=True)
 
-                validators = result["validators"]
 
-                if not validators:
-                    break
+# ---- 1ブロック分の取得 ----
+segment_writer = None  # STORAGE_FORMAT == "segments" のとき main() で開く
+height_index = None  # STORAGE_FORMAT == "files" のとき main() で開く（保存した高さを追記）
+simulator, simulator_hash = None, None  # simulate時の直前の高さの状態
 
-                block_validators.extend(validators)
-                break
+def fetch_block_info(height):
+    """ブロック情報を取得する（失敗時は空の辞書）"""
+    data = rpc_get(f"/block?height={height}")
+    if data is None:
+        print(f"  ❌ Failed to fetch block info for height {height}")
+        return {}
+    return data.get("result", {})
 
-            except requests.exceptions.RequestException as e:
-                retries += 1
-                time.sleep(SLEEP_TIME)
 
-        if retries == RETRY_LIMIT:
-            print(f"  ❗ Failed to fetch page {page} after {RETRY_LIMIT} attempts. Skipping.")
+def fetch_validator_page(height, page):
+    """/validators の1ページ分の result を取得する（失敗時は None）"""
+    data = rpc_get(f"/validators?height={height}&per_page={PER_PAGE}&page={page}")
+    if data is None:
+        print(f"  ❗ Failed to fetch page {page} of height {height} after {RETRY_LIMIT} attempts.")
+        return None
+
+    result = data.get("result")
+    if not result or not isinstance(result, dict) or "validators" not in result:
+        return None
+    return result
+
+
+def fetch_validators(height):
+    """指定した高さのバリデータ一覧を取得する（全ページ揃わなければ空のリスト）
+
+    1ページ目の total から残りのページ数を求め、2ページ目以降は同時に取得する。
+    """
+    first = fetch_validator_page(height, 1)
+    if first is None:
+        return []
+    block_validators = list(first["validators"] or [])
+    total = int(first.get("total", len(block_validators)))
+
+    # ノードが per_page を小さく切り詰めることがあるので、実際に返ってきた件数でページ数を数える
+    per_page = len(block_validators) or PER_PAGE
+    pages = range(2, (total + per_page - 1) // per_page + 1)
+    for result in get_page_executor().map(lambda page: fetch_validator_page(height, page), pages):
+        if result is None:
+            print(f"  ❗ Missing validator pages for height {height}. Skipping.")
+            return []
+        block_validators.extend(result["validators"] or [])
+
+    if len(block_validators) != total:
+        print(f"  ⚠️ Got {len(block_validators)} of {total} validators for height {height}. Skipping.")
+        return []
+    return block_validators
+
+
+def simulated_validators(height, block_info):
+    """直前の高さから優先度を計算してバリデータ一覧を作る（セットが変わったら /validators を取得）"""
+    global simulator, simulator_hash
+    validators_hash = block_info.get("block", {}).get("header", {}).get("validators_hash")
+
+    if (simulator is not None and validators_hash is not None
+            and simulator.height == height - 1 and simulator_hash == validators_hash):
+        simulator.increment()
+        validators = simulator.to_validators()
+        if VERIFY_EVERY and height % VERIFY_EVERY == 0:
+            fetched = fetch_validators(height)
+            if fetched and [v["proposer_priority"] for v in fetched] != [v["proposer_priority"] for v in validators]:
+                print(f"  ⚠️ Predicted priorities differ from /validators at height {height}. Resyncing.")
+                validators = fetched
+                simulator = ProposerSimulator(fetched, height)
+        return validators
+
+    validators = fetch_validators(height)
+    if validators:
+        simulator, simulator_hash = ProposerSimulator(validators, height), validators_hash
+    else:
+        simulator, simulator_hash = None, None
+    return validators
 
-    # ---- 3. JSONファイルとして保存 ----
-    if block_info or block_validators:
+
+def fetch_height(height):
+    """ブロック情報とバリデータ情報を取得して保存し、成功したかを返す"""
+
+    # ---- 1. ブロック情報・バリデータ情報の取得 ----
+    if VALIDATOR_SOURCE == "simulate":
+        # validators_hash が変わらない間は /validators を呼ばずに優先度を計算する
+        block_info = fetch_block_info(height)
+        block_validators = simulated_validators(height, block_info)
+    else:
+        # 互いに依存しないので、ブロック情報はバリデータのページと同時に取得する
+        block_info_future = get_page_executor().submit(fetch_block_info, height)
+        block_validators = fetch_validators(height)
+        block_info = block_info_future.result()
+
+    # ---- 2. JSONファイルとして保存 ----
+    # ブロック情報とバリデータの両方が揃ったときだけ保存する（ページが欠けた高さは保存せず、次回取り直す）
+    if not block_info and not block_validators:
+        print(f"⚠️ No data found for height {height}. Skipping file creation.")
+        return False
+    if not block_info or not block_validators:
+        print(f"⚠️ Incomplete data for height {height}. Skipping file creation (retried on the next run).")
+        return False
+
+    if STORAGE_MODE == "delta":
+        output = to_delta_record(SAVE_DIR, block_info, block_validators)
+    else:
         output = {
             "block_info": block_info,
             "validators": block_validators
         }
-        filename = os.path.join(SAVE_DIR, f"BlockNum_{height}.json")
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(output, f, indent=4, ensure_ascii=False)
+
+    if segment_writer is not None:
+        segment_writer.append(height, output)
+    elif STORAGE_MODE == "delta":
+        with open(block_file(height), "w", encoding="utf-8") as f:
+            json.dump(output, f, separators=(",", ":"), ensure_ascii=False)
     else:
-        print(f"⚠️ No data found for height {height}. Skipping file creation.")
+        with open(block_file(height), "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=4, ensure_ascii=False)
+    if height_index is not None:
+        height_index.add(height)
+    return True
+
+
+def main(block_count=BLOCK_COUNT):
+    global segment_writer, height_index, simulator, simulator_hash
+    from tqdm import tqdm
+
+    # 保存先ディレクトリの作成（存在しない場合）
+    os.makedirs(SAVE_DIR, exist_ok=True)
+
+    latest_height = get_latest_height()
+    print(f"最新のブロック番号: {latest_height}")
+
+    manifest = load_manifest()
+    heights = plan_heights(latest_height, manifest, block_count)
+    print(f"取得対象: {len(heights)} ブロック（取得済み: {len(manifest['completed'])} ブロック）")
+
+    segment_writer = SegmentWriter(SAVE_DIR) if STORAGE_FORMAT == "segments" else None
+    height_index = HeightIndexWriter(SAVE_DIR) if STORAGE_FORMAT == "files" else None
+    simulator, simulator_hash = None, None
+
+    # 最新のブロックから順にさかのぼって取得（simulate時は優先度を前に進めるため古い順）
+    if VALIDATOR_SOURCE == "simulate":
+        heights.sort()
+    for i, height in enumerate(tqdm(heights, desc="Fetching blocks", unit="block"), start=1):
+        if fetch_height(height):
+            manifest["completed"].add(height)
+            manifest["failed"].discard(height)
+        else:
+            manifest["failed"].add(height)
+
+        if i % MANIFEST_FLUSH == 0:
+            save_manifest(manifest)
+
+    save_manifest(manifest)
+    if segment_writer is not None:
+        segment_writer.close()
+    if height_index is not None:
+        height_index.close()
+    print(f"✅ 完了: {len(manifest['completed'])} ブロック / 失敗: {len(manifest['failed'])} ブロック")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import os
+import re
+
+import numpy as np
+
+# BlockNum_{height}.json の高さインデックス
+#
+# {データディレクトリ}/height_index.bin に保存済みの高さを int64 で追記していく（取得スクリプトが1ブロックごとに追記）。
+# 解析側はこれを読んで高さ順に並べ、from/to/last の範囲を二分探索で切り出すので、
+# ディレクトリ全体を listdir してファイル名を並べ替える必要がない（ファイル名の辞書順では桁が変わると順序が崩れる）。
+# インデックスが無い・ディレクトリの方が新しい（インデックスを通さずにファイルが増減した）場合は
+# ファイル名から作り直す。
+
+INDEX_FILE = "height_index.bin"
+INDEX_DTYPE = np.dtype("<i8")
+FILE_PATTERN = re.compile(r"^BlockNum_(\d+)\.json$")
+
+
+def index_path(directory):
+    return os.path.join(directory, INDEX_FILE)
+
+
+def scan_heights(directory):
+    """ファイル名から高さを集める（昇順・重複なし）"""
+    heights = [int(m.group(1)) for m in map(FILE_PATTERN.match, os.listdir(directory)) if m]
+    return np.unique(np.array(heights, dtype=INDEX_DTYPE))
+
+
+def is_fresh(directory):
+    """インデックスがあり、その後ディレクトリにファイルが増減していないか"""
+    path = index_path(directory)
+    return os.path.exists(path) and os.stat(path).st_mtime_ns >= os.stat(directory).st_mtime_ns
+
+
+def write_index(directory, heights):
+    """インデックスを作り直す（一時ファイルに書いてから置き換える）"""
+    path = index_path(directory)
+    tmp_path = path + ".tmp"
+    np.asarray(heights, dtype=INDEX_DTYPE).tofile(tmp_path)
+    os.replace(tmp_path, path)
+    os.utime(path)  # 置き換えでディレクトリの更新時刻が進むので、インデックスの方を新しくしておく
+
+
+def load_heights(directory):
+    """保存済みの高さを昇順で返す（インデックスが古ければファイル名から作り直す）"""
+    if is_fresh(directory):
+        return np.unique(np.fromfile(index_path(directory), dtype=INDEX_DTYPE))
+    heights = scan_heights(directory)
+    try:
+        write_index(directory, heights)
+    except OSError:  # 書き込めないディレクトリでは毎回ファイル名から作る
+        pass
+    return heights
+
+
+def select_range(heights, from_height=None, to_height=None, last=None):
+    """昇順の高さから from_height〜to_height（両端含む）を切り出し、last があれば末尾 last 件に絞る"""
+    lo = 0 if from_height is None else np.searchsorted(heights, from_height, side="left")
+    hi = len(heights) if to_height is None else np.searchsorted(heights, to_height, side="right")
+    if last is not None:
+        lo = max(lo, hi - last)
+    return heights[lo:hi]
+
+
+class HeightIndexWriter:
+    """保存したブロックの高さをインデックスに追記する"""
+
+    def __init__(self, directory):
+        if not is_fresh(directory):
+            write_index(directory, scan_heights(directory))
+        self.file = open(index_path(directory), "ab")
+
+    def add(self, height):
+        self.file.write(np.array([height], dtype=INDEX_DTYPE).tobytes())
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
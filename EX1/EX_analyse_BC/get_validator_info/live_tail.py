@@ -0,0 +1,254 @@
+import datetime
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+import get_validators_set_v2 as fetcher
+
+try:
+    import websocket  # websocket-client がインストールされていれば /websocket の NewBlock を購読する
+except ImportError:
+    websocket = None
+
+# 新しいブロックを追いかけながら統計を更新するライブモード
+#
+# バッチの「取得 → analyse_v2.py → distribution.py」を回し直さずに、最新の数字を数秒遅れで見るためのもの。
+# - 新しいブロックは /websocket の NewBlock イベント（websocket-client があれば）か、/status のポーリングで知る。
+#   ポーリング間隔はブロック間隔の平均に合わせて伸び縮みする。取りこぼした高さは順に取得して埋める。
+# - 1ブロックごとに O(1) で更新する: 生成間隔の平均・分散（Welford 法）、閾値以上の遅いブロック数、
+#   proposer ごとのブロック数、「直前の高さで優先度最大だったバリデータ == proposer」の一致率。
+# - SNAPSHOT_EVERY 秒ごとに SNAPSHOT_FILE へ JSON で書き出す（ダッシュボードはこれを読む）。
+
+SLOW_THRESHOLDS = [2, 6, 12, 15, 18]  # 遅いブロックとして数える生成間隔（秒）
+SNAPSHOT_FILE = "live_stats.json"
+SNAPSHOT_EVERY = 10.0  # スナップショットを書き出す間隔（秒）
+TOP_PROPOSERS = 20  # スナップショットに載せる proposer の数
+SUBSCRIBE = "auto"  # "auto": websocket-client があれば /websocket、無ければポーリング / "websocket" / "poll"
+POLL_MIN = 0.5  # /status をポーリングする間隔の下限（秒）
+POLL_MAX = 10.0  # 同上限
+MAX_CATCHUP = 100  # 取りこぼしを埋めるときに遡る最大ブロック数（それより古い分は飛ばす）
+VALIDATOR_SOURCE = "simulate"  # "rpc": 毎ブロック /validators を取得 / "simulate": セットが変わらない間は優先度をローカルで計算
+
+
+def parse_time_ns(timestamp):
+    """RFC3339 の時刻（ナノ秒まで）を UNIX 時間のナノ秒に変換する"""
+    timestamp = timestamp.replace("Z", "+00:00")
+    fraction = 0
+    if "." in timestamp:
+        head, rest = timestamp.split(".", 1)
+        digits = len(rest) - len(rest.lstrip("0123456789"))
+        fraction = int(rest[:digits][:9].ljust(9, "0"))
+        timestamp = head + rest[digits:]
+    seconds = int(datetime.datetime.fromisoformat(timestamp).timestamp())
+    return seconds * 1_000_000_000 + fraction
+
+
+class RunningStats:
+    """Welford 法で平均と分散を逐次更新する"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        self.min = x if self.min is None else min(self.min, x)
+        self.max = x if self.max is None else max(self.max, x)
+
+    @property
+    def variance(self):
+        """不偏分散（pandas の var() と同じ）"""
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def to_dict(self):
+        return {"count": self.count, "mean": self.mean, "variance": self.variance,
+                "std": self.variance ** 0.5, "min": self.min, "max": self.max}
+
+
+class LiveStats:
+    """ブロックを高さ順に受け取り、直前1ブロック分だけ覚えて統計を更新する"""
+
+    def __init__(self, thresholds=SLOW_THRESHOLDS):
+        self.thresholds = list(thresholds)
+        self.intervals = RunningStats()
+        self.slow_blocks = Counter()  # 閾値 → 生成間隔がそれ以上のブロック数
+        self.proposers = Counter()
+        self.blocks = 0
+        self.compared = 0  # 直前の高さの優先度と比べられたブロック数
+        self.match_prev = 0
+        self.first_height = None
+        self.last_height = None
+        self.last_time_ns = None
+        self.last_max_address = None
+
+    def update(self, height, time_ns, proposer, max_priority_address):
+        """1ブロック分を反映する（高さが飛んだら生成間隔と一致率の比較はしない）"""
+        consecutive = self.last_height is not None and height == self.last_height + 1
+        if consecutive:
+            interval = (time_ns - self.last_time_ns) / 1e9
+            self.intervals.add(interval)
+            for threshold in self.thresholds:
+                if interval >= threshold:
+                    self.slow_blocks[threshold] += 1
+            if self.last_max_address is not None:
+                self.compared += 1
+                self.match_prev += proposer == self.last_max_address
+
+        self.blocks += 1
+        self.proposers[proposer] += 1
+        if self.first_height is None:
+            self.first_height = height
+        self.last_height, self.last_time_ns, self.last_max_address = height, time_ns, max_priority_address
+
+    def snapshot(self):
+        return {
+            "updated_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "first_height": self.first_height,
+            "last_height": self.last_height,
+            "blocks": self.blocks,
+            "block_interval_sec": self.intervals.to_dict(),
+            "slow_blocks": {str(t): self.slow_blocks[t] for t in self.thresholds},
+            "match_prev_max_priority": {
+                "matches": self.match_prev, "compared": self.compared,
+                "rate": self.match_prev / self.compared if self.compared else None,
+            },
+            "unique_proposers": len(self.proposers),
+            "top_proposers": dict(self.proposers.most_common(TOP_PROPOSERS)),
+        }
+
+
+def write_snapshot(stats, path=SNAPSHOT_FILE):
+    """読み手が書きかけのファイルを見ないよう、一時ファイルに書いてから置き換える"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(stats.snapshot(), f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def max_priority_address(validators):
+    """優先度が最大のバリデータのアドレス（analyse_v2 と同じく同点は先に並んでいる方）"""
+    if not validators:
+        return None
+    best = max(validators, key=lambda v: int(v["proposer_priority"]))
+    return best["address"]
+
+
+def process_height(stats, height):
+    """1つの高さを取得して統計に反映する（取得できなければ False）"""
+    block_info = fetcher.fetch_block_info(height)
+    header = block_info.get("block", {}).get("header")
+    if not header:
+        return False
+    if VALIDATOR_SOURCE == "simulate":
+        validators = fetcher.simulated_validators(height, block_info)
+    else:
+        validators = fetcher.fetch_validators(height)
+    stats.update(height, parse_time_ns(header["time"]), header.get("proposer_address"),
+                 max_priority_address(validators))
+    return True
+
+
+def catch_up(stats, latest_height):
+    """前回の高さから latest_height までを順に取り込む"""
+    start = latest_height if stats.last_height is None else stats.last_height + 1
+    if latest_height - start >= MAX_CATCHUP:
+        print(f"⚠️ {latest_height - start + 1} ブロック遅れています。直近 {MAX_CATCHUP} ブロックから再開します。")
+        start = latest_height - MAX_CATCHUP + 1
+    for height in range(start, latest_height + 1):
+        if not process_height(stats, height):
+            print(f"  ❌ Failed to fetch height {height}, skipping.")
+
+
+def latest_height_from_status():
+    data = fetcher.rpc_get("/status")
+    if data is None:
+        return None
+    return int(data["result"]["sync_info"]["latest_block_height"])
+
+
+def poll_heights(stats):
+    """/status をポーリングして最新の高さを返し続ける
+
+    新しいブロックが見つかったら「最後のブロック時刻 + 平均生成間隔」の頃まで待ち、
+    見つからなければ間隔を 1.5 倍ずつ伸ばす（POLL_MIN〜POLL_MAX）。
+    """
+    interval = POLL_MIN
+    last_seen = None
+    while True:
+        height = latest_height_from_status()
+        if height is not None and height != last_seen:
+            last_seen = height
+            yield height
+            interval = POLL_MIN
+            if stats.intervals.count and stats.last_time_ns is not None:
+                expected_ns = stats.last_time_ns + stats.intervals.mean * 1e9
+                interval = (expected_ns - time.time_ns()) / 1e9
+        else:
+            interval *= 1.5
+        interval = min(POLL_MAX, max(POLL_MIN, interval))
+        time.sleep(interval)
+
+
+def websocket_heights(url):
+    """/websocket で NewBlock を購読し、新しいブロックの高さを返し続ける"""
+    ws_url = url.replace("https://", "wss://").replace("http://", "ws://").rstrip("/") + "/websocket"
+    ws = websocket.create_connection(ws_url, timeout=POLL_MAX * 6)
+    try:
+        ws.send(json.dumps({"jsonrpc": "2.0", "method": "subscribe", "id": 1,
+                            "params": {"query": "tm.event='NewBlock'"}}))
+        while True:
+            message = json.loads(ws.recv())
+            block = message.get("result", {}).get("data", {}).get("value", {}).get("block")
+            if block:
+                yield int(block["header"]["height"])
+    finally:
+        ws.close()
+
+
+def follow(stats):
+    """新しいブロックの高さを順に返す（websocket が切れたらポーリングに切り替える）"""
+    if SUBSCRIBE != "poll" and (websocket is not None or SUBSCRIBE == "websocket"):
+        try:
+            yield from websocket_heights(fetcher.RPC_URLS[0])
+        except Exception as e:  # 接続できない・切れた
+            print(f"⚠️ /websocket を使えません（{e}）。/status のポーリングに切り替えます。")
+    yield from poll_heights(stats)
+
+
+def main(max_blocks=None, snapshot_file=SNAPSHOT_FILE):
+    """ブロックを追いかけて統計を更新し続ける（max_blocks 件取り込んだら終了、None なら Ctrl+C まで）"""
+    fetcher.VALIDATOR_SOURCE = VALIDATOR_SOURCE
+    stats = LiveStats()
+    last_flush = time.monotonic()
+    print(f"📡 Following new blocks ({SUBSCRIBE}), snapshot: {snapshot_file} every {SNAPSHOT_EVERY}s")
+
+    try:
+        for latest_height in follow(stats):
+            catch_up(stats, latest_height)
+            if time.monotonic() - last_flush >= SNAPSHOT_EVERY:
+                write_snapshot(stats, snapshot_file)
+                last_flush = time.monotonic()
+                mean = stats.intervals.mean
+                rate = stats.snapshot()["match_prev_max_priority"]["rate"]
+                print(f"  height {stats.last_height}: {stats.blocks} blocks, interval mean {mean:.3f}s, "
+                      f"prev-max match {rate if rate is None else f'{rate:.2%}'}")
+            if max_blocks is not None and stats.blocks >= max_blocks:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        write_snapshot(stats, snapshot_file)
+        print(f"\n📁 スナップショットを '{snapshot_file}' に保存しました（{stats.blocks} ブロック）。")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
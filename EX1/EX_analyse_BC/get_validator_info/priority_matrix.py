@@ -0,0 +1,139 @@
+import numpy as np
+
+# 高さ × バリデータ の proposer_priority 行列による順位計算
+#
+# 各ブロックのバリデータ一覧を (行, 列, 優先度, 一覧内の位置) の配列に積み上げ、
+# 最後に密な行列へ展開する。列はアドレスごとに割り当てる。
+# 「前のブロックで proposer は優先度が何番目だったか」を全ブロック分まとめて計算する。
+
+MISSING = np.iinfo(np.int64).min  # そのブロックのセットに居ないバリデータ
+ROW_CHUNK = 65536  # 順位計算で一度に比較する行数（一時配列のメモリを抑える）
+
+
+class PriorityMatrix:
+    def __init__(self, heights, proposers, addresses, priorities, positions):
+        self.heights = heights          # (n,) int64
+        self.proposers = proposers      # (n,) 各ブロックの proposer の列番号（セット外は -1）
+        self.addresses = addresses      # 列番号 → アドレス
+        self.columns = {addr: i for i, addr in enumerate(addresses)}
+        self.priorities = priorities    # (n, V) int64、居ない所は MISSING
+        self.positions = positions      # (n, V) int32、元の一覧での並び順（同順位の並びに使う）
+
+    @classmethod
+    def from_blocks(cls, blocks):
+        """(height, proposer_address, validators) を高さ順に受け取って行列を作る
+
+        ブロックごとには一覧から値を取り出すだけにして、優先度の数値への変換と行列への展開は最後にまとめて行う。
+        アドレスの並びが直前の（空でない）一覧と同じ（セットが変わらない間はいつも同じ）なら列番号を使い回す。
+        """
+        columns = {}
+        heights, proposers, cols, prios = [], [], [], []
+        prev_addresses, prev_col = None, None
+
+        for height, proposer, validators in blocks:
+            addresses = [v["address"] for v in validators]
+            if not addresses:
+                col = np.zeros(0, dtype=np.int64)
+            elif addresses != prev_addresses:
+                col = prev_col = np.fromiter((columns.setdefault(a, len(columns)) for a in addresses),
+                                             dtype=np.int64, count=len(addresses))
+                prev_addresses = addresses
+            else:
+                col = prev_col
+            heights.append(height)
+            proposers.append(columns.get(proposer, -1))
+            cols.append(col)
+            prios.extend(v["proposer_priority"] for v in validators)
+
+        n, width = len(heights), len(columns)
+        priorities = np.full((n, width), MISSING, dtype=np.int64)
+        positions = np.zeros((n, width), dtype=np.int32)
+        if prios:
+            counts = np.array([len(c) for c in cols], dtype=np.int64)
+            r = np.repeat(np.arange(n), counts)
+            c = np.concatenate(cols)
+            priorities[r, c] = np.array(prios, dtype=np.int64)  # 文字列（RPC の JSON）のままでも数値でもよい
+            positions[r, c] = np.arange(len(r)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+        addresses = [None] * width
+        for addr, i in columns.items():
+            addresses[i] = addr
+        return cls(np.array(heights, dtype=np.int64), np.array(proposers, dtype=np.int64),
+                   addresses, priorities, positions)
+
+    def proposer_ranks(self):
+        """各ブロックの proposer が直前ブロックで何番目の優先度だったか（先頭・不明は 0）
+
+        優先度の降順、同じ優先度なら元の一覧での並び順で数える（優先度で安定ソートしたときの順位）。
+        """
+        ranks = np.zeros(len(self.heights), dtype=np.int64)
+        if len(self.heights) < 2:
+            return ranks
+
+        for start in range(1, len(self.heights), ROW_CHUNK):
+            end = min(start + ROW_CHUNK, len(self.heights))
+            prev = self.priorities[start - 1:end - 1]
+            prev_pos = self.positions[start - 1:end - 1]
+            cols = self.proposers[start:end]
+            rows = np.arange(len(cols))
+            valid = cols >= 0
+            safe_cols = np.where(valid, cols, 0)
+
+            own = prev[rows, safe_cols]
+            own_pos = prev_pos[rows, safe_cols]
+            valid &= own != MISSING
+
+            present = prev != MISSING
+            higher = present & (prev > own[:, None])
+            tied_before = present & (prev == own[:, None]) & (prev_pos < own_pos[:, None])
+            ranks[start:end] = np.where(valid, 1 + higher.sum(axis=1) + tied_before.sum(axis=1), 0)
+        return ranks
+
+    def rank_distribution(self, ranks=None):
+        """順位ごとのブロック数（0 = 先頭ブロック or 前のセットに居なかった）"""
+        if ranks is None:
+            ranks = self.proposer_ranks()
+        counts = np.bincount(ranks)
+        return {rank: int(count) for rank, count in enumerate(counts) if count}
+
+    def top_k(self, row, k):
+        """row 番目のブロックで優先度が高い順に k 人のアドレスを返す"""
+        priorities = self.priorities[row]
+        present = np.flatnonzero(priorities != MISSING)
+        order = np.lexsort((self.positions[row, present], -priorities[present]))
+        return [self.addresses[c] for c in present[order[:k]]]
+
+    def top_k_hit_rate(self, k, ranks=None):
+        """proposer が直前ブロックの優先度上位 k 人に入っていた割合"""
+        if ranks is None:
+            ranks = self.proposer_ranks()
+        known = ranks[1:] > 0
+        if not known.any():
+            return 0.0
+        return float(((ranks[1:] > 0) & (ranks[1:] <= k)).sum() / known.sum())
+
+
+if __name__ == "__main__":
+    import pandas as pd
+    from analyse_v2 import data_directory, iter_analyses
+
+    matrix = PriorityMatrix.from_blocks(
+        (r["height"], r["proposer_address"], r["validators"]) for r in iter_analyses(data_directory)
+    )
+    ranks = matrix.proposer_ranks()
+    print(f"\n🧮 Priority matrix: {matrix.priorities.shape[0]} blocks × {matrix.priorities.shape[1]} validators")
+
+    print("\n📊 Rank of proposer in previous block:")
+    for rank, count in sorted(matrix.rank_distribution(ranks).items()):
+        print(f"  Rank {rank if rank else 'N/A'}: {count} blocks")
+
+    for k in (1, 2, 3, 5, 10):
+        print(f"  Top-{k:<2} hit rate: {matrix.top_k_hit_rate(k, ranks):.2%}")
+
+    df = pd.DataFrame({
+        "height": matrix.heights,
+        "proposer_address": [matrix.addresses[c] if c >= 0 else None for c in matrix.proposers],
+        "proposer_rank_in_prev": pd.Series(ranks).where(ranks > 0).astype("Int64"),
+    })
+    df.to_csv("proposer_ranks.csv", index=False, encoding="utf-8-sig")
+    print("\n📁 CSVファイル 'proposer_ranks.csv' に保存しました。")
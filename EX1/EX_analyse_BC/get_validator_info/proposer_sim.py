@@ -0,0 +1,126 @@
+import numpy as np
+
+# CometBFT の proposer 選出（重み付きラウンドロビン）のローカル再現
+#
+# CometBFT は高さが1つ進むたびに ValidatorSet.IncrementProposerPriority(1) を行う:
+#   1. 優先度の最大と最小の差が 2 × 総投票力 を超えていれば全員を割って縮める（RescalePriorities）
+#   2. 優先度の平均を全員から引く（shiftByAvgProposerPriority）
+#   3. 全員の優先度に投票力を足し、最大の者（同点ならアドレスが小さい方）から総投票力を引く
+# 3 で選ばれた者がその高さの proposer になる（保存される優先度は総投票力を引いた後の値）。
+# 投票力が変わらない間は、1回取得したスナップショットから先の高さの優先度と proposer を計算できる。
+
+PRIORITY_WINDOW_SIZE_FACTOR = 2
+
+
+def go_div(a, b):
+    """Go の整数除算（0方向への切り捨て）"""
+    return np.sign(a) * (np.abs(a) // b)
+
+
+class ProposerSimulator:
+    def __init__(self, validators, height=None):
+        self.height = height
+        self.validators = validators
+        self.addresses = np.array([v["address"] for v in validators])
+        self.voting_powers = np.array([int(v["voting_power"]) for v in validators], dtype=np.int64)
+        self.priorities = np.array([int(v["proposer_priority"]) for v in validators], dtype=np.int64)
+        self.total_voting_power = int(self.voting_powers.sum())
+        # 同点のときはアドレスが小さい方が選ばれるので、アドレス順の位置を持っておく
+        self.address_order = np.argsort(np.argsort(self.addresses, kind="stable"), kind="stable")
+        self.last_proposer = None  # 直近の increment で選ばれた proposer
+
+    def same_set(self, validators):
+        """アドレスと投票力が同じセットか（優先度は比較しない）"""
+        return (
+            len(validators) == len(self.addresses)
+            and all(v["address"] == a for v, a in zip(validators, self.addresses))
+            and all(int(v["voting_power"]) == p for v, p in zip(validators, self.voting_powers))
+        )
+
+    def max_priority_index(self):
+        """現在の優先度で最大のバリデータの位置（同点はアドレスの小さい方）"""
+        best = self.priorities.max()
+        candidates = np.flatnonzero(self.priorities == best)
+        return int(candidates[np.argmin(self.address_order[candidates])])
+
+    def proposer(self):
+        """現在の高さの proposer（スナップショットを読んだ直後は不明なので None）"""
+        return self.last_proposer
+
+    def _rescale(self):
+        diff_max = PRIORITY_WINDOW_SIZE_FACTOR * self.total_voting_power
+        diff = int(self.priorities.max()) - int(self.priorities.min())
+        if diff > diff_max:
+            ratio = (diff + diff_max - 1) // diff_max
+            self.priorities = go_div(self.priorities, ratio)
+
+    def _shift_by_average(self):
+        # 合計は int64 を超えうるので Python の整数で計算（big.Int の Div と同じく床除算）
+        average = sum(int(p) for p in self.priorities) // len(self.priorities)
+        self.priorities = self.priorities - average
+
+    def increment(self, times=1):
+        """優先度を times 回進め、各回で選ばれた proposer のアドレスを返す"""
+        self._rescale()
+        self._shift_by_average()
+        chosen = []
+        for _ in range(times):
+            self.priorities = self.priorities + self.voting_powers
+            index = self.max_priority_index()
+            self.priorities[index] -= self.total_voting_power
+            chosen.append(str(self.addresses[index]))
+        self.last_proposer = chosen[-1] if chosen else self.last_proposer
+        if self.height is not None:
+            self.height += times
+        return chosen
+
+    def to_validators(self):
+        """/validators のレスポンスと同じ形のバリデータ一覧を返す"""
+        return [
+            {**v, "proposer_priority": str(int(p))}
+            for v, p in zip(self.validators, self.priorities)
+        ]
+
+
+def verify_predictions(blocks):
+    """(height, proposer_address, validators) を高さ順に受け取り、1つ前の高さから予測した優先度・proposer と比較する"""
+    stats = {"compared": 0, "matched": 0, "proposer_matched": 0, "skipped": 0,
+             "max_abs_diff": 0, "mismatched_heights": []}
+    prev_height, sim = None, None
+
+    for height, proposer, validators in blocks:
+        if sim is not None and height == prev_height + 1 and sim.same_set(validators):
+            if sim.increment()[-1] == proposer:
+                stats["proposer_matched"] += 1
+            fetched = np.array([int(v["proposer_priority"]) for v in validators], dtype=np.int64)
+            diff = int(np.abs(fetched - sim.priorities).max()) if len(fetched) else 0
+            stats["compared"] += 1
+            if diff == 0:
+                stats["matched"] += 1
+            else:
+                stats["mismatched_heights"].append(height)
+                stats["max_abs_diff"] = max(stats["max_abs_diff"], diff)
+        elif sim is not None:
+            stats["skipped"] += 1  # 高さが飛んでいる / セットが変わった
+
+        if validators:
+            sim = ProposerSimulator(validators, height)
+        prev_height = height
+    return stats
+
+
+if __name__ == "__main__":
+    from analyse_v2 import data_directory, iter_analyses
+
+    stats = verify_predictions(
+        (r["height"], r["proposer_address"], r["validators"]) for r in iter_analyses(data_directory)
+    )
+    compared = stats["compared"]
+    rate = stats["matched"] / compared * 100 if compared else 0
+    proposer_rate = stats["proposer_matched"] / compared * 100 if compared else 0
+    print(f"\n🔁 Predicted vs fetched proposer_priority: {stats['matched']} / {compared} heights match ({rate:.2f}%)")
+    print(f"  Predicted proposer matches block proposer: {stats['proposer_matched']} / {compared} ({proposer_rate:.2f}%)")
+    print(f"  Skipped (gap or validator set change): {stats['skipped']}")
+    print(f"  Max |predicted - fetched|: {stats['max_abs_diff']}")
+    if stats["mismatched_heights"]:
+        print(f"  First mismatched heights: {stats['mismatched_heights'][:10]}")
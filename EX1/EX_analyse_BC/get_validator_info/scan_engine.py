@@ -0,0 +1,159 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from tqdm import tqdm
+
+from validator_store import expand_record, load_block
+from segment_store import SegmentReader
+from analysis_cache import file_key, segment_keys
+from height_index import load_heights, select_range
+
+# ブロックデータを1回だけ走査して、複数の解析に配るエンジン
+#
+# ブロック（BlockNum_{height}.json またはセグメント）を高さ順に1度だけ読んでデコードし、
+# 登録された解析すべてに渡す。解析を増やしても全ブロックの読み込みとデコードは1回で済む。
+# 解析（analyzer）は次の属性・メソッドを持つ:
+#   name                  : 表示用の名前
+#   max_blocks            : 先頭から何ブロックまで解析するか（None: 全部）
+#   extract(data, name)   : デコードしたブロックから必要な値だけを取り出す（モジュールの関数。WORKERS > 1 なら
+#                           ワーカープロセスで実行されるので、戻り値は pickle できるものにする）
+#   plan(idents)          : [(ファイル名, 識別子)] を受け取り、ブロックごとに extract が必要か（bool のリスト）を返す
+#                           （キャッシュで済むブロックは False）
+#   feed(ident, value)    : 高さ順に全ブロックについて呼ばれる。value は extract の戻り値
+#                           （plan で False にした / 読めなかった / extract が失敗したブロックは None）
+#   finalize()            : 出力を書き出し、結果を返す
+
+CHUNK_SIZE = 500  # 並列処理で1タスクに渡すブロック数
+
+
+def list_blocks(directory, data_format="files", from_height=None, to_height=None, last=None):
+    """解析対象を (項目, ファイル名, 識別子) のリストで高さ順に返す
+
+    項目は files ならファイル名、segments なら高さ。識別子はキャッシュ用（analysis_cache）。
+    from_height / to_height / last の範囲だけを、高さインデックスから二分探索で選ぶ。
+    """
+    if data_format == "segments":
+        reader = SegmentReader(directory)
+        keys = segment_keys(reader)
+        items = select_range(reader.heights, from_height, to_height, last).tolist()
+        names = [f"BlockNum_{h}.json" for h in items]
+        return items, names, [keys[h] for h in items]
+
+    heights = select_range(load_heights(directory), from_height, to_height, last).tolist()
+    items = [f"BlockNum_{h}.json" for h in heights]
+    return items, items, [file_key(os.path.join(directory, f)) for f in items]
+
+
+def iter_records(directory, data_format, items):
+    """(ファイル名, デコードしたブロック) を順に返す（読めなかったブロックは飛ばす）"""
+    if data_format == "segments":
+        for height, record in SegmentReader(directory).iter_heights(items):
+            name = f"BlockNum_{height}.json"
+            try:
+                yield name, expand_record(directory, record)
+            except Exception as e:
+                print(f"⚠️ Failed to read {name}: {e}")
+        return
+
+    for filename in items:
+        try:
+            data = load_block(os.path.join(directory, filename))
+        except Exception as e:
+            print(f"⚠️ Failed to read {filename}: {e}")
+            continue
+        yield filename, data
+
+
+def extract_chunk(directory, data_format, tasks, extractors):
+    """1タスク分のブロックを読み、必要な extract だけを実行して [(ファイル名, 戻り値のタプル)] を返す
+
+    tasks は [(項目, 各 extractor を実行するかの bool のタプル)]。
+    """
+    wanted = dict(zip((f"BlockNum_{item}.json" if data_format == "segments" else item for item, _ in tasks),
+                      (w for _, w in tasks)))
+    results = []
+    for name, data in iter_records(directory, data_format, [item for item, _ in tasks]):
+        outputs = []
+        for extract, want in zip(extractors, wanted[name]):
+            value = None
+            if want:
+                try:
+                    value = extract(data, name)
+                except Exception as e:
+                    print(f"⚠️ Failed to analyze {name}: {e}")
+            outputs.append(value)
+        results.append((name, tuple(outputs)))
+    return results
+
+
+def iter_extracted(directory, data_format, tasks, extractors, workers=1, chunk_size=CHUNK_SIZE):
+    """tasks を chunk_size ずつ処理し、(ファイル名, 戻り値のタプル) を元の順序で返す（先行実行は workers*2 チャンクまで）"""
+    chunks = [tasks[i:i + chunk_size] for i in range(0, len(tasks), chunk_size)]
+    if workers <= 1:
+        for chunk in chunks:
+            yield from extract_chunk(directory, data_format, chunk, extractors)
+        return
+
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(extract_chunk, directory, data_format, chunk, extractors))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+class ScanEngine:
+    """登録した解析を、ブロックデータの1回の走査でまとめて実行する"""
+
+    def __init__(self, directory, data_format="files", workers=1, from_height=None, to_height=None, last=None,
+                 chunk_size=CHUNK_SIZE):
+        self.directory = directory
+        self.data_format = data_format
+        self.workers = workers
+        self.range = (from_height, to_height, last)
+        self.chunk_size = chunk_size
+        self.analyzers = []
+
+    def register(self, analyzer):
+        self.analyzers.append(analyzer)
+        return analyzer
+
+    def run(self):
+        """全ブロックを1度だけ読み、各解析の finalize() の戻り値をリストで返す"""
+        items, names, keys = list_blocks(self.directory, self.data_format, *self.range)
+        idents = list(zip(names, keys))
+
+        limits, plans = [], []
+        for analyzer in self.analyzers:
+            limit = len(items) if analyzer.max_blocks is None else min(len(items), analyzer.max_blocks)
+            if limit < len(items):
+                print(f"⚠️ {analyzer.name}: {analyzer.max_blocks}ブロックに到達しました。以降のブロックは解析しません。")
+            limits.append(limit)
+            plans.append(analyzer.plan(idents[:limit]))
+        count = max(limits, default=0)
+
+        # どれか1つの解析でも必要なブロックだけを読む
+        wanted = [tuple(i < limit and plan[i] for plan, limit in zip(plans, limits)) for i in range(count)]
+        tasks = [(items[i], w) for i, w in enumerate(wanted) if any(w)]
+        extracted = iter_extracted(self.directory, self.data_format, tasks,
+                                   [analyzer.extract for analyzer in self.analyzers], self.workers, self.chunk_size)
+
+        pending = None  # 先読みした結果（読めなかったブロックは飛ばされるので名前で突き合わせる）
+        for i in tqdm(range(count), desc="Scanning blocks", unit="block"):
+            outputs = None
+            if any(wanted[i]):
+                if pending is None:
+                    pending = next(extracted, None)
+                if pending is not None and pending[0] == idents[i][0]:
+                    outputs, pending = pending[1], None
+            for j, analyzer in enumerate(self.analyzers):
+                if i < limits[j]:
+                    analyzer.feed(idents[i], outputs[j] if outputs is not None else None)
+
+        return [analyzer.finalize() for analyzer in self.analyzers]
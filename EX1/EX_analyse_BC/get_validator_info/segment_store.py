@@ -0,0 +1,167 @@
+import gzip
+import json
+import os
+
+import numpy as np
+
+from validator_store import loads
+
+# 追記型のセグメント保存形式
+#
+# {データディレクトリ}/segments/segment_00000.jsonl.gz ... にブロックを1行ずつ
+# gzipメンバーとして追記する（ファイル全体は普通の gzip JSON Lines として zcat で読める）。
+# index.bin には 高さ → (セグメント番号, オフセット, 長さ) を固定長バイナリで追記し、
+# 読み込み時は memmap で開いて必要な範囲だけを seek して読む。
+
+SEGMENT_DIR = "segments"
+INDEX_FILE = "index.bin"
+SEGMENT_SIZE = 64 * 1024 * 1024  # 1セグメントの最大バイト数
+READ_CHUNK = 8 * 1024 * 1024  # 範囲読み込みで1回に読む最大バイト数
+INDEX_DTYPE = np.dtype([
+    ("height", "<i8"),
+    ("segment", "<u4"),
+    ("offset", "<u8"),
+    ("length", "<u4"),
+])
+
+
+def segment_dir_for(directory):
+    return os.path.join(directory, SEGMENT_DIR)
+
+
+def has_segments(directory):
+    return os.path.exists(os.path.join(segment_dir_for(directory), INDEX_FILE))
+
+
+def segment_path(directory, segment):
+    return os.path.join(segment_dir_for(directory), f"segment_{segment:05d}.jsonl.gz")
+
+
+class SegmentWriter:
+    """ブロックをセグメントファイルに追記し、インデックスを更新する"""
+
+    def __init__(self, directory, segment_size=SEGMENT_SIZE):
+        self.directory = directory
+        self.segment_size = segment_size
+        os.makedirs(segment_dir_for(directory), exist_ok=True)
+
+        # 既存の最後のセグメントから追記を再開する
+        self.segment = 0
+        while os.path.exists(segment_path(directory, self.segment + 1)):
+            self.segment += 1
+        self.data_file = open(segment_path(directory, self.segment), "ab")
+        self.index_file = open(os.path.join(segment_dir_for(directory), INDEX_FILE), "ab")
+
+    def append(self, height, record):
+        line = json.dumps(record, separators=(",", ":"), ensure_ascii=False) + "\n"
+        payload = gzip.compress(line.encode("utf-8"))
+
+        if self.data_file.tell() > 0 and self.data_file.tell() + len(payload) > self.segment_size:
+            self.data_file.close()
+            self.segment += 1
+            self.data_file = open(segment_path(self.directory, self.segment), "ab")
+
+        offset = self.data_file.tell()
+        self.data_file.write(payload)
+        self.data_file.flush()
+
+        # データを書き終えてからインデックスに追記（途中で落ちても壊れた参照を残さない）
+        entry = np.array([(height, self.segment, offset, len(payload))], dtype=INDEX_DTYPE)
+        self.index_file.write(entry.tobytes())
+        self.index_file.flush()
+
+    def close(self):
+        self.data_file.close()
+        self.index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SegmentReader:
+    """memmapしたインデックスを使って高さ指定でブロックを読む"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        index_path = os.path.join(segment_dir_for(directory), INDEX_FILE)
+        count = os.path.getsize(index_path) // INDEX_DTYPE.itemsize
+        if count:
+            index = np.memmap(index_path, dtype=INDEX_DTYPE, mode="r", shape=(count,))
+        else:
+            index = np.zeros(0, dtype=INDEX_DTYPE)
+
+        # 同じ高さが複数回書かれた場合は最後のものを採用し、高さ順に並べる
+        reversed_heights = index["height"][::-1]
+        _, last = np.unique(reversed_heights, return_index=True)
+        self.index = index[count - 1 - last]
+        self.heights = self.index["height"]
+
+    def __len__(self):
+        return len(self.heights)
+
+    def __contains__(self, height):
+        i = np.searchsorted(self.heights, height)
+        return i < len(self.heights) and self.heights[i] == height
+
+    def read(self, height):
+        i = np.searchsorted(self.heights, height)
+        if i >= len(self.heights) or self.heights[i] != height:
+            raise KeyError(height)
+        entry = self.index[i]
+        with open(segment_path(self.directory, int(entry["segment"])), "rb") as f:
+            f.seek(int(entry["offset"]))
+            return loads(gzip.decompress(f.read(int(entry["length"]))))
+
+    def iter_range(self, from_height=None, to_height=None):
+        """from_height〜to_height（両端含む）のブロックを高さ順に (height, record) で返す"""
+        lo = 0 if from_height is None else np.searchsorted(self.heights, from_height, side="left")
+        hi = len(self.heights) if to_height is None else np.searchsorted(self.heights, to_height, side="right")
+        return self._iter_positions(np.arange(lo, hi))
+
+    def iter_heights(self, heights):
+        """指定した高さ（昇順）のブロックを (height, record) で返す（無い高さは飛ばす）"""
+        heights = np.asarray(heights, dtype=np.int64)
+        positions = np.searchsorted(self.heights, heights)
+        found = positions < len(self.heights)
+        found[found] = self.heights[positions[found]] == heights[found]
+        return self._iter_positions(positions[found])
+
+    def _iter_positions(self, positions):
+        """インデックス上の位置（昇順）のブロックを、近いものはまとめて読みながら返す"""
+        files = {}
+        try:
+            start, hi = 0, len(positions)
+            while start < hi:
+                # 同じセグメント内で近接している範囲をまとめて1回の seek/read で読む
+                # （取得は新しい順のことが多いので、オフセットの昇順・降順は問わない）
+                p = positions[start]
+                segment = int(self.index["segment"][p])
+                first = int(self.index["offset"][p])
+                last = first + int(self.index["length"][p])
+                end = start + 1
+                while end < hi and int(self.index["segment"][positions[end]]) == segment:
+                    offset = int(self.index["offset"][positions[end]])
+                    new_first = min(first, offset)
+                    new_last = max(last, offset + int(self.index["length"][positions[end]]))
+                    if new_last - new_first > READ_CHUNK:
+                        break
+                    first, last = new_first, new_last
+                    end += 1
+
+                if segment not in files:
+                    files[segment] = open(segment_path(self.directory, segment), "rb")
+                f = files[segment]
+                f.seek(first)
+                chunk = f.read(last - first)
+
+                for p in positions[start:end]:
+                    offset = int(self.index["offset"][p]) - first
+                    payload = chunk[offset:offset + int(self.index["length"][p])]
+                    yield int(self.heights[p]), loads(gzip.decompress(payload))
+                start = end
+        finally:
+            for f in files.values():
+                f.close()
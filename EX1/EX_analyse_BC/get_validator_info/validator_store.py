@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+
+try:
+    import orjson  # インストールされていれば高速なJSONデコーダを使う
+except ImportError:
+    orjson = None
+
+# バリデータセットの差分保存（delta形式）
+#
+# BlockNum_{height}.json には "validators" の代わりに
+#   "validator_set": セットのハッシュ, "proposer_priorities": [高さごとの優先度]
+# を保存し、アドレス・公開鍵・投票力などほぼ変化しない部分は
+# {データディレクトリ}/validator_sets/{ハッシュ}.json に1度だけ保存する。
+
+VALIDATOR_SET_DIR = "validator_sets"
+STATIC_FIELDS = ("address", "pub_key", "voting_power")
+
+_set_cache = {}
+
+
+def loads(raw):
+    """JSON（bytes/str）をデコードする（orjson があればそちらを使う）"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def set_dir_for(directory):
+    return os.path.join(directory, VALIDATOR_SET_DIR)
+
+
+def split_validators(validators):
+    """バリデータ一覧を (セットのハッシュ, 固定部分のリスト, 優先度のリスト) に分ける"""
+    static = [{k: v[k] for k in STATIC_FIELDS if k in v} for v in validators]
+    encoded = json.dumps(static, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    set_hash = hashlib.sha256(encoded).hexdigest()
+    priorities = [v.get("proposer_priority") for v in validators]
+    return set_hash, static, priorities
+
+
+def save_validator_set(directory, set_hash, static):
+    """同じハッシュのセットがまだ無ければ保存する"""
+    path = os.path.join(set_dir_for(directory), f"{set_hash}.json")
+    if os.path.exists(path):
+        return
+    os.makedirs(set_dir_for(directory), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(static, f, separators=(",", ":"), ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def to_delta_record(directory, block_info, validators):
+    """1ブロック分の保存データを delta 形式に変換する（セットは必要なら保存）"""
+    set_hash, static, priorities = split_validators(validators)
+    save_validator_set(directory, set_hash, static)
+    return {
+        "block_info": block_info,
+        "validator_set": set_hash,
+        "proposer_priorities": priorities,
+    }
+
+
+def load_validator_set(directory, set_hash):
+    """セットを読み込む（同じセットは1度だけ読み込んでキャッシュ）"""
+    key = (directory, set_hash)
+    if key not in _set_cache:
+        path = os.path.join(set_dir_for(directory), f"{set_hash}.json")
+        with open(path, "rb") as f:
+            _set_cache[key] = loads(f.read())
+    return _set_cache[key]
+
+
+def expand_record(directory, data):
+    """delta 形式のデータに高さごとの "validators" を復元する（full 形式はそのまま返す）"""
+    if "validator_set" not in data:
+        return data
+    static = load_validator_set(directory, data["validator_set"])
+    data["validators"] = [
+        {**v, "proposer_priority": p}
+        for v, p in zip(static, data.get("proposer_priorities", []))
+    ]
+    return data
+
+
+def load_block(file_path):
+    """BlockNum_{height}.json を読み込み、full/delta どちらの形式でも同じ形で返す"""
+    with open(file_path, "rb") as f:
+        data = loads(f.read())
+    return expand_record(os.path.dirname(file_path), data)
@@ -1,156 +1,275 @@
 import os
-import json
+import sys
+import numpy as np
 import pandas as pd
-from tqdm import tqdm
-from collections import defaultdict
-from datetime import datetime
+from collections import Counter
+from delay_matrix import write_delay_matrix
+from analysis_cache import AnalysisCache
+from scan_engine import ScanEngine
 
 # === ディレクトリ設定 ===
 TARGET_DIR = "./current"
 SUMMARY_DIR = "./analysis_results"
 VALIDATOR_DIR = "./output"
-os.makedirs(SUMMARY_DIR, exist_ok=True)
-os.makedirs(VALIDATOR_DIR, exist_ok=True)
 
 # ブロック数制限を設定
 MAX_BLOCKS = 50000
-block_counter = 0
+FROM_HEIGHT = None  # 解析する最初の高さ（None: 先頭から）
+TO_HEIGHT = None  # 解析する最後の高さ（None: 末尾まで）
+LAST = None  # 範囲の末尾から何ブロックを解析するか（None: 範囲全体）
+DATA_FORMAT = "files"  # "files": BlockNum_{height}.json を読む / "segments": 圧縮セグメントをインデックス経由で読む
 
-def parse_timestamp(ts: str) -> datetime | None:
-    if ts.startswith("0001-01-01"):
+NAT_NS = np.iinfo(np.int64).min  # 解析できない / ゼロ時刻（0001-01-01）の署名
+CHUNK_BLOCKS = 1000  # タイムスタンプをまとめて変換するブロック数
+WRITE_VALIDATOR_CSV = False  # True: 従来どおりバリデータごとの署名履歴CSVも output/ に書き出す
+CACHE = True  # True: 前回のブロックごとの集計を再利用し、新しいブロック・書き換わったブロックだけを読む
+CACHE_VERSION = 1  # ブロックごとに保存する内容を変えたら上げる（古いキャッシュを捨てる）
+
+def parse_timestamps_ns(timestamps):
+    """ISO8601 文字列のリストを int64 のナノ秒（UNIX時間）に一括変換する（ゼロ時刻などは NAT_NS）"""
+    if not timestamps:
+        return np.zeros(0, dtype=np.int64)
+    values = pd.to_datetime(pd.Series(timestamps, dtype=object), utc=True, format="ISO8601", errors="coerce")
+    return pd.DatetimeIndex(values).asi8
+
+def extract_signatures(data, filename):
+    """ブロックから (高さ, ブロック時刻, 署名者アドレスのリスト, 署名時刻のリスト) を取り出す（ブロック情報が無ければ None）"""
+    if 'block_info' not in data or 'block' not in data['block_info']:
         return None
-    if ts.endswith("Z"):
-        ts = ts[:-1]
-    if '.' in ts:
-        date_part, frac = ts.split('.')
-        frac = (frac + '000000')[:6]
-        ts = f"{date_part}.{frac}"
-    return datetime.fromisoformat(ts)
-
-# データ収集
-validator_sign_counts = defaultdict(int)
-validator_sign_timestamps = defaultdict(list)
-validator_delay_values = defaultdict(list)
-all_validators_set = set()
-all_block_heights = set()
-block_data = []
-
-# メイン処理
-for filename in tqdm(sorted(os.listdir(TARGET_DIR))):
-    if block_counter >= MAX_BLOCKS:
-        print(f"\n⚠️ {MAX_BLOCKS}ブロックに到達しました。処理を終了します。")
-        break
-
-    if not filename.endswith(".json"):
-        continue
-
-    path = os.path.join(TARGET_DIR, filename)
-
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-
-        if 'block_info' not in data or 'block' not in data['block_info']:
-            continue
-
-        block = data['block_info']['block']
-        height = int(block['header']['height'])
-        block_time = parse_timestamp(block['header']['time'])
-        all_block_heights.add(height)
-
-        sigs = block['last_commit']['signatures']
-        timestamps = []
-        delays_from_block = []
-
-        for s in sigs:
-            addr = s.get('validator_address')
-            ts = s.get('timestamp')
-            sig_time = parse_timestamp(ts)
-
-            if addr:
-                validator_sign_counts[addr] += 1
-                all_validators_set.add(addr)
-
-            if sig_time and addr:
-                validator_sign_timestamps[addr].append({
-                    "block_height": height,
-                    "timestamp": ts
-                })
-
-                if block_time:
-                    delay_sec = abs((sig_time - block_time).total_seconds())
-                    delays_from_block.append(delay_sec)
-                    validator_delay_values[addr].append((height, delay_sec))
-
-                timestamps.append(sig_time)
-
-        signature_diff_sec = max(delays_from_block) if delays_from_block else 0
-        signature_spread_sec = (max(timestamps) - min(timestamps)).total_seconds() if len(timestamps) >= 2 else 0
-
-        block_data.append({
-            "block_height": height,
-            "block_time": block_time,
-            "signature_diff_sec": signature_diff_sec,
-            "signature_spread_sec": signature_spread_sec
+    block = data['block_info']['block']
+    sigs = block['last_commit']['signatures']
+    return (int(block['header']['height']), block['header']['time'],
+            [s.get('validator_address') for s in sigs], [s.get('timestamp') for s in sigs])
+
+def process_chunk(pending):
+    """チャンク内の全タイムスタンプを一括変換し、遅延とばらつきをブロックごとの集計にまとめる
+
+    集計は {"block": 02/03 の行, "signers": 署名者, "addresses": 有効な署名のアドレス,
+    "offsets": 署名時刻−ブロック時刻ns, "timestamps": 署名時刻の文字列（WRITE_VALIDATOR_CSV 時のみ）}。
+    """
+    block_ns = parse_timestamps_ns([block_ts for _, block_ts, _, _ in pending])
+    sig_ns = parse_timestamps_ns([ts for _, _, _, ts_list in pending for ts in ts_list])
+
+    entries = []
+    offset = 0
+    for (height, _, addr_list, ts_list), block_time in zip(pending, block_ns):
+        n = len(addr_list)
+        sig = sig_ns[offset:offset + n]
+        offset += n
+
+        has_addr = np.array([bool(a) for a in addr_list], dtype=bool)
+        valid = has_addr & (sig != NAT_NS)
+        valid_sig = sig[valid]
+
+        signature_diff_sec = 0
+        offset_ns = np.full(len(valid_sig), NAT_NS, dtype=np.int64)
+        if block_time != NAT_NS and len(valid_sig):
+            offset_ns = valid_sig - block_time
+            signature_diff_sec = np.abs(offset_ns).max() / 1e9
+        signature_spread_sec = (valid_sig.max() - valid_sig.min()) / 1e9 if len(valid_sig) >= 2 else 0
+
+        # 同じアドレスの文字列を1つにまとめる（キャッシュの pickle で重複して書かれないように）
+        addr_list = [sys.intern(a) if a else a for a in addr_list]
+        index = np.flatnonzero(valid)
+        entries.append({
+            "block": {
+                "block_height": height,
+                "block_time": int(block_time),
+                "signature_diff_sec": signature_diff_sec,
+                "signature_spread_sec": signature_spread_sec
+            },
+            "signers": [a for a in addr_list if a],
+            "addresses": [addr_list[i] for i in index],
+            "offsets": offset_ns,
+            "timestamps": [ts_list[i] for i in index] if WRITE_VALIDATOR_CSV else None,
+        })
+    return entries
+
+def collect_entries(entries, block_data, signature_chunks, all_block_heights, validator_sign_counts):
+    """ブロックごとの集計をまとめて、02/03 用の行・署名データのチャンク・署名数に追加する"""
+    heights, addrs, raw_ts, offsets = [], [], [], []
+    for entry in entries:
+        block_data.append(entry["block"])
+        all_block_heights.add(entry["block"]["block_height"])
+        validator_sign_counts.update(entry["signers"])
+        heights.append(np.full(len(entry["addresses"]), entry["block"]["block_height"], dtype=np.int64))
+        addrs.extend(entry["addresses"])
+        if WRITE_VALIDATOR_CSV:
+            raw_ts.extend(entry["timestamps"])
+        offsets.append(entry["offsets"])
+
+    if heights:
+        chunk = pd.DataFrame({
+            "block_height": np.concatenate(heights),
+            "validator_address": pd.Categorical(addrs),
+            "offset_ns": np.concatenate(offsets),
         })
+        if WRITE_VALIDATOR_CSV:
+            chunk["timestamp"] = raw_ts
+        signature_chunks.append(chunk)
+
+class SignatureTimingAnalysis:
+    """署名タイムスタンプの集計（scan_engine に登録して使う）
+
+    ブロックを高さ順に受け取り、CHUNK_BLOCKS ごとにタイムスタンプをまとめて変換する。
+    cache を渡すと、ブロックごとの集計を記録し、次回は読まずに再利用する。
+    """
+
+    name = "verify_validator_timestamp"
+    extract = staticmethod(extract_signatures)
+
+    def __init__(self, cache=None, max_blocks=None, prune_cache=True):
+        self.cache = cache
+        self.max_blocks = max_blocks
+        self.prune_cache = prune_cache
+        self.reusable = {}  # ファイル名 → 再利用できる集計
+        self.validator_sign_counts = Counter()
+        self.all_block_heights = set()
+        self.block_data = []
+        self.signature_chunks = []  # チャンクごとの署名データ（高さ・アドレス・署名時刻−ブロック時刻ns）
+        self.pending = []  # タイムスタンプ変換待ちのブロック
+        self.pending_idents = []  # pending の (ファイル名, 識別子)
+        self.entries = []  # 集計済みのブロック（読んだ順）
+        self.block_counter = 0
+
+    def plan(self, idents):
+        if self.cache is None:
+            return [True] * len(idents)
+        for name, key in idents:
+            entry = self.cache.get(name, key)
+            if entry is not None:
+                self.reusable[name] = entry
+        print(f"📦 {self.name} キャッシュ: {len(self.reusable)} ブロックを再利用、"
+              f"{len(idents) - len(self.reusable)} ブロックを解析")
+        return [name not in self.reusable for name, _ in idents]
+
+    def feed(self, ident, value):
+        entry = self.reusable.get(ident[0])
+        if entry is not None:
+            # 読んだ順を保つため、先に読んだブロックの変換を済ませてから追加する
+            self.flush_pending()
+            self.cache.put(ident[0], ident[1], entry)
+            self.entries.append(entry)
+        elif value is not None:
+            self.pending.append(value)
+            self.pending_idents.append(ident)
+        else:
+            return  # 読めなかった / ブロック情報の無いブロック
+        self.block_counter += 1
+
+        if len(self.pending) >= CHUNK_BLOCKS:
+            self.flush_pending()
+        if len(self.entries) >= CHUNK_BLOCKS:
+            self.collect()
+
+    def flush_pending(self):
+        if not self.pending:
+            return
+        for (filename, key), entry in zip(self.pending_idents, process_chunk(self.pending)):
+            if self.cache is not None:
+                self.cache.put(filename, key, entry)
+            self.entries.append(entry)
+        self.pending.clear()
+        self.pending_idents.clear()
+
+    def collect(self):
+        collect_entries(self.entries, self.block_data, self.signature_chunks,
+                        self.all_block_heights, self.validator_sign_counts)
+        self.entries.clear()
+
+    def finalize(self):
+        """残りを集計して analysis_results/ と output/ に書き出す"""
+        self.flush_pending()
+        self.collect()
+        if self.cache is not None:
+            self.cache.save(prune=self.prune_cache)
+        os.makedirs(SUMMARY_DIR, exist_ok=True)
+        os.makedirs(VALIDATOR_DIR, exist_ok=True)
+        block_data, signature_chunks = self.block_data, self.signature_chunks
+        validator_sign_counts, all_block_heights = self.validator_sign_counts, self.all_block_heights
+
+        # DataFrame化
+        df_blocks = pd.DataFrame(block_data)
+        df_blocks.sort_values("block_height", inplace=True)
+        df_blocks_all = df_blocks[["block_height", "block_time"]].drop_duplicates("block_height", keep="last")
+        df_blocks["block_time"] = df_blocks["block_time"].where(df_blocks["block_time"] != NAT_NS)
+        df_blocks["block_interval_sec"] = df_blocks["block_time"].diff() / 1e9
+        df_blocks.dropna(inplace=True)
+
+        df_sigs = pd.concat(signature_chunks, ignore_index=True) if signature_chunks else pd.DataFrame(
+            columns=["block_height", "validator_address", "offset_ns"])
+        df_sigs["validator_address"] = df_sigs["validator_address"].astype(str)
+
+        # 01. バリデータ署名率
+        total_blocks = len(all_block_heights)
+        df_signrate = pd.DataFrame([
+            {
+                "validator_address": addr,
+                "signed_blocks": validator_sign_counts.get(addr, 0),
+                "total_blocks": total_blocks,
+                "signature_rate_percent": round(validator_sign_counts.get(addr, 0) / total_blocks * 100, 2)
+            }
+            for addr in sorted(validator_sign_counts)
+        ])
+        df_signrate.sort_values("signature_rate_percent", ascending=False, inplace=True)
+        df_signrate.to_csv(os.path.join(SUMMARY_DIR, "01_validator_signature_rates.csv"), index=False)
+
+        # 02. ブロック内署名ばらつき（spread）
+        df_blocks[["block_height", "signature_spread_sec"]].to_csv(
+            os.path.join(SUMMARY_DIR, "02_block_signature_spread.csv"), index=False)
+
+        # 03. ブロック間隔と最大署名遅延
+        df_blocks[["block_height", "block_interval_sec", "signature_diff_sec"]].to_csv(
+            os.path.join(SUMMARY_DIR, "03_block_vs_signature_delay.csv"), index=False)
+
+        # 04. 遅延ランキング（最大・平均遅延 + ブロック）
+        df_delay_values = df_sigs[df_sigs["offset_ns"] != NAT_NS].assign(delay_ns=lambda d: d["offset_ns"].abs())
+        grouped = df_delay_values.groupby("validator_address", sort=False)["delay_ns"]
+        max_rows = df_delay_values.loc[grouped.idxmax()]
+        df_delays = pd.DataFrame({
+            "validator_address": max_rows["validator_address"].to_numpy(),
+            "max_delay_sec": (max_rows["delay_ns"].to_numpy() / 1e9).round(3),
+            "avg_delay_sec": (grouped.mean().to_numpy() / 1e9).round(3),
+            "signed_blocks": grouped.size().to_numpy(),
+            "max_delay_block_height": max_rows["block_height"].to_numpy(),
+        })
+        df_delays.sort_values("avg_delay_sec", ascending=False, inplace=True)
+        df_delays.to_csv(os.path.join(SUMMARY_DIR, "04_validator_signature_delays.csv"), index=False)
+
+        # 05. 各バリデータの署名遅延（バリデータ × 高さ の行列として output フォルダに保存）
+        write_delay_matrix(
+            VALIDATOR_DIR,
+            df_sigs["block_height"].to_numpy(),
+            df_sigs["validator_address"].to_numpy(),
+            df_sigs["offset_ns"].to_numpy(),
+            df_blocks_all["block_height"].to_numpy(),
+            df_blocks_all["block_time"].to_numpy(),
+        )
+
+        if WRITE_VALIDATOR_CSV:
+            for addr, records in df_sigs.groupby("validator_address", sort=False):
+                df = records[["block_height", "timestamp"]].sort_values("block_height", kind="stable")
+                output_file = os.path.join(VALIDATOR_DIR, f"{addr}.csv")
+                df.to_csv(output_file, index=False)
+
+        # 完了ログ
+        print("\n✅ 出力完了！")
+        print(f"📂 集計ファイル: {SUMMARY_DIR}/")
+        print(f"📂 バリデータ署名遅延行列: {VALIDATOR_DIR}/")
+
+
+def make_analysis(target_dir=TARGET_DIR):
+    """このモジュールの設定で SignatureTimingAnalysis を作る"""
+    cache = AnalysisCache(target_dir, f"verify_validator_timestamp_{DATA_FORMAT}_{int(WRITE_VALIDATOR_CSV)}",
+                          CACHE_VERSION) if CACHE else None
+    return SignatureTimingAnalysis(cache, max_blocks=MAX_BLOCKS,
+                                   prune_cache=FROM_HEIGHT is None and TO_HEIGHT is None and LAST is None)
+
+
+def main(target_dir=TARGET_DIR):
+    engine = ScanEngine(target_dir, DATA_FORMAT, from_height=FROM_HEIGHT, to_height=TO_HEIGHT, last=LAST)
+    engine.register(make_analysis(target_dir))
+    engine.run()
 
-        block_counter += 1
-
-    except Exception as e:
-        print(f"⚠️ Error in {filename}: {e}")
-
-# DataFrame化
-df_blocks = pd.DataFrame(block_data)
-df_blocks.sort_values("block_height", inplace=True)
-df_blocks["block_interval_sec"] = df_blocks["block_time"].diff().dt.total_seconds()
-df_blocks.dropna(inplace=True)
-
-# 01. バリデータ署名率
-total_blocks = len(all_block_heights)
-df_signrate = pd.DataFrame([
-    {
-        "validator_address": addr,
-        "signed_blocks": validator_sign_counts.get(addr, 0),
-        "total_blocks": total_blocks,
-        "signature_rate_percent": round(validator_sign_counts.get(addr, 0) / total_blocks * 100, 2)
-    }
-    for addr in sorted(all_validators_set)
-])
-df_signrate.sort_values("signature_rate_percent", ascending=False, inplace=True)
-df_signrate.to_csv(os.path.join(SUMMARY_DIR, "01_validator_signature_rates.csv"), index=False)
-
-# 02. ブロック内署名ばらつき（spread）
-df_blocks[["block_height", "signature_spread_sec"]].to_csv(
-    os.path.join(SUMMARY_DIR, "02_block_signature_spread.csv"), index=False)
-
-# 03. ブロック間隔と最大署名遅延
-df_blocks[["block_height", "block_interval_sec", "signature_diff_sec"]].to_csv(
-    os.path.join(SUMMARY_DIR, "03_block_vs_signature_delay.csv"), index=False)
-
-# 04. 遅延ランキング（最大・平均遅延 + ブロック）
-delay_stats = []
-for addr, delay_list in validator_delay_values.items():
-    max_block, max_delay = max(delay_list, key=lambda x: x[1])
-    avg_delay = sum(d for _, d in delay_list) / len(delay_list)
-    delay_stats.append({
-        "validator_address": addr,
-        "max_delay_sec": round(max_delay, 3),
-        "avg_delay_sec": round(avg_delay, 3),
-        "signed_blocks": len(delay_list),
-        "max_delay_block_height": max_block
-    })
-df_delays = pd.DataFrame(delay_stats)
-df_delays.sort_values("avg_delay_sec", ascending=False, inplace=True)
-df_delays.to_csv(os.path.join(SUMMARY_DIR, "04_validator_signature_delays.csv"), index=False)
-
-# 05. 各バリデータの署名履歴（outputフォルダに個別保存）
-for addr, records in validator_sign_timestamps.items():
-    df = pd.DataFrame(records)
-    df.sort_values("block_height", inplace=True)
-    output_file = os.path.join(VALIDATOR_DIR, f"{addr}.csv")
-    df.to_csv(output_file, index=False)
-
-# 完了ログ
-print("\n✅ 出力完了！")
-print(f"📂 集計ファイル: {SUMMARY_DIR}/")
-print(f"📂 バリデータ署名履歴: {VALIDATOR_DIR}/")
+if __name__ == "__main__":
+    main()
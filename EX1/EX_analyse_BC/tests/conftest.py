@@ -0,0 +1,45 @@
+import os
+import sys
+
+import pytest
+
+# スクリプトは自分のディレクトリと EX_analyse_BC（common/）を import パスに入れて動くので、テストでも同じにする
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for name in ("", "get_validator_info", "get_blockproposer", "benchmark"):
+    path = os.path.join(BASE_DIR, name)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import get_validators_set_v2 as crawler  # noqa: E402
+from mock_rpc import start_server  # noqa: E402
+
+
+@pytest.fixture
+def save_dir(tmp_path, monkeypatch):
+    """取得スクリプトの保存先とマニフェストを一時ディレクトリに向ける"""
+    directory = tmp_path / "current"
+    directory.mkdir()
+    monkeypatch.setattr(crawler, "SAVE_DIR", str(directory))
+    monkeypatch.setattr(crawler, "MANIFEST_FILE", str(tmp_path / "current_manifest.json"))
+    monkeypatch.setattr(crawler, "RESUME", True)
+    monkeypatch.setattr(crawler, "STORAGE_FORMAT", "files")
+    monkeypatch.setattr(crawler, "STORAGE_MODE", "full")
+    monkeypatch.setattr(crawler, "VALIDATOR_SOURCE", "rpc")
+    return directory
+
+
+@pytest.fixture
+def mock_chain_options():
+    """mock_rpc の合成チェーンの設定（150 バリデータなので /validators は2ページ）"""
+    return {"latest_height": 200, "span": 100, "validators": 150}
+
+
+@pytest.fixture
+def mock_rpc(monkeypatch, mock_chain_options):
+    """合成チェーンを返すローカル RPC を起動し、取得スクリプトをそこへ向ける"""
+    server = start_server(chain_options=mock_chain_options)
+    monkeypatch.setattr(crawler, "RPC_URLS", [server.url])
+    monkeypatch.setattr(crawler, "POOL", None)
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,108 @@
+import json
+import os
+import re
+
+import pytest
+
+import analyse_v2
+import get_validators_set_v2 as crawler
+from segment_store import SegmentReader, SegmentWriter
+
+
+@pytest.fixture
+def mock_chain_options():
+    return {"latest_height": 200, "span": 100, "validators": 20}
+
+
+@pytest.fixture
+def blocks(save_dir, mock_rpc, monkeypatch, request):
+    """モック RPC から高さ 171〜200 を取得したデータディレクトリ"""
+    data_format = getattr(request, "param", "files")
+    monkeypatch.setattr(crawler, "STORAGE_FORMAT", data_format)
+    crawler.main(block_count=30)
+    monkeypatch.setattr(analyse_v2, "DATA_FORMAT", data_format)
+    monkeypatch.setattr(analyse_v2, "WORKERS", 1)
+    return save_dir
+
+
+def analyse(directory, capsys, cache=True):
+    """analyse_v2 を実行し、(出力CSVの中身, (再利用したブロック数, 解析したブロック数)) を返す"""
+    analyse_v2.CACHE = cache
+    output = os.path.join(directory, "..", "cached.csv" if cache else "fresh.csv")
+    capsys.readouterr()
+    analyse_v2.main(directory=str(directory), output_csv=output)
+    m = re.search(r"キャッシュ: (\d+) ブロックを再利用、(\d+) ブロックを解析", capsys.readouterr().out)
+    with open(output, "rb") as f:
+        return f.read(), m and (int(m.group(1)), int(m.group(2)))
+
+
+def assert_same_as_fresh(directory, capsys, reused, parsed):
+    cached, counts = analyse(directory, capsys)
+    fresh, _ = analyse(directory, capsys, cache=False)
+    assert cached == fresh
+    assert counts == (reused, parsed)
+
+
+def change_proposer(path):
+    """ブロックの proposer を別のバリデータに書き換える（サイズと更新時刻も変わる）"""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    header = data["block_info"]["block"]["header"]
+    header["proposer_address"] = next(v["address"] for v in data["validators"] if v["address"] != header["proposer_address"])
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    return data
+
+
+def test_reuses_unchanged_blocks(blocks, capsys, monkeypatch):
+    monkeypatch.setattr(analyse_v2, "CACHE", True)
+    assert_same_as_fresh(blocks, capsys, 0, 30)
+    assert_same_as_fresh(blocks, capsys, 30, 0)
+
+
+def test_rewritten_block_is_reparsed_with_its_neighbours(blocks, capsys, monkeypatch):
+    monkeypatch.setattr(analyse_v2, "CACHE", True)
+    analyse(blocks, capsys)
+    change_proposer(blocks / "BlockNum_185.json")
+    # 185 と、前のブロックが変わった 186 を解析し直す（184 は比較用にバリデータ一覧だけ読む）
+    assert_same_as_fresh(blocks, capsys, 28, 3)
+
+
+def test_removed_and_added_blocks(blocks, capsys, monkeypatch, tmp_path):
+    monkeypatch.setattr(analyse_v2, "CACHE", True)
+    oldest = [f"BlockNum_{h}.json" for h in range(171, 176)]
+    for name in oldest:
+        os.rename(blocks / name, tmp_path / name)
+    analyse(blocks, capsys)
+
+    # 追加された 171〜175 と、前のブロックができた 176 を解析する
+    for name in oldest:
+        os.rename(tmp_path / name, blocks / name)
+    assert_same_as_fresh(blocks, capsys, 24, 6)
+
+    # 190 を消すと、前のブロックが変わった 191 を解析し直す（189 は比較用に読む）
+    os.remove(blocks / "BlockNum_190.json")
+    assert_same_as_fresh(blocks, capsys, 28, 2)
+    # 消えたブロックの結果はキャッシュから捨てられている
+    assert_same_as_fresh(blocks, capsys, 29, 0)
+
+
+def test_version_change_discards_cache(blocks, capsys, monkeypatch):
+    monkeypatch.setattr(analyse_v2, "CACHE", True)
+    analyse(blocks, capsys)
+    monkeypatch.setattr(analyse_v2, "CACHE_VERSION", analyse_v2.CACHE_VERSION + 1)
+    assert_same_as_fresh(blocks, capsys, 0, 30)
+
+
+@pytest.mark.parametrize("blocks", ["segments"], indirect=True)
+def test_segments_rewritten_block(blocks, capsys, monkeypatch):
+    monkeypatch.setattr(analyse_v2, "CACHE", True)
+    analyse(blocks, capsys)
+    record = SegmentReader(str(blocks)).read(185)
+    header = record["block_info"]["block"]["header"]
+    header["proposer_address"] = next(v["address"] for v in record["validators"] if v["address"] != header["proposer_address"])
+    with SegmentWriter(str(blocks)) as writer:
+        writer.append(185, record)  # 追記した方が読まれ、インデックス上の位置（識別子）が変わる
+    assert_same_as_fresh(blocks, capsys, 28, 3)
@@ -0,0 +1,59 @@
+import csv
+import random
+
+import pytest
+
+from analyse_v2 import ProposerAnalysis
+from priority_matrix import PriorityMatrix
+
+
+def sorted_rank(validators, proposer):
+    """優先度の降順に安定ソートしたときの proposer の順位（居なければ 0）"""
+    ordered = sorted(validators, key=lambda v: int(v["proposer_priority"]), reverse=True)
+    return next((i for i, v in enumerate(ordered, start=1) if v["address"] == proposer), 0)
+
+
+def random_blocks(n, seed=0):
+    """同じ優先度・セットの入れ替わり・セット外の proposer を含むブロック列"""
+    rng = random.Random(seed)
+    addresses = [f"V{i:02d}" for i in range(12)]
+    blocks = []
+    for height in range(1, n + 1):
+        members = rng.sample(addresses, rng.randint(0, 10)) if height % 4 == 0 else addresses[:8]
+        validators = [{"address": a, "proposer_priority": str(rng.randint(-3, 3))} for a in members]
+        blocks.append((height, rng.choice(addresses + ["OUTSIDER"]), validators))
+    return blocks
+
+
+def test_ranks_match_stable_sort():
+    blocks = random_blocks(300)
+    ranks = PriorityMatrix.from_blocks(blocks).proposer_ranks()
+    assert ranks[0] == 0
+    assert ranks[1:].tolist() == [sorted_rank(blocks[i - 1][2], blocks[i][1]) for i in range(1, len(blocks))]
+
+
+@pytest.mark.parametrize("rank_chunk", [1, 3, 1024])
+def test_proposer_analysis_ranks(tmp_path, rank_chunk):
+    blocks = random_blocks(200, seed=1)
+    output = tmp_path / "block_analysis.csv"
+    analysis = ProposerAnalysis(str(output), rank_chunk=rank_chunk)
+    for height, proposer, validators in blocks:
+        top = max(validators, key=lambda v: int(v["proposer_priority"]))["address"] if validators else None
+        analysis.add({"file": f"BlockNum_{height}.json", "height": height, "proposer_address": proposer,
+                      "validators": validators, "max_priority_address": top,
+                      "source_key": (f"BlockNum_{height}.json", 0)})
+    summary = analysis.finalize()
+
+    expected = [None]
+    for (_, _, prev_validators), (_, proposer, _) in zip(blocks, blocks[1:]):
+        top = max(prev_validators, key=lambda v: int(v["proposer_priority"]))["address"] if prev_validators else None
+        if proposer == top:
+            expected.append(1)
+        elif prev_validators:
+            expected.append(sorted_rank(prev_validators, proposer) or None)
+        else:
+            expected.append(None)
+    with open(output, encoding="utf-8-sig") as f:
+        got = [int(row["proposer_rank_in_prev"]) if row["proposer_rank_in_prev"] else None for row in csv.DictReader(f)]
+    assert got == expected
+    assert summary["rank_counter"]["not_found"] > 0
@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+import get_validators_set_v2 as crawler
+from proposer_sim import ProposerSimulator, go_div, verify_predictions
+
+
+def validators(powers, priorities, addresses="AB"):
+    return [{"address": a, "voting_power": str(p), "proposer_priority": str(q)}
+            for a, p, q in zip(addresses, powers, priorities)]
+
+
+def test_weighted_round_robin_by_hand():
+    # 投票力 1 : 3。2回目は同点（2, 2）なのでアドレスの小さい A、4回で元の優先度に戻る
+    sim = ProposerSimulator(validators([1, 3], [0, 0]), height=10)
+    assert [sim.increment()[0] for _ in range(8)] == ["B", "A", "B", "B"] * 2
+    assert sim.priorities.tolist() == [0, 0]
+    assert sim.height == 18 and sim.proposer() == "B"
+    assert ProposerSimulator(validators([1, 3], [0, 0])).increment(4) == ["B", "A", "B", "B"]
+
+
+def test_rescale_and_shift_follow_go_arithmetic():
+    assert go_div(-7, 2) == -3  # 0 方向への切り捨て
+    # 差 200 > 2 × 総投票力 4 → 50 で割って [2, -2]、平均 0、投票力を足して A が選ばれる
+    sim = ProposerSimulator(validators([1, 1], [100, -100]))
+    assert sim.increment() == ["A"]
+    assert sim.priorities.tolist() == [1, -1]
+    # 平均は床除算: (-1 + -2) // 2 = -2 を引いてから投票力を足す
+    sim = ProposerSimulator(validators([1, 1], [-1, -2]))
+    assert sim.increment() == ["A"]
+    assert sim.priorities.tolist() == [0, 1]
+
+
+@pytest.fixture
+def mock_chain_options():
+    """7 ブロックごとに投票力が変わる 20 バリデータのチェーン"""
+    return {"latest_height": 200, "span": 100, "validators": 20, "set_change_every": 7}
+
+
+def crawl(directory, monkeypatch, source):
+    directory.mkdir()
+    monkeypatch.setattr(crawler, "SAVE_DIR", str(directory))
+    monkeypatch.setattr(crawler, "MANIFEST_FILE", str(directory) + "_manifest.json")
+    monkeypatch.setattr(crawler, "VALIDATOR_SOURCE", source)
+    crawler.main(block_count=40)
+    records = {}
+    for height in range(161, 201):
+        with open(directory / f"BlockNum_{height}.json", encoding="utf-8") as f:
+            records[height] = json.load(f)
+    return records
+
+
+def test_simulation_matches_recorded_heights(save_dir, mock_rpc, monkeypatch, tmp_path):
+    recorded = crawl(tmp_path / "rpc", monkeypatch, "rpc")
+    rpc_requests = mock_rpc.stats[("/validators", 200)]
+
+    # 記録した高さの1つ前から予測すると、セットが変わった高さ以外はすべて一致する
+    stats = verify_predictions(
+        (h, r["block_info"]["block"]["header"]["proposer_address"], r["validators"]) for h, r in recorded.items()
+    )
+    changes = sum(1 for h in range(162, 201) if h % 7 == 0)
+    assert stats["compared"] == stats["matched"] == stats["proposer_matched"] == 39 - changes
+    assert stats["skipped"] == changes
+
+    # simulate で取得しても、/validators を毎回取得したときと同じ記録になる
+    simulated = crawl(tmp_path / "simulate", monkeypatch, "simulate")
+    assert {h: r["validators"] for h, r in simulated.items()} == {h: r["validators"] for h, r in recorded.items()}
+    assert mock_rpc.stats[("/validators", 200)] - rpc_requests == 1 + changes
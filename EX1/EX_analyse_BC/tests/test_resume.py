@@ -0,0 +1,66 @@
+import json
+import os
+
+import get_validators_set_v2 as crawler
+
+
+def touch_blocks(directory, heights):
+    for height in heights:
+        (directory / f"BlockNum_{height}.json").write_text("{}")
+
+
+def test_manifest_round_trip(save_dir):
+    assert crawler.load_manifest() == {"completed": set(), "failed": set()}
+    crawler.save_manifest({"completed": {1, 2, 3}, "failed": {3, 4}})
+    # 後から成功した高さは失敗の側に残さない
+    assert crawler.load_manifest() == {"completed": {1, 2, 3}, "failed": {4}}
+    assert not os.path.exists(crawler.MANIFEST_FILE + ".tmp")
+
+
+def test_plan_skips_stored_heights(save_dir):
+    touch_blocks(save_dir, [96, 97, 98])
+    manifest = crawler.load_manifest()
+    assert crawler.plan_heights(100, manifest, block_count=5) == [100, 99]
+    assert manifest["completed"] == {96, 97, 98}
+
+
+def test_plan_extends_to_latest_and_retries_failed(save_dir):
+    manifest = {"completed": set(range(91, 96)), "failed": {80}}
+    # 前回の末尾（95）から最新まで延長し、範囲外でも前回失敗した高さは取り直す
+    assert crawler.plan_heights(100, manifest, block_count=3) == [100, 99, 98, 97, 96, 80]
+
+
+def test_plan_refetches_failed_height_with_record_on_disk(save_dir):
+    touch_blocks(save_dir, [97, 98, 99, 100])
+    manifest = {"completed": set(), "failed": {98}}
+    assert crawler.plan_heights(100, manifest, block_count=4) == [98]
+    assert 98 not in manifest["completed"]
+
+
+def test_plan_without_resume_fetches_everything(save_dir, monkeypatch):
+    monkeypatch.setattr(crawler, "RESUME", False)
+    touch_blocks(save_dir, [99, 100])
+    assert crawler.plan_heights(100, {"completed": {99, 100}, "failed": set()}, block_count=3) == [100, 99, 98]
+
+
+def test_missing_validator_page_is_refetched(save_dir, mock_rpc, monkeypatch):
+    fetch_page, fetch_height = crawler.fetch_validator_page, crawler.fetch_height
+    failing = {(198, 2)}
+    fetched = []
+    monkeypatch.setattr(crawler, "fetch_validator_page",
+                        lambda height, page: None if (height, page) in failing else fetch_page(height, page))
+    monkeypatch.setattr(crawler, "fetch_height", lambda height: fetched.append(height) or fetch_height(height))
+
+    # 1回目: 198 の2ページ目が取れない → 保存せず失敗として記録する
+    crawler.main(block_count=5)
+    assert crawler.load_manifest() == {"completed": {196, 197, 199, 200}, "failed": {198}}
+    assert not (save_dir / "BlockNum_198.json").exists()
+
+    # 2回目: 198 だけを取り直して揃える
+    failing.clear()
+    fetched.clear()
+    crawler.main(block_count=5)
+    assert fetched == [198]
+    assert crawler.load_manifest() == {"completed": set(range(196, 201)), "failed": set()}
+    with open(save_dir / "BlockNum_198.json", encoding="utf-8") as f:
+        assert len(json.load(f)["validators"]) == 150
@@ -0,0 +1,60 @@
+import gzip
+import json
+import os
+
+import pytest
+
+from segment_store import SegmentReader, SegmentWriter, has_segments, segment_path
+
+
+def record(height):
+    return {"block_info": {"block": {"header": {"height": str(height)}}},
+            "validators": [{"address": f"V{i}", "proposer_priority": str(height * 10 + i)} for i in range(3)]}
+
+
+@pytest.fixture
+def segments(tmp_path):
+    """高さ 1〜40 を新しい順に、小さなセグメントに分けて書く"""
+    with SegmentWriter(str(tmp_path), segment_size=1024) as writer:
+        for height in range(40, 0, -1):
+            writer.append(height, record(height))
+    return str(tmp_path)
+
+
+def test_round_trip(segments):
+    assert has_segments(segments)
+    assert os.path.exists(segment_path(segments, 1))  # segment_size を超えたら次のセグメントへ
+    reader = SegmentReader(segments)
+    assert len(reader) == 40
+    assert 1 in reader and 40 in reader and 41 not in reader
+    assert reader.read(17) == record(17)
+    with pytest.raises(KeyError):
+        reader.read(41)
+
+
+def test_iter_range_and_heights(segments):
+    reader = SegmentReader(segments)
+    assert list(reader.iter_range(5, 9)) == [(h, record(h)) for h in range(5, 10)]
+    assert [h for h, _ in reader.iter_range()] == list(range(1, 41))
+    # 無い高さは飛ばす
+    assert list(reader.iter_heights([0, 3, 20, 99])) == [(3, record(3)), (20, record(20))]
+
+
+def test_segments_are_plain_gzip_json_lines(segments):
+    heights = []
+    segment = 0
+    while os.path.exists(segment_path(segments, segment)):
+        with gzip.open(segment_path(segments, segment), "rt", encoding="utf-8") as f:
+            heights += [int(json.loads(line)["block_info"]["block"]["header"]["height"]) for line in f]
+        segment += 1
+    assert sorted(heights) == list(range(1, 41))
+
+
+def test_reopen_appends_and_last_write_wins(segments):
+    with SegmentWriter(segments, segment_size=1024) as writer:
+        writer.append(41, record(41))
+        writer.append(17, {"block_info": {}, "validators": []})
+    reader = SegmentReader(segments)
+    assert len(reader) == 41
+    assert reader.read(41) == record(41)
+    assert reader.read(17) == {"block_info": {}, "validators": []}
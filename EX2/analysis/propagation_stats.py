@@ -0,0 +1,68 @@
+import csv
+
+import numpy as np
+
+from simlog import iter_blocks
+
+# simulation_log.txt からブロックごとの伝播時間の統計を作る
+#
+# ブロックごとに、届いたノードの伝播時間（ms）の p50 / p90 / p99 / 最大 と、
+# 全ノードのうち何割に届いたか（coverage）を1行にまとめて CSV に書き出す。
+# ログは simlog.iter_blocks で1ブロックずつ読むので、数百万行のログでもメモリは1ブロック分で済む。
+
+LOG_FILE = "../simulation_log.txt"
+OUTPUT_CSV = "propagation_stats.csv"
+NUM_NODES = None  # 全ノード数（None: ログに出てきた最大のノードID。SimulationConfiguration.java の NUM_OF_NODES）
+PERCENTILES = [50, 90, 99]  # 出力するパーセンタイル
+
+COLUMNS = ["height", "block_hash", "nodes_reached", "coverage"] + [f"p{p}_ms" for p in PERCENTILES] + ["max_ms"]
+
+
+def block_stats(nodes, times):
+    """1ブロック分の統計（coverage は全ノード数が決まってから計算する）"""
+    if len(times) == 0:
+        return {"nodes_reached": 0, **{f"p{p}_ms": None for p in PERCENTILES}, "max_ms": None}
+    values = np.percentile(times, PERCENTILES)
+    return {
+        "nodes_reached": int(np.count_nonzero(np.bincount(nodes))),  # 同じノードが2回出ても1と数える
+        **{f"p{p}_ms": round(float(v), 1) for p, v in zip(PERCENTILES, values)},
+        "max_ms": int(times.max()),
+    }
+
+
+def analyze_log(log_file=LOG_FILE, num_nodes=NUM_NODES):
+    """ログを1度だけ読み、ブロックごとの統計のリストと全ノード数を返す"""
+    rows = []
+    max_node = 0
+    for block_hash, height, nodes, times in iter_blocks(log_file):
+        if len(nodes):
+            max_node = max(max_node, int(nodes.max()))
+        rows.append({"height": height, "block_hash": block_hash, **block_stats(nodes, times)})
+
+    total = num_nodes or max_node
+    for row in rows:
+        row["coverage"] = round(row["nodes_reached"] / total, 4) if total else None
+    return rows, total
+
+
+def main(log_file=LOG_FILE, output_csv=OUTPUT_CSV):
+    rows, total = analyze_log(log_file)
+
+    with open(output_csv, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS, lineterminator="\n")  # pandas の to_csv と同じく LF
+        writer.writeheader()
+        writer.writerows(rows)
+
+    print(f"📦 {len(rows)} ブロック（全ノード数: {total}）")
+    if rows:
+        p90 = np.array([r["p90_ms"] for r in rows if r["p90_ms"] is not None])
+        coverage = np.array([r["coverage"] for r in rows if r["coverage"] is not None])
+        if len(p90):
+            print(f"⏱️ p90 伝播時間の中央値: {np.median(p90):.1f} ms（最大 {p90.max():.1f} ms）")
+        if len(coverage):
+            print(f"📡 coverage の最小値: {coverage.min():.2%}")
+    print(f"📁 '{output_csv}' に保存しました。")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import re
+import warnings
+
+import numpy as np
+
+# SimBlock の simulation_log.txt を1ブロックずつ読むパーサ
+#
+# ログは次の形（Gradle の出力などが前後に混ざる）:
+#   SimBlock.block.SampleProofOfStakeBlock@224aed64:0   ← ブロックのヘッダ（クラス名@ハッシュ:高さ）
+#   1,0                                                  ← ノードID,そのノードに届くまでの時間（ms）
+#   132,247
+#   ...
+#                                                        ← 空行でブロックが終わる
+# ファイルを CHUNK_BYTES ずつ読み、ヘッダの位置だけを bytes.find で探して、ブロックごとの
+# 数値部分を NumPy で一度に変換する（行ごとの Python の処理をしないので、ディスクの読み込みと同程度の速さで読める）。
+# ログ全体はメモリに載せず、保持するのは読みかけのブロック1つ分だけ。
+
+CHUNK_BYTES = 16 * 1024 * 1024  # 1回に読むバイト数
+
+HEADER = re.compile(rb"(\S+)@([0-9A-Fa-f]+):(\d+)")
+DATA_LINES = re.compile(rb"(?m)^\d+,\d+\n")  # 数値の行（他の出力が混ざったブロックの読み直し用）
+
+
+def read_numbers(data):
+    """空白区切りの整数を配列にする（読めない文字があれば None）"""
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", DeprecationWarning)  # 古い NumPy は例外ではなく警告を出す
+            return np.fromstring(data, dtype=np.int64, sep=" ")
+    except (ValueError, DeprecationWarning):
+        return None
+
+
+def parse_section(data):
+    """ブロック1つ分の数値行を (ノードID, 伝播時間ms) の配列にする"""
+    data = data.lstrip(b"\n")
+    end = data.find(b"\n\n")  # 空行より後はブロックの外（次のヘッダまでの出力）
+    if end >= 0:
+        data = data[:end + 1]
+    lines = data.count(b"\n")
+    values = read_numbers(data.replace(b",", b" ")) if data.count(b",") == lines else None
+    if values is None or len(values) != 2 * lines:
+        # 数値以外の行が混ざっている: 数値の行だけを集めて変換し直す
+        data = b"".join(DATA_LINES.findall(data))
+        values = read_numbers(data.replace(b",", b" "))
+    values = values.reshape(-1, 2)
+    return values[:, 0].astype(np.int32), values[:, 1]
+
+
+def find_headers(buf):
+    """buf の中のヘッダ行を [(行頭, 次の行の先頭, ハッシュ, 高さ)] で返す"""
+    headers = []
+    pos = buf.find(b"@")
+    while pos >= 0:
+        start = buf.rfind(b"\n", 0, pos) + 1
+        end = buf.find(b"\n", pos)
+        end = len(buf) if end < 0 else end
+        m = HEADER.fullmatch(buf, start, end)
+        if m:
+            headers.append((start, end + 1, m.group(2).decode(), int(m.group(3))))
+        pos = buf.find(b"@", end)
+    return headers
+
+
+def iter_blocks(path, chunk_bytes=CHUNK_BYTES):
+    """ログのブロックを (ハッシュ, 高さ, ノードIDの配列, 伝播時間msの配列) で順に返す"""
+    current = None  # 読みかけのブロックの (ハッシュ, 高さ)
+    parts = []  # 読みかけのブロックの数値部分
+    carry = b""  # 前のチャンクの最後の（改行で終わっていない）行
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_bytes)
+            buf = carry + chunk
+            if chunk:
+                cut = buf.rfind(b"\n") + 1
+                buf, carry = buf[:cut], buf[cut:]
+            elif buf and not buf.endswith(b"\n"):
+                buf += b"\n"  # 最後の行に改行が無い場合
+            if b"\r" in buf:
+                buf = buf.replace(b"\r", b"")
+
+            pos = 0
+            for start, data_start, block_hash, height in find_headers(buf):
+                if current is not None:
+                    parts.append(buf[pos:start])
+                    yield (*current, *parse_section(b"".join(parts)))
+                current, parts, pos = (block_hash, height), [], data_start
+            if current is not None:
+                parts.append(buf[pos:])
+
+            if not chunk:
+                break
+    if current is not None:
+        yield (*current, *parse_section(b"".join(parts)))
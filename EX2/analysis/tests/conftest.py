@@ -0,0 +1,7 @@
+import os
+import sys
+
+# 解析スクリプトは analysis/ を作業ディレクトリにして動くので、テストでも同じ import パスにする
+ANALYSIS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ANALYSIS_DIR not in sys.path:
+    sys.path.insert(0, ANALYSIS_DIR)
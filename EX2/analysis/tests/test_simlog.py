@@ -0,0 +1,85 @@
+import os
+import random
+import re
+
+import numpy as np
+import pytest
+
+from simlog import iter_blocks
+
+LOG_FILE = os.path.join(os.path.dirname(__file__), "..", "..", "simulation_log.txt")
+
+
+def reference_blocks(text):
+    """1行ずつ読む素朴なパーサ: ヘッダの後の空行までの「数値,数値」の行を集める"""
+    blocks, current, in_block, started = [], None, False, False
+    for line in text.replace("\r", "").split("\n"):
+        m = re.fullmatch(r"(\S+)@([0-9A-Fa-f]+):(\d+)", line)
+        if m:
+            current = (m.group(2), int(m.group(3)), [])
+            blocks.append(current)
+            in_block, started = True, False
+        elif in_block:
+            if line == "":
+                in_block = not started  # ヘッダ直後の空行は飛ばし、それ以外の空行でブロックが終わる
+            else:
+                started = True
+                if re.fullmatch(r"\d+,\d+", line):
+                    current[2].append(tuple(map(int, line.split(","))))
+    return blocks
+
+
+def parsed(path, chunk_bytes):
+    return [(h, height, list(zip(nodes.tolist(), times.tolist())))
+            for h, height, nodes, times in iter_blocks(path, chunk_bytes)]
+
+
+def random_log(seed):
+    rng = random.Random(seed)
+    lines = ["Starting a Gradle Daemon", "> Task :simulator:run"]
+    for height in range(12):
+        lines.append(f"SimBlock.block.SampleProofOfStakeBlock@{rng.getrandbits(32):x}:{height}")
+        if rng.random() < 0.2:
+            lines.append("")  # ヘッダ直後の空行
+        for _ in range(rng.randint(0, 25)):
+            lines.append(f"{rng.randint(1, 600)},{rng.randint(0, 99999)}")
+            if rng.random() < 0.05:
+                lines.append("\tat SimBlock.simulator.Main.main(Main.java:86)")  # ブロックの途中に混ざった出力
+        if rng.random() < 0.1:
+            lines += ["\tat SimBlock.simulator.Main.main(Main.java:86)", "", "7,7"]  # 空行の後の数値行はブロックの外
+        lines.append("")
+        if rng.random() < 0.3:
+            lines += ["> Task :simulator:run", "error at Foo@1a2b and more"]
+    newline = "\r\n" if seed % 2 else "\n"
+    text = newline.join(lines)
+    return text if seed % 3 else text + newline  # 最後の行に改行が無い場合も
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_every_chunk_size_matches_reference(tmp_path, seed):
+    text = random_log(seed)
+    path = tmp_path / "simulation_log.txt"
+    path.write_bytes(text.encode())
+    expected = reference_blocks(text)
+    assert len(expected) == 12
+    for chunk_bytes in list(range(1, 80)) + [127, 1000, len(text) - 1, len(text), 1 << 20]:
+        assert parsed(path, chunk_bytes) == expected, chunk_bytes
+
+
+def test_sample_log_chunk_boundaries():
+    with open(LOG_FILE, encoding="utf-8") as f:
+        expected = reference_blocks(f.read())
+    whole = parsed(LOG_FILE, 1 << 24)
+    assert whole == expected
+    assert [height for _, height, _ in whole] == list(range(len(whole)))
+    for chunk_bytes in (4093, 65536, 100_003):
+        assert parsed(LOG_FILE, chunk_bytes) == whole
+
+
+def test_arrays_have_expected_dtypes(tmp_path):
+    path = tmp_path / "simulation_log.txt"
+    path.write_bytes(b"X@ab:3\n1,0\n2,15\n")
+    [(block_hash, height, nodes, times)] = list(iter_blocks(path))
+    assert (block_hash, height) == ("ab", 3)
+    assert nodes.dtype == np.int32 and nodes.tolist() == [1, 2]
+    assert times.dtype == np.int64 and times.tolist() == [0, 15]